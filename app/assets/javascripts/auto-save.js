@@ -1,136 +1,212 @@
 /**
- * Auto-save functionality with debouncing
+ * Session-level auto-save queue
+ *
+ * Edits from every exercise card are merged into one pending batch, written
+ * to the IndexedDB outbox and then sent as a single POST to
+ * /sessions/{id}/save. Batches stay in the outbox until the server has them,
+ * so saves made offline are replayed when connectivity returns.
+ *
+ * Payloads hold only the sets and fields that changed, each with the
+ * revision it was edited from (see koifit/autosave.py).
  */
+import { outbox, rebase, replayOutbox, requestBackgroundSync } from "./outbox.js";
 
-export class AutoSave {
-  constructor(sessionId, sessionExerciseId) {
-    this.sessionId = sessionId;
-    this.sessionExerciseId = sessionExerciseId;
-    this.debounceTimers = new Map();
-    this.saving = false;
-    this.pendingData = null;
-  }
+/**
+ * Merge two data objects, with the second taking precedence for overlapping fields
+ */
+export function mergeData(existing, incoming) {
+  const merged = { ...existing };
 
-  /**
-   * Debounced save function
-   */
-  debounce(key, fn, delay) {
-    if (this.debounceTimers.has(key)) {
-      clearTimeout(this.debounceTimers.get(key));
+  // Merge sets - combine arrays and update/insert by set_number
+  if (incoming.sets && incoming.sets.length > 0) {
+    if (!merged.sets) {
+      merged.sets = [];
     }
-    const timer = setTimeout(() => {
-      fn();
-      this.debounceTimers.delete(key);
-    }, delay);
-    this.debounceTimers.set(key, timer);
+    // Create a map of existing sets by set_number
+    const setsMap = new Map(merged.sets.map(s => [s.set_number, s]));
+    // Update or add incoming sets
+    incoming.sets.forEach(incomingSet => {
+      setsMap.set(incomingSet.set_number, incomingSet);
+    });
+    merged.sets = Array.from(setsMap.values());
+  }
+
+  // Merge other fields - incoming takes precedence if present
+  if (incoming.notes !== undefined) {
+    merged.notes = incoming.notes;
+  }
+  if (incoming.effort_tag !== undefined) {
+    merged.effort_tag = incoming.effort_tag;
+  }
+  if (incoming.dropset_done !== undefined) {
+    merged.dropset_done = incoming.dropset_done;
+  }
+  if (incoming.fields_revision !== undefined) {
+    merged.fields_revision = incoming.fields_revision;
+  }
+
+  return merged;
+}
+
+/**
+ * Fold a batch of exercise payloads into a draft ({sessionExerciseId: data})
+ */
+export function mergeDraft(draft, exercises) {
+  const merged = { ...draft };
+  for (const { session_exercise_id: id, ...data } of exercises) {
+    merged[id] = merged[id] ? mergeData(merged[id], data) : data;
   }
+  return merged;
+}
 
+export class SessionAutoSave {
   /**
-   * Merge two data objects, with the second taking precedence for overlapping fields
+   * @param {number} sessionId
+   * @param {object} options
+   * @param {number} options.batchDelay - ms to wait for more edits before sending immediate saves
+   * @param {number} options.maxWait - upper bound on how long an edit can sit in the queue
+   * @param {function} options.onSaved - called with each save the server answered, see replayOutbox
    */
-  mergeData(existing, incoming) {
-    const merged = { ...existing };
+  constructor(sessionId, { batchDelay = 250, maxWait = 5000, onSaved = () => {} } = {}) {
+    this.sessionId = sessionId;
+    this.batchDelay = batchDelay;
+    this.maxWait = maxWait;
+    this.onSaved = onSaved;
+    this.pending = new Map(); // sessionExerciseId -> merged data
+    this.firstPendingAt = null;
+    this.flushTimer = null;
+    this.flushDeadline = null;
+    this.retryTimer = null;
+    this.writing = Promise.resolve();
 
-    // Merge sets - combine arrays and update/insert by set_number
-    if (incoming.sets && incoming.sets.length > 0) {
-      if (!merged.sets) {
-        merged.sets = [];
+    // Don't lose queued edits when the page is backgrounded or closed
+    document.addEventListener("visibilitychange", () => {
+      if (document.visibilityState === "hidden") {
+        this.flush({ keepalive: true }).catch(() => {});
       }
-      // Create a map of existing sets by set_number
-      const setsMap = new Map(merged.sets.map(s => [s.set_number, s]));
-      // Update or add incoming sets
-      incoming.sets.forEach(incomingSet => {
-        setsMap.set(incomingSet.set_number, incomingSet);
+    });
+
+    // Replay the outbox as soon as the connection is back
+    window.addEventListener("online", () => this.sync().catch(() => {}));
+    if ("serviceWorker" in navigator) {
+      navigator.serviceWorker.addEventListener("message", (event) => {
+        if (event.data && event.data.type === "REPLAY_OUTBOX") {
+          this.sync().catch(() => {});
+        }
       });
-      merged.sets = Array.from(setsMap.values());
     }
+  }
 
-    // Merge other fields - incoming takes precedence if present
-    if (incoming.notes !== undefined) {
-      merged.notes = incoming.notes;
-    }
-    if (incoming.effort_tag !== undefined) {
-      merged.effort_tag = incoming.effort_tag;
-    }
-    if (incoming.dropset_done !== undefined) {
-      merged.dropset_done = incoming.dropset_done;
+  /**
+   * Queue changes for one exercise; they are sent after `delay` ms (bounded by maxWait)
+   */
+  save(sessionExerciseId, data, delay = this.batchDelay) {
+    const existing = this.pending.get(sessionExerciseId);
+    this.pending.set(
+      sessionExerciseId,
+      existing ? mergeData(existing, data) : data
+    );
+    if (this.firstPendingAt === null) {
+      this.firstPendingAt = Date.now();
     }
+    this.schedule(delay);
+  }
 
-    return merged;
+  /**
+   * Queue changes and send them with the next short batch (checkboxes, buttons)
+   */
+  saveImmediate(sessionExerciseId, data) {
+    this.save(sessionExerciseId, data, this.batchDelay);
   }
 
   /**
-   * Save exercise data to server
-   * If a save is in progress, queues the data to be merged and saved after
+   * Queue changes with a longer quiet period (typing in inputs)
    */
-  async save(data) {
-    // If a save is in progress, merge with pending data and return
-    // The current save will process pending data when it completes
-    if (this.saving) {
-      if (this.pendingData) {
-        this.pendingData = this.mergeData(this.pendingData, data);
-      } else {
-        this.pendingData = data;
-      }
-      // Don't wait - let the current save handle it
+  saveDebounced(sessionExerciseId, data, delay) {
+    this.save(sessionExerciseId, data, delay);
+  }
+
+  schedule(delay) {
+    const deadline = Math.min(Date.now() + delay, this.firstPendingAt + this.maxWait);
+    // An earlier flush that is already scheduled still wins
+    if (this.flushTimer && this.flushDeadline <= deadline) {
       return;
     }
+    clearTimeout(this.flushTimer);
+    this.flushDeadline = deadline;
+    this.flushTimer = setTimeout(
+      () => this.flush().catch(() => {}),
+      Math.max(0, deadline - Date.now())
+    );
+  }
 
-    // Start save immediately
-    await this.performSave(data);
+  /**
+   * Merged local state of every exercise saved in this session, including
+   * batches the server has not received yet
+   */
+  async restore() {
+    return outbox.draft(this.sessionId);
+  }
 
-    // After save completes, check for pending data
-    // Process it recursively (which will set saving flag again)
-    if (this.pendingData) {
-      const pending = this.pendingData;
-      this.pendingData = null;
-      return this.save(pending);
+  /**
+   * Write everything queued to the outbox, then send the outbox.
+   * Resolves once the server has it all; rejects if it is unreachable, in
+   * which case the edits stay safely queued and are retried.
+   */
+  async flush({ keepalive = false } = {}) {
+    clearTimeout(this.flushTimer);
+    this.flushTimer = null;
+    this.flushDeadline = null;
+
+    if (this.pending.size > 0) {
+      const batch = this.pending;
+      this.pending = new Map();
+      this.firstPendingAt = null;
+      const exercises = Array.from(batch, ([sessionExerciseId, data]) => ({
+        session_exercise_id: sessionExerciseId,
+        ...data,
+      }));
+      // Outbox writes are chained so batches keep their order
+      this.writing = this.writing
+        .catch(() => {})
+        .then(() => outbox.add(this.sessionId, exercises, mergeDraft));
     }
+    await this.writing;
+    return this.sync({ keepalive });
   }
 
   /**
-   * Perform the actual save operation
+   * Send the outbox; on failure, retry after maxWait and register a
+   * background sync so the service worker can wake the page when online
    */
-  async performSave(data) {
-    this.saving = true;
+  async sync({ keepalive = false } = {}) {
+    clearTimeout(this.retryTimer);
+    this.retryTimer = null;
     try {
-      const response = await fetch(
-        `/sessions/${this.sessionId}/exercises/${this.sessionExerciseId}/save`,
-        {
-          method: "POST",
-          headers: {
-            "Content-Type": "application/json",
-          },
-          body: JSON.stringify(data),
-        }
-      );
-
-      if (!response.ok) {
-        throw new Error(`Save failed: ${response.statusText}`);
-      }
-
-      const result = await response.json();
-      return result;
+      await replayOutbox({
+        keepalive,
+        onSaved: (result, confirmed) => this.saved(result, confirmed),
+      });
     } catch (error) {
-      console.error("Auto-save error:", error);
-      // TODO: Show user-friendly error message
+      console.warn("Saves queued offline:", error);
+      requestBackgroundSync();
+      this.retryTimer = setTimeout(() => this.sync().catch(() => {}), this.maxWait);
       throw error;
-    } finally {
-      this.saving = false;
     }
   }
 
-  /**
-   * Save immediately (for checkboxes)
-   */
-  async saveImmediate(data) {
-    return this.save(data);
+  saved(result, confirmed) {
+    // Edits not in the outbox yet are rebased like the ones in it
+    for (const [id, data] of this.pending) {
+      this.pending.set(id, rebase(id, data, confirmed));
+    }
+    this.onSaved(result, confirmed);
   }
 
   /**
-   * Save with debounce (for inputs)
+   * Drop local drafts and queued saves once the session is finished or discarded
    */
-  saveDebounced(key, data, delay) {
-    this.debounce(key, () => this.save(data), delay);
+  async forget() {
+    await outbox.clearSession(this.sessionId);
   }
 }
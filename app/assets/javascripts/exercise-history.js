@@ -1,5 +1,12 @@
-const history = window.__exerciseHistory || [];
-if (history.length === 0) {
+const page = document.getElementById("history-page");
+const ctx = document.getElementById("history-chart");
+const slotId = page ? page.dataset.slotId : null;
+
+// Chart points requested from the server; long histories are downsampled to this
+const CHART_POINTS = 120;
+const PAGE_SIZE = 20;
+
+if (!slotId || !ctx) {
   // Nothing to render
 } else {
   function formatChartDate(isoDate) {
@@ -15,7 +22,24 @@ if (history.length === 0) {
     return `${weekday} ${month} ${day}`;
   }
 
-  const ctx = document.getElementById("history-chart");
+  function formatWeight(w) {
+    return w === Math.floor(w) ? String(Math.floor(w)) : String(w);
+  }
+
+  function escapeHtml(str) {
+    const div = document.createElement("div");
+    div.textContent = str;
+    return div.innerHTML;
+  }
+
+  async function fetchHistory(params) {
+    const query = new URLSearchParams(params);
+    const response = await fetch(`/slots/${slotId}/history.json?${query}`);
+    if (!response.ok) {
+      throw new Error(`History request failed: ${response.statusText}`);
+    }
+    return response.json();
+  }
 
   const accentColor = getComputedStyle(document.documentElement)
     .getPropertyValue("--color-accent")
@@ -24,36 +48,40 @@ if (history.length === 0) {
   const accent = accentColor || "#E8875B";
   const lineColor = "oklch(65% 0.02 35)";
   const defaultRadius = 5;
-  let selectedIndex = -1;
   let currentMetric = "1rm";
+  let selectedSessionId = null;
+  let series = { "1rm": [], volume: [] };
+  let nextCursor = null;
 
-  const metrics = {
-    "1rm": {
-      data: history.map((s) => s.best_1rm),
-      unit: "kg",
-      labelFn: (v) => v + " kg",
-    },
-    volume: {
-      data: history.map((s) => s.volume),
-      unit: "kg",
-      labelFn: (v) => v + " kg",
-    },
+  // Sessions seen so far (list pages and single lookups), by id
+  const sessionsById = new Map();
+  const listEl = document.getElementById("session-list");
+  const itemsBySessionId = new Map();
+  let loadMoreItem = null;
+
+  const metricLabels = {
+    "1rm": (v) => v + " kg",
+    volume: (v) => v + " kg",
   };
 
-  const pointRadii = metrics["1rm"].data.map(() => defaultRadius);
-  const pointBgColors = metrics["1rm"].data.map(() => lineColor);
+  function selectedPointIndex() {
+    return series[currentMetric].findIndex(
+      (p) => p.session_id === selectedSessionId,
+    );
+  }
 
   // Plugin to draw tooltip box above selected point
   const selectedLabelPlugin = {
     id: "selectedLabel",
     afterDatasetsDraw(chart) {
+      const selectedIndex = selectedPointIndex();
       if (selectedIndex < 0) return;
       const meta = chart.getDatasetMeta(0);
       const point = meta.data[selectedIndex];
       if (!point) return;
       const ctx = chart.ctx;
-      const value = metrics[currentMetric].labelFn(
-        metrics[currentMetric].data[selectedIndex],
+      const value = metricLabels[currentMetric](
+        series[currentMetric][selectedIndex].value,
       );
       ctx.save();
       ctx.font = "600 12px system-ui, sans-serif";
@@ -84,16 +112,16 @@ if (history.length === 0) {
   const chart = new Chart(ctx, {
     type: "line",
     data: {
-      labels: history.map((s) => s.date),
+      labels: [],
       datasets: [
         {
           label: "Est. 1RM (kg)",
-          data: metrics["1rm"].data,
+          data: [],
           borderColor: lineColor,
           backgroundColor: lineColor,
-          pointRadius: pointRadii,
-          pointBackgroundColor: pointBgColors,
-          pointBorderColor: pointBgColors,
+          pointRadius: [],
+          pointBackgroundColor: [],
+          pointBorderColor: [],
           pointBorderWidth: 0,
           pointHitRadius: 20,
           tension: 0.1,
@@ -135,12 +163,28 @@ if (history.length === 0) {
           true,
         );
         if (points.length === 0) return;
-        selectSession(points[0].index);
+        selectSession(series[currentMetric][points[0].index].session_id);
       },
     },
     plugins: [selectedLabelPlugin],
   });
 
+  // Load the current metric's series into the chart and style the selected point
+  function renderChart() {
+    const points = series[currentMetric];
+    const ds = chart.data.datasets[0];
+    chart.data.labels = points.map((p) => p.date);
+    ds.data = points.map((p) => p.value);
+    ds.pointRadius = points.map((p) =>
+      p.session_id === selectedSessionId ? 7 : defaultRadius,
+    );
+    ds.pointBackgroundColor = points.map((p) =>
+      p.session_id === selectedSessionId ? accent : lineColor,
+    );
+    ds.pointBorderColor = ds.pointBackgroundColor;
+    chart.update("none");
+  }
+
   // Metric tab switching
   const tabs = document.querySelectorAll(".history-chart-tab");
   tabs.forEach((tab) => {
@@ -153,60 +197,93 @@ if (history.length === 0) {
       tabs.forEach((t) => t.classList.remove("history-chart-tab--active"));
       tab.classList.add("history-chart-tab--active");
 
-      // Update chart data
-      chart.data.datasets[0].data = metrics[metric].data;
-      chart.options.scales.y.title.text = metrics[metric].unit;
-
-      // Re-apply point selection styling
-      if (selectedIndex >= 0) {
-        const ds = chart.data.datasets[0];
-        for (let i = 0; i < history.length; i++) {
-          const selected = i === selectedIndex;
-          ds.pointRadius[i] = selected ? 7 : defaultRadius;
-          ds.pointBackgroundColor[i] = selected ? accent : lineColor;
-          ds.pointBorderColor[i] = selected ? accent : lineColor;
-        }
-      }
-
-      chart.update();
+      // Each metric has its own downsampled series
+      renderChart();
     });
   });
 
-  // Session list (most recent first)
-  const listEl = document.getElementById("session-list");
-  const itemsByIndex = {};
+  // Session list (most recent first), appended page by page
+  function appendSessions(sessions) {
+    for (const session of sessions) {
+      sessionsById.set(session.session_id, session);
+      const item = document.createElement("button");
+      item.className = "history-session";
+
+      const workingSets = session.sets.filter((s) => !s.is_drop);
+      const setsText = workingSets
+        .map((s) => formatWeight(s.weight_kg) + " × " + s.reps)
+        .join("  ·  ");
+
+      let html =
+        '<span class="history-session__date">' +
+        formatDetailDate(session.date) +
+        "</span>";
+      html +=
+        '<span class="history-session__sets">' +
+        escapeHtml(setsText) +
+        "</span>";
 
-  for (let i = history.length - 1; i >= 0; i--) {
-    const session = history[i];
-    const item = document.createElement("button");
-    item.className = "history-session";
+      if (session.effort_tag === "increase") {
+        html +=
+          '<span class="history-session__tag history-session__tag--increase">↑</span>';
+      } else if (session.effort_tag === "decrease") {
+        html +=
+          '<span class="history-session__tag history-session__tag--decrease">↓</span>';
+      }
 
-    const workingSets = session.sets.filter((s) => !s.is_drop);
-    const setsText = workingSets
-      .map((s) => formatWeight(s.weight_kg) + " × " + s.reps)
-      .join("  ·  ");
-
-    let html =
-      '<span class="history-session__date">' +
-      formatDetailDate(session.date) +
-      "</span>";
-    html +=
-      '<span class="history-session__sets">' +
-      escapeHtml(setsText) +
-      "</span>";
+      item.innerHTML = html;
+      item.addEventListener("click", () => selectSession(session.session_id));
+      listEl.insertBefore(item, loadMoreItem);
+      itemsBySessionId.set(session.session_id, item);
+    }
+  }
 
-    if (session.effort_tag === "increase") {
-      html +=
-        '<span class="history-session__tag history-session__tag--increase">↑</span>';
-    } else if (session.effort_tag === "decrease") {
-      html +=
-        '<span class="history-session__tag history-session__tag--decrease">↓</span>';
+  function updateLoadMore() {
+    if (!nextCursor) {
+      if (loadMoreItem) loadMoreItem.remove();
+      loadMoreItem = null;
+      return;
+    }
+    if (!loadMoreItem) {
+      loadMoreItem = document.createElement("button");
+      loadMoreItem.className = "history-session history-session--more";
+      loadMoreItem.textContent = "Load more";
+      loadMoreItem.addEventListener("click", loadMore);
+      listEl.appendChild(loadMoreItem);
+    }
+  }
+
+  async function loadMore() {
+    if (!nextCursor) return;
+    loadMoreItem.disabled = true;
+    try {
+      const data = await fetchHistory({ after: nextCursor, limit: PAGE_SIZE });
+      appendSessions(data.sessions);
+      nextCursor = data.next_cursor;
+    } catch (error) {
+      console.error(error);
+    } finally {
+      if (loadMoreItem) loadMoreItem.disabled = false;
+      updateLoadMore();
     }
+  }
 
-    item.innerHTML = html;
-    item.addEventListener("click", () => selectSession(i));
-    listEl.appendChild(item);
-    itemsByIndex[i] = item;
+  // A chart point can belong to a session beyond the loaded pages
+  async function getSession(sessionId) {
+    if (sessionsById.has(sessionId)) {
+      return sessionsById.get(sessionId);
+    }
+    const point = series[currentMetric].find((p) => p.session_id === sessionId);
+    if (!point) return null;
+    const data = await fetchHistory({
+      start: point.date,
+      end: point.date,
+      limit: PAGE_SIZE,
+    });
+    for (const session of data.sessions) {
+      sessionsById.set(session.session_id, session);
+    }
+    return sessionsById.get(sessionId) || null;
   }
 
   // Detail panel
@@ -257,54 +334,52 @@ if (history.length === 0) {
     detail.hidden = false;
   }
 
-  function selectSession(index) {
+  async function selectSession(sessionId) {
     // Update list highlight
-    if (selectedIndex >= 0 && itemsByIndex[selectedIndex]) {
-      itemsByIndex[selectedIndex].classList.remove("history-session--active");
+    const previous = itemsBySessionId.get(selectedSessionId);
+    if (previous) {
+      previous.classList.remove("history-session--active");
     }
-    itemsByIndex[index].classList.add("history-session--active");
-
-    // Update chart point — selected is orange, others are line color
-    const ds = chart.data.datasets[0];
-    for (let i = 0; i < history.length; i++) {
-      const selected = i === index;
-      ds.pointRadius[i] = selected ? 7 : defaultRadius;
-      ds.pointBackgroundColor[i] = selected ? accent : lineColor;
-      ds.pointBorderColor[i] = selected ? accent : lineColor;
+    selectedSessionId = sessionId;
+    const item = itemsBySessionId.get(sessionId);
+    if (item) {
+      item.classList.add("history-session--active");
+      // Scroll selected item into view
+      item.scrollIntoView({ behavior: "smooth", block: "nearest" });
     }
 
-    selectedIndex = index;
-    chart.update("none");
-
-    // Scroll selected item into view
-    itemsByIndex[index].scrollIntoView({
-      behavior: "smooth",
-      block: "nearest",
-    });
+    // Update chart point — selected is orange, others are line color
+    renderChart();
 
     // Show detail
-    showDetail(history[index]);
-  }
-
-  // Size list to show 3 items
-  if (history.length > 3) {
-    const firstItem = listEl.querySelector(".history-session");
-    if (firstItem) {
-      const itemHeight = firstItem.offsetHeight;
-      listEl.style.maxHeight = itemHeight * 3 + "px";
+    const session = await getSession(sessionId);
+    if (session && session.session_id === selectedSessionId) {
+      showDetail(session);
     }
   }
 
-  // Select last session by default
-  selectSession(history.length - 1);
+  async function init() {
+    const data = await fetchHistory({ points: CHART_POINTS, limit: PAGE_SIZE });
+    series = data.series;
+    nextCursor = data.next_cursor;
+    appendSessions(data.sessions);
+    updateLoadMore();
+    renderChart();
+
+    // Size list to show 3 items
+    if (data.sessions.length > 3) {
+      const firstItem = listEl.querySelector(".history-session");
+      if (firstItem) {
+        const itemHeight = firstItem.offsetHeight;
+        listEl.style.maxHeight = itemHeight * 3 + "px";
+      }
+    }
 
-  function formatWeight(w) {
-    return w === Math.floor(w) ? String(Math.floor(w)) : String(w);
+    // Select last session by default
+    if (data.sessions.length > 0) {
+      selectSession(data.sessions[0].session_id);
+    }
   }
 
-  function escapeHtml(str) {
-    const div = document.createElement("div");
-    div.textContent = str;
-    return div.innerHTML;
-  }
+  init().catch((error) => console.error("History load error:", error));
 }
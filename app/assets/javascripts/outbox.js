@@ -0,0 +1,388 @@
+/**
+ * Offline outbox for session saves
+ *
+ * Every batch of edits is written to IndexedDB before it is sent, so a tick
+ * costs one local write and survives lost connectivity, reloads and closed
+ * tabs. Batches are replayed in order, coalesced per session, with an
+ * Idempotency-Key the server uses to skip batches it already applied.
+ *
+ * Alongside the queue, a draft per session keeps the merged local state, so
+ * a session page served from the service worker cache can be brought up to
+ * date before the user touches it.
+ *
+ * Queued sets and fields carry the revision they were edited from. Once the
+ * server confirms a save, what is still queued for the same items is rebased
+ * onto the revision that save gave them, so later local edits are not taken
+ * for conflicts with earlier ones.
+ */
+
+const DB_NAME = "koifit";
+const DB_VERSION = 1;
+const OUTBOX = "outbox";
+const DRAFTS = "drafts";
+
+// Upper bound on queued batches sent in one request
+const MAX_BATCHES_PER_REQUEST = 50;
+
+function promisify(request) {
+  return new Promise((resolve, reject) => {
+    request.onsuccess = () => resolve(request.result);
+    request.onerror = () => reject(request.error);
+  });
+}
+
+function transactionDone(tx) {
+  return new Promise((resolve, reject) => {
+    tx.oncomplete = () => resolve();
+    tx.onerror = () => reject(tx.error);
+    tx.onabort = () => reject(tx.error);
+  });
+}
+
+function newIdempotencyKey() {
+  if (self.crypto && crypto.randomUUID) {
+    return crypto.randomUUID();
+  }
+  return `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+}
+
+// Identifies this page to the server, so live sync does not echo its own
+// saves back to it
+export const CLIENT_ID = newIdempotencyKey();
+
+const FIELDS = ["notes", "effort_tag", "dropset_done"];
+
+/**
+ * Revisions the server confirmed for the sets and fields of a save, as
+ * "{sessionExerciseId}:{setNumber|fields}" -> revision; conflicts are left out
+ */
+export function confirmedRevisions(exercises, { revisions = {}, conflicts = [] }) {
+  const conflicting = new Set();
+  for (const { session_exercise_id: id, sets = [], fields_revision } of conflicts) {
+    sets.forEach((set) => conflicting.add(`${id}:${set.set_number}`));
+    if (fields_revision !== undefined) {
+      conflicting.add(`${id}:fields`);
+    }
+  }
+
+  const confirmed = new Map();
+  for (const { session_exercise_id: id, sets = [], ...fields } of exercises) {
+    const revision = revisions[id];
+    if (revision === undefined) {
+      continue;
+    }
+    const keys = sets.map((set) => `${id}:${set.set_number}`);
+    if (FIELDS.some((field) => fields[field] !== undefined)) {
+      keys.push(`${id}:fields`);
+    }
+    keys
+      .filter((key) => !conflicting.has(key))
+      .forEach((key) => confirmed.set(key, revision));
+  }
+  return confirmed;
+}
+
+/**
+ * One exercise's queued changes with their revisions raised to the confirmed
+ * ones; changes without a revision are never checked, so are left alone
+ */
+export function rebase(sessionExerciseId, data, confirmed) {
+  const newer = (key, revision) => {
+    const revisionSaved = confirmed.get(`${sessionExerciseId}:${key}`);
+    return revision != null && revisionSaved > revision ? revisionSaved : revision;
+  };
+  const rebased = { ...data };
+  if (data.sets) {
+    rebased.sets = data.sets.map((set) => ({
+      ...set,
+      revision: newer(set.set_number, set.revision),
+    }));
+  }
+  if (data.fields_revision != null) {
+    rebased.fields_revision = newer("fields", data.fields_revision);
+  }
+  return rebased;
+}
+
+function rebaseDraft(exercises, confirmed) {
+  return Object.fromEntries(
+    Object.entries(exercises).map(([id, data]) => [id, rebase(id, data, confirmed)])
+  );
+}
+
+/**
+ * IndexedDB-backed store; falls back to memory where IndexedDB is unavailable
+ * (private browsing on some browsers), which still queues but not durably.
+ */
+class OutboxStore {
+  constructor() {
+    this.dbPromise = null;
+    this.memory = null;
+  }
+
+  async open() {
+    if (this.memory) {
+      return null;
+    }
+    if (!this.dbPromise) {
+      if (!self.indexedDB) {
+        this.memory = { entries: [], drafts: new Map(), nextId: 1 };
+        return null;
+      }
+      const request = indexedDB.open(DB_NAME, DB_VERSION);
+      request.onupgradeneeded = () => {
+        const db = request.result;
+        db.createObjectStore(OUTBOX, { keyPath: "id", autoIncrement: true });
+        db.createObjectStore(DRAFTS, { keyPath: "sessionId" });
+      };
+      this.dbPromise = promisify(request).catch((error) => {
+        console.warn("IndexedDB unavailable, queueing saves in memory:", error);
+        this.memory = { entries: [], drafts: new Map(), nextId: 1 };
+        return null;
+      });
+    }
+    return this.dbPromise;
+  }
+
+  /**
+   * Queue a batch and fold it into the session draft in one transaction
+   */
+  async add(sessionId, exercises, mergeDraft) {
+    const entry = {
+      sessionId,
+      key: newIdempotencyKey(),
+      exercises,
+      createdAt: Date.now(),
+    };
+    const db = await this.open();
+    if (!db) {
+      const draft = this.memory.drafts.get(sessionId);
+      this.memory.entries.push({ ...entry, id: this.memory.nextId++ });
+      this.memory.drafts.set(sessionId, {
+        sessionId,
+        exercises: mergeDraft(draft ? draft.exercises : {}, exercises),
+      });
+      return;
+    }
+    const tx = db.transaction([OUTBOX, DRAFTS], "readwrite");
+    tx.objectStore(OUTBOX).add(entry);
+    const drafts = tx.objectStore(DRAFTS);
+    const request = drafts.get(sessionId);
+    request.onsuccess = () => {
+      const draft = request.result;
+      drafts.put({
+        sessionId,
+        exercises: mergeDraft(draft ? draft.exercises : {}, exercises),
+      });
+    };
+    await transactionDone(tx);
+  }
+
+  async entries() {
+    const db = await this.open();
+    if (!db) {
+      return [...this.memory.entries];
+    }
+    const tx = db.transaction(OUTBOX, "readonly");
+    return promisify(tx.objectStore(OUTBOX).getAll());
+  }
+
+  /**
+   * Drop sent batches and rebase what is left of the session, see rebase
+   */
+  async settle(sessionId, ids, confirmed) {
+    const sent = new Set(ids);
+    const rebaseEntry = (entry) => ({
+      ...entry,
+      exercises: entry.exercises.map(({ session_exercise_id: id, ...data }) => ({
+        session_exercise_id: id,
+        ...rebase(id, data, confirmed),
+      })),
+    });
+    const db = await this.open();
+    if (!db) {
+      this.memory.entries = this.memory.entries
+        .filter((e) => !sent.has(e.id))
+        .map((e) => (e.sessionId === sessionId ? rebaseEntry(e) : e));
+      const draft = this.memory.drafts.get(sessionId);
+      if (draft) {
+        draft.exercises = rebaseDraft(draft.exercises, confirmed);
+      }
+      return;
+    }
+    const entries = await this.entries();
+    const tx = db.transaction([OUTBOX, DRAFTS], "readwrite");
+    const store = tx.objectStore(OUTBOX);
+    for (const entry of entries) {
+      if (sent.has(entry.id)) {
+        store.delete(entry.id);
+      } else if (confirmed.size > 0 && entry.sessionId === sessionId) {
+        store.put(rebaseEntry(entry));
+      }
+    }
+    const drafts = tx.objectStore(DRAFTS);
+    const request = drafts.get(sessionId);
+    request.onsuccess = () => {
+      const draft = request.result;
+      if (draft && confirmed.size > 0) {
+        drafts.put({ sessionId, exercises: rebaseDraft(draft.exercises, confirmed) });
+      }
+    };
+    await transactionDone(tx);
+  }
+
+  async remove(ids) {
+    const db = await this.open();
+    if (!db) {
+      const removed = new Set(ids);
+      this.memory.entries = this.memory.entries.filter((e) => !removed.has(e.id));
+      return;
+    }
+    const tx = db.transaction(OUTBOX, "readwrite");
+    const store = tx.objectStore(OUTBOX);
+    ids.forEach((id) => store.delete(id));
+    await transactionDone(tx);
+  }
+
+  async draft(sessionId) {
+    const db = await this.open();
+    if (!db) {
+      const draft = this.memory.drafts.get(sessionId);
+      return draft ? draft.exercises : {};
+    }
+    const tx = db.transaction(DRAFTS, "readonly");
+    const draft = await promisify(tx.objectStore(DRAFTS).get(sessionId));
+    return draft ? draft.exercises : {};
+  }
+
+  /**
+   * Forget everything about a session (after finish or discard)
+   */
+  async clearSession(sessionId) {
+    const db = await this.open();
+    if (!db) {
+      this.memory.drafts.delete(sessionId);
+      this.memory.entries = this.memory.entries.filter((e) => e.sessionId !== sessionId);
+      return;
+    }
+    const entries = await this.entries();
+    const tx = db.transaction([OUTBOX, DRAFTS], "readwrite");
+    tx.objectStore(DRAFTS).delete(sessionId);
+    entries
+      .filter((e) => e.sessionId === sessionId)
+      .forEach((e) => tx.objectStore(OUTBOX).delete(e.id));
+    await transactionDone(tx);
+  }
+}
+
+export const outbox = new OutboxStore();
+
+let replaying = Promise.resolve();
+
+// Ids of a run whose request failed: it is sent again as it was, with the
+// same key, as the server may have applied it
+let unconfirmed = null;
+
+/**
+ * Send queued batches oldest first; rejects on the first network or server
+ * error, leaving the rest queued. Calls run one after another, and each one
+ * reads the outbox afresh, so a batch queued before the call is included.
+ *
+ * onSaved(result, confirmed) is called with every save the server answered,
+ * conflicts included, and its confirmedRevisions.
+ */
+export function replayOutbox({ keepalive = false, onSaved = null } = {}) {
+  const run = replaying.catch(() => {}).then(() => replay(keepalive, onSaved));
+  replaying = run;
+  return run;
+}
+
+function nextRun(entries) {
+  if (unconfirmed) {
+    const retry = entries.filter((entry) => unconfirmed.has(entry.id));
+    if (retry.length === unconfirmed.size) {
+      return retry;
+    }
+  }
+
+  // Consecutive batches of one session go out as one request; the server
+  // merges them in order, so the newest values win
+  const run = [];
+  for (const entry of entries) {
+    if (
+      entry.sessionId !== entries[0].sessionId ||
+      run.length >= MAX_BATCHES_PER_REQUEST
+    ) {
+      break;
+    }
+    run.push(entry);
+  }
+  return run;
+}
+
+async function replay(keepalive, onSaved) {
+  for (;;) {
+    const entries = await outbox.entries();
+    if (entries.length === 0) {
+      return;
+    }
+    const run = nextRun(entries);
+    const sessionId = run[0].sessionId;
+    const exercises = run.flatMap((entry) => entry.exercises);
+
+    unconfirmed = new Set(run.map((entry) => entry.id));
+    const response = await fetch(`/sessions/${sessionId}/save`, {
+      method: "POST",
+      headers: {
+        "Content-Type": "application/json",
+        // The last batch's key: a retry of the same run is recognized
+        "Idempotency-Key": run[run.length - 1].key,
+        "X-Client-Id": CLIENT_ID,
+      },
+      body: JSON.stringify({ exercises }),
+      keepalive,
+    });
+
+    if (response.ok || response.status === 409) {
+      // A conflict is delivered too: the rest of the run was applied, and the
+      // server's values come back for the changes that were not. A session
+      // finished meanwhile ("finished") takes no more saves, so they go.
+      const result = await response.json();
+      const confirmed = confirmedRevisions(exercises, result);
+      await outbox.settle(sessionId, [...unconfirmed], confirmed);
+      unconfirmed = null;
+      if (onSaved) {
+        onSaved(result, confirmed);
+      }
+      continue;
+    }
+    if (!isPermanentFailure(response.status)) {
+      throw new Error(`Save failed: ${response.statusText}`);
+    }
+    // Session gone or payload rejected: retrying cannot help
+    console.error(`Dropping queued saves for session ${sessionId}:`, response.status);
+    await outbox.remove([...unconfirmed]);
+    unconfirmed = null;
+  }
+}
+
+function isPermanentFailure(status) {
+  return status >= 400 && status < 500 && status !== 408 && status !== 429;
+}
+
+/**
+ * Ask the service worker to wake pages up when connectivity returns
+ */
+export async function requestBackgroundSync() {
+  if (!("serviceWorker" in navigator)) {
+    return;
+  }
+  try {
+    const registration = await navigator.serviceWorker.ready;
+    if (registration.sync) {
+      await registration.sync.register("koifit-outbox");
+    }
+  } catch (error) {
+    // Background Sync unsupported or denied; the online event still replays
+  }
+}
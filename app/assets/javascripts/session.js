@@ -1,7 +1,26 @@
 /**
  * Session management and auto-save coordination
  */
-import { AutoSave } from "./auto-save.js";
+import { SessionAutoSave } from "./auto-save.js";
+import { CLIENT_ID } from "./outbox.js";
+
+const FIELDS = ["notes", "effort_tag", "dropset_done"];
+
+/**
+ * Saved changes without the sets and fields that have edits queued here
+ */
+function withoutEdits(data, edits) {
+  const edited = new Set((edits.sets || []).map((set) => set.set_number));
+  const kept = { sets: (data.sets || []).filter((set) => !edited.has(set.set_number)) };
+  if (!FIELDS.some((field) => edits[field] !== undefined)) {
+    for (const field of [...FIELDS, "fields_revision"]) {
+      if (data[field] !== undefined) {
+        kept[field] = data[field];
+      }
+    }
+  }
+  return kept;
+}
 
 class RestTimer {
   static STORAGE_KEY = "koifit_rest_timer";
@@ -300,8 +319,12 @@ class RestTimer {
 class SessionManager {
   constructor() {
     this.sessionId = this.getSessionId();
-    this.autoSavers = new Map();
+    this.autoSave = new SessionAutoSave(this.sessionId, {
+      onSaved: (result, confirmed) => this.applySaved(result, confirmed),
+    });
     this.restTimer = new RestTimer();
+    // Local edits restored from IndexedDB, applied to cards as they load
+    this.draft = {};
     this.init();
   }
 
@@ -327,21 +350,294 @@ class SessionManager {
       }
     });
 
+    this.loadCardsLazily();
+    this.setupPreviousPanels();
+
     // Setup finish workout button
     this.setupFinishButton();
+
+    // The page may come from the service worker cache: bring it up to date
+    // with local edits, then send anything still queued
+    this.restoreDraft().finally(() => {
+      this.autoSave.sync().catch(() => {});
+    });
+
+    this.connectLive();
+  }
+
+  /**
+   * Cards past the first few arrive as placeholders holding only the
+   * header; each is fetched as it nears the viewport
+   */
+  loadCardsLazily() {
+    const placeholders = document.querySelectorAll(".exercise-card-placeholder");
+    if (!("IntersectionObserver" in window)) {
+      placeholders.forEach((placeholder) => this.loadCard(placeholder).catch(() => {}));
+      return;
+    }
+
+    const observer = new IntersectionObserver(
+      (entries) => {
+        for (const entry of entries) {
+          if (!entry.isIntersecting) {
+            continue;
+          }
+          const placeholder = entry.target;
+          observer.unobserve(placeholder);
+          this.loadCard(placeholder).catch(() => {
+            // Offline and never cached: try again once back online
+            window.addEventListener("online", () => observer.observe(placeholder), {
+              once: true,
+            });
+          });
+        }
+      },
+      { rootMargin: "200px 0px" }
+    );
+    placeholders.forEach((placeholder) => observer.observe(placeholder));
+  }
+
+  async loadCard(placeholder) {
+    const response = await fetch(placeholder.dataset.cardUrl);
+    if (!response.ok) {
+      throw new Error(`Card failed: ${response.statusText}`);
+    }
+    const template = document.createElement("template");
+    template.innerHTML = (await response.text()).trim();
+    const card = template.content.firstElementChild;
+    const sessionExerciseId = parseInt(card.dataset.sessionExerciseId);
+
+    // Local edits not yet saved are newer than the server's copy
+    const data = this.draft[sessionExerciseId];
+    if (data) {
+      this.applyExerciseData(card, data);
+    }
+    placeholder.replaceWith(card);
+    this.setupExerciseCard(card, sessionExerciseId);
+  }
+
+  /**
+   * The "last time" panel is only fetched when first opened
+   */
+  setupPreviousPanels() {
+    // toggle does not bubble, so listen in the capture phase
+    document.addEventListener(
+      "toggle",
+      async (event) => {
+        const panel = event.target;
+        if (
+          !panel.classList?.contains("exercise-card__previous") ||
+          !panel.open ||
+          panel.dataset.loaded
+        ) {
+          return;
+        }
+        panel.dataset.loaded = "true";
+        try {
+          const response = await fetch(panel.dataset.previousUrl);
+          if (!response.ok) {
+            throw new Error(`Previous session failed: ${response.statusText}`);
+          }
+          panel.querySelector(".exercise-card__previous-body").innerHTML =
+            await response.text();
+        } catch (error) {
+          // Try again on the next open
+          delete panel.dataset.loaded;
+        }
+      },
+      true
+    );
+  }
+
+  /**
+   * Follow saves made on other devices: the server pushes only the changed
+   * sets and fields, with the revision each was saved at
+   */
+  connectLive() {
+    if (!("EventSource" in window)) {
+      return;
+    }
+    const source = new EventSource(
+      `/sessions/${this.sessionId}/events?client=${encodeURIComponent(CLIENT_ID)}`
+    );
+
+    source.addEventListener("changes", (event) => {
+      const { exercises } = JSON.parse(event.data);
+      for (const { session_exercise_id: id, ...data } of exercises) {
+        const card = document.querySelector(
+          `.exercise-card[data-session-exercise-id="${id}"]`
+        );
+        if (card) {
+          // Edits still queued here are newer than what was saved elsewhere
+          const pending = this.autoSave.pending.get(id);
+          this.applyExerciseData(card, pending ? withoutEdits(data, pending) : data, {
+            fromServer: true,
+          });
+        }
+      }
+    });
+
+    // Ended on another device: drop local state and the cached page
+    const leave = async (event) => {
+      source.close();
+      this.restTimer.stop();
+      await this.autoSave.forget().catch(() => {});
+      if ("caches" in window) {
+        await this.forgetCachedPages().catch(() => {});
+      }
+      window.location.href = JSON.parse(event.data).redirect || "/";
+    };
+    source.addEventListener("finished", leave);
+    source.addEventListener("discarded", leave);
+
+    // This page fell too far behind to patch; start over from the server
+    source.addEventListener("resync", () => {
+      source.close();
+      window.location.reload();
+    });
+  }
+
+  // The page and its card fragments, as cached by the service worker
+  async forgetCachedPages() {
+    const cache = await caches.open("koifit-pages");
+    const prefix = `/sessions/${this.sessionId}`;
+    const requests = await cache.keys();
+    await Promise.all(
+      requests
+        .filter((request) => {
+          const { pathname } = new URL(request.url);
+          return pathname === prefix || pathname.startsWith(`${prefix}/`);
+        })
+        .map((request) => cache.delete(request))
+    );
+  }
+
+  async restoreDraft() {
+    let draft;
+    try {
+      draft = await this.autoSave.restore();
+    } catch (error) {
+      console.error("Could not restore local edits:", error);
+      return;
+    }
+    this.draft = draft;
+    document.querySelectorAll(".exercise-card").forEach((card) => {
+      const data = draft[card.dataset.sessionExerciseId];
+      if (data) {
+        this.applyExerciseData(card, data);
+      }
+    });
+  }
+
+  /**
+   * Save results: the server's values replace conflicting edits, and sets
+   * and fields it confirmed take their new revision
+   */
+  applySaved({ conflicts = [] }, confirmed) {
+    for (const [key, revision] of confirmed) {
+      const [id, item] = key.split(":");
+      const card = document.querySelector(
+        `.exercise-card[data-session-exercise-id="${id}"]`
+      );
+      if (!card) {
+        continue;
+      }
+      const [element, name] =
+        item === "fields"
+          ? [card, "fieldsRevision"]
+          : [card.querySelector(`.set-row[data-set-number="${item}"]`), "revision"];
+      if (element && revision > (parseInt(element.dataset[name]) || 0)) {
+        element.dataset[name] = revision;
+      }
+    }
+    for (const { session_exercise_id: id, ...data } of conflicts) {
+      const card = document.querySelector(
+        `.exercise-card[data-session-exercise-id="${id}"]`
+      );
+      if (card) {
+        this.applyExerciseData(card, data, { fromServer: true });
+      }
+    }
+  }
+
+  /**
+   * Show saved or drafted values on a card. Saved values (fromServer) carry
+   * the revision they were saved at and replace only older ones, updating
+   * the card's revisions; drafted values carry the revision they were
+   * edited from and are skipped where something newer was saved since.
+   */
+  applyExerciseData(card, data, { fromServer = false } = {}) {
+    const applies = (element, key, revision) => {
+      if (revision === undefined || revision === null) {
+        return true;
+      }
+      const current = parseInt(element.dataset[key]) || 0;
+      if (!fromServer) {
+        return revision >= current;
+      }
+      if (revision <= current) {
+        return false;
+      }
+      element.dataset[key] = revision;
+      return true;
+    };
+
+    (data.sets || []).forEach((set) => {
+      const selector = `[data-set-number="${set.set_number}"]`;
+      const row = card.querySelector(`.set-row${selector}`);
+      if (row && !applies(row, "revision", set.revision)) {
+        return;
+      }
+      const weightInput = card.querySelector(`.set-weight${selector}`);
+      const repsInput = card.querySelector(`.set-reps${selector}`);
+      const doneCheckbox = card.querySelector(`.set-done${selector}`);
+      if (weightInput) {
+        weightInput.value = set.weight_kg || "";
+      }
+      if (repsInput) {
+        repsInput.value = set.reps || "";
+      }
+      if (doneCheckbox) {
+        doneCheckbox.checked = set.is_done === 1;
+      }
+    });
+
+    if (!applies(card, "fieldsRevision", data.fields_revision)) {
+      return;
+    }
+
+    const notesTextarea = card.querySelector(".exercise-notes");
+    if (notesTextarea && data.notes !== undefined) {
+      notesTextarea.value = data.notes || "";
+    }
+
+    const dropsetCheckbox = card.querySelector(".dropset-done");
+    if (dropsetCheckbox && data.dropset_done !== undefined) {
+      dropsetCheckbox.checked = data.dropset_done === 1;
+    }
+
+    if (data.effort_tag !== undefined) {
+      card.querySelectorAll(".weight-change__btn").forEach((btn) => {
+        btn.setAttribute(
+          "aria-pressed",
+          btn.dataset.effortTag === data.effort_tag ? "true" : "false"
+        );
+      });
+    }
   }
 
   setupExerciseCard(card, sessionExerciseId) {
-    const autoSave = new AutoSave(this.sessionId, sessionExerciseId);
+    const autoSave = this.autoSave;
 
     // Setup weight/reps inputs (debounced 1s)
     const weightInputs = card.querySelectorAll(".set-weight");
     const repsInputs = card.querySelectorAll(".set-reps");
 
+    // Each edit sends only the set or field it changed
     [...weightInputs, ...repsInputs].forEach((input) => {
       input.addEventListener("input", () => {
-        const data = this.collectExerciseData(card, false);
-        autoSave.saveDebounced("sets", data, 1000);
+        const data = this.collectSetData(card, input.dataset.setNumber);
+        autoSave.saveDebounced(sessionExerciseId, data, 1000);
       });
     });
 
@@ -349,8 +645,8 @@ class SessionManager {
     const notesTextarea = card.querySelector(".exercise-notes");
     if (notesTextarea) {
       notesTextarea.addEventListener("input", () => {
-        const data = this.collectExerciseData(card, false);
-        autoSave.saveDebounced("notes", data, 2000);
+        const data = this.collectFieldData(card, "notes");
+        autoSave.saveDebounced(sessionExerciseId, data, 2000);
       });
     }
 
@@ -374,8 +670,8 @@ class SessionManager {
     const doneCheckboxes = card.querySelectorAll(".set-done");
     doneCheckboxes.forEach((checkbox) => {
       checkbox.addEventListener("change", () => {
-        const data = this.collectExerciseData(card, false);
-        autoSave.saveImmediate(data);
+        const data = this.collectSetData(card, checkbox.dataset.setNumber);
+        autoSave.saveImmediate(sessionExerciseId, data);
 
         // Start rest timer when checking a set as done
         if (checkbox.checked && restSeconds > 0) {
@@ -396,8 +692,8 @@ class SessionManager {
     const dropsetCheckbox = card.querySelector(".dropset-done");
     if (dropsetCheckbox) {
       dropsetCheckbox.addEventListener("change", () => {
-        const data = this.collectExerciseData(card, false);
-        autoSave.saveImmediate(data);
+        const data = this.collectFieldData(card, "dropset_done");
+        autoSave.saveImmediate(sessionExerciseId, data);
       });
     }
 
@@ -415,78 +711,106 @@ class SessionManager {
           btn.setAttribute("aria-pressed", "true");
         }
 
-        const data = this.collectExerciseData(card, true);
-        autoSave.saveImmediate(data);
+        const data = this.collectFieldData(card, "effort_tag");
+        autoSave.saveImmediate(sessionExerciseId, data);
       });
     });
-
-    this.autoSavers.set(sessionExerciseId, autoSave);
   }
 
+  /**
+   * The whole card, as sent on finish, with the revisions it was edited from
+   */
   collectExerciseData(card, includeEffortTag = false) {
-    const sessionExerciseId = parseInt(card.dataset.sessionExerciseId);
     const data = {
       sets: [],
+      fields_revision: parseInt(card.dataset.fieldsRevision) || 0,
     };
 
-    // Collect notes
-    const notesTextarea = card.querySelector(".exercise-notes");
-    if (notesTextarea) {
-      data.notes = notesTextarea.value.trim() || null;
-    }
-
-    // Collect dropset
-    const dropsetCheckbox = card.querySelector(".dropset-done");
-    if (dropsetCheckbox) {
-      data.dropset_done = dropsetCheckbox.checked ? 1 : 0;
-    }
-
     // Collect effort tag - only include when explicitly requested (user interaction)
-    if (includeEffortTag) {
-      const increaseBtn = card.querySelector('.weight-change__btn[data-effort-tag="increase"]');
-      const decreaseBtn = card.querySelector('.weight-change__btn[data-effort-tag="decrease"]');
-      if (increaseBtn?.getAttribute("aria-pressed") === "true") {
-        data.effort_tag = "increase";
-      } else if (decreaseBtn?.getAttribute("aria-pressed") === "true") {
-        data.effort_tag = "decrease";
-      } else {
-        // Neither pressed = "good" (default state)
-        data.effort_tag = "good";
+    // This prevents overwriting None with "good" on other saves
+    const fields = includeEffortTag ? FIELDS : FIELDS.filter((f) => f !== "effort_tag");
+    for (const field of fields) {
+      const value = this.fieldValue(card, field);
+      if (value !== undefined) {
+        data[field] = value;
       }
     }
-    // If includeEffortTag is false, effort_tag is not included in data
-    // This prevents overwriting None with "good" on weight/reps/notes changes
 
-    // Collect sets
-    const setRows = card.querySelectorAll(".set-row");
-    setRows.forEach((row) => {
-      const setNumber = parseInt(
-        row.querySelector(".set-weight")?.dataset.setNumber
-      );
-      const weightInput = row.querySelector(".set-weight");
-      const repsInput = row.querySelector(".set-reps");
-      const doneCheckbox = row.querySelector(".set-done");
-
-      if (setNumber && weightInput && repsInput && doneCheckbox) {
-        const weight = parseFloat(weightInput.value) || 0;
-        const reps = parseInt(repsInput.value) || 0;
-        const isDone = doneCheckbox.checked ? 1 : 0;
-
-        // Only include sets that have been started (weight or reps entered)
-        if (weight > 0 || reps > 0 || isDone) {
-          data.sets.push({
-            set_number: setNumber,
-            weight_kg: weight,
-            reps: reps,
-            is_done: isDone,
-          });
-        }
+    card.querySelectorAll(".set-row").forEach((row) => {
+      const set = this.setValue(row);
+      if (set) {
+        data.sets.push(set);
       }
     });
 
     return data;
   }
 
+  /**
+   * One set row, with the revision it was edited from
+   */
+  collectSetData(card, setNumber) {
+    const row = card.querySelector(`.set-row[data-set-number="${setNumber}"]`);
+    const set = row ? this.setValue(row) : null;
+    return { sets: set ? [set] : [] };
+  }
+
+  /**
+   * One of notes, effort_tag or dropset_done, with the fields' revision
+   */
+  collectFieldData(card, field) {
+    return {
+      [field]: this.fieldValue(card, field),
+      fields_revision: parseInt(card.dataset.fieldsRevision) || 0,
+    };
+  }
+
+  fieldValue(card, field) {
+    if (field === "notes") {
+      const notesTextarea = card.querySelector(".exercise-notes");
+      return notesTextarea ? notesTextarea.value.trim() || null : undefined;
+    }
+    if (field === "dropset_done") {
+      const dropsetCheckbox = card.querySelector(".dropset-done");
+      return dropsetCheckbox ? (dropsetCheckbox.checked ? 1 : 0) : undefined;
+    }
+    const increaseBtn = card.querySelector('.weight-change__btn[data-effort-tag="increase"]');
+    const decreaseBtn = card.querySelector('.weight-change__btn[data-effort-tag="decrease"]');
+    if (increaseBtn?.getAttribute("aria-pressed") === "true") {
+      return "increase";
+    }
+    if (decreaseBtn?.getAttribute("aria-pressed") === "true") {
+      return "decrease";
+    }
+    // Neither pressed = "good" (default state)
+    return "good";
+  }
+
+  setValue(row) {
+    const setNumber = parseInt(row.dataset.setNumber);
+    const weightInput = row.querySelector(".set-weight");
+    const repsInput = row.querySelector(".set-reps");
+    const doneCheckbox = row.querySelector(".set-done");
+    if (!setNumber || !weightInput || !repsInput || !doneCheckbox) {
+      return null;
+    }
+
+    const weight = parseFloat(weightInput.value) || 0;
+    const reps = parseInt(repsInput.value) || 0;
+    const isDone = doneCheckbox.checked ? 1 : 0;
+    // Only include sets that have been started (weight or reps entered)
+    if (!(weight > 0 || reps > 0 || isDone)) {
+      return null;
+    }
+    return {
+      set_number: setNumber,
+      weight_kg: weight,
+      reps: reps,
+      is_done: isDone,
+      revision: parseInt(row.dataset.revision) || 0,
+    };
+  }
+
   setupFinishButton() {
     const finishButton = document.getElementById("finish-workout");
     const modal = document.getElementById("finish-modal");
@@ -524,28 +848,28 @@ class SessionManager {
     confirmBtn.addEventListener("click", async () => {
       hideModal();
 
-      // Save all exercise data one final time
+      // Save all exercise data one final time, as a single batch
       const exerciseCards = document.querySelectorAll(".exercise-card");
-      const savePromises = [];
 
       for (const card of exerciseCards) {
         const sessionExerciseId = parseInt(
           card.dataset.sessionExerciseId
         );
-        const autoSave = this.autoSavers.get(sessionExerciseId);
-        if (autoSave) {
-          // Include effort_tag when finishing (final save should include all data)
-          const data = this.collectExerciseData(card, true);
-          // Only save if there are completed sets
-          const hasCompletedSets = data.sets.some((s) => s.is_done === 1);
-          if (hasCompletedSets) {
-            savePromises.push(autoSave.saveImmediate(data));
-          }
+        // Include effort_tag when finishing (final save should include all data)
+        const data = this.collectExerciseData(card, true);
+        // Only save if there are completed sets
+        const hasCompletedSets = data.sets.some((s) => s.is_done === 1);
+        if (sessionExerciseId && hasCompletedSets) {
+          this.autoSave.save(sessionExerciseId, data);
         }
       }
 
-      // Wait for all saves to complete
-      await Promise.all(savePromises);
+      try {
+        await this.autoSave.flush();
+      } catch (error) {
+        alert("Error saving. Try again.");
+        return;
+      }
 
       // Stop the rest timer
       this.restTimer.stop();
@@ -567,6 +891,7 @@ class SessionManager {
         }
 
         const result = await response.json();
+        await this.autoSave.forget().catch(() => {});
         window.location.href = result.redirect || "/";
       } catch (error) {
         console.error("Finish error:", error);
@@ -628,6 +953,7 @@ class SessionManager {
         }
 
         const result = await response.json();
+        await this.autoSave.forget().catch(() => {});
         window.location.href = result.redirect || "/";
       } catch (error) {
         console.error("Discard error:", error);
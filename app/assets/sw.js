@@ -1,17 +1,173 @@
 // Koifit Service Worker
-const CACHE_NAME = "koifit-v1";
+//
+// Served from /sw.js, which prepends ASSET_VERSION and PRECACHE_URLS (the
+// fingerprinted app shell). Shell assets are cache-first, session pages are
+// served from cache and refreshed in the background, their card fragments
+// come from the network and fall back to cache offline, and saves made
+// offline sit in the page's IndexedDB outbox until connectivity returns.
+const ASSET_VERSION = self.ASSET_VERSION || "dev";
+const PRECACHE_URLS = self.PRECACHE_URLS || [];
+const SHELL_CACHE = `koifit-shell-${ASSET_VERSION}`;
+const PAGES_CACHE = "koifit-pages";
+const SESSION_PAGE = /^\/sessions\/\d+$/;
+const SESSION_FRAGMENT = /^\/sessions\/\d+\/exercises\/\d+\/(card|previous)$/;
+const SESSION_END = /^\/sessions\/(\d+)\/(finish|discard)$/;
 
 // Timer state
 let timerTimeout = null;
 
-// Install event
+// Install event: precache the app shell
 self.addEventListener("install", (event) => {
-  self.skipWaiting();
+  event.waitUntil(
+    caches
+      .open(SHELL_CACHE)
+      .then((cache) => cache.addAll([...PRECACHE_URLS, "/", "/days"]))
+      .then(() => self.skipWaiting())
+  );
 });
 
-// Activate event
+// Activate event: drop shells from previous asset versions
 self.addEventListener("activate", (event) => {
-  event.waitUntil(clients.claim());
+  event.waitUntil(
+    caches
+      .keys()
+      .then((keys) =>
+        Promise.all(
+          keys
+            .filter((key) => key.startsWith("koifit-shell-") && key !== SHELL_CACHE)
+            .map((key) => caches.delete(key))
+        )
+      )
+      .then(() => clients.claim())
+  );
+});
+
+self.addEventListener("fetch", (event) => {
+  const url = new URL(event.request.url);
+  if (url.origin !== self.location.origin) {
+    return;
+  }
+
+  if (event.request.method === "POST") {
+    const ended = url.pathname.match(SESSION_END);
+    if (ended) {
+      event.respondWith(forgetSessionPage(event.request, ended[1]));
+    }
+    return;
+  }
+  if (event.request.method !== "GET") {
+    return;
+  }
+
+  if (url.pathname.startsWith("/assets/")) {
+    event.respondWith(cacheFirst(event.request));
+  } else if (SESSION_PAGE.test(url.pathname)) {
+    event.respondWith(staleWhileRevalidate(event, url.pathname));
+  } else if (SESSION_FRAGMENT.test(url.pathname)) {
+    event.respondWith(networkFirstCached(event.request, url.pathname));
+  } else if (event.request.mode === "navigate") {
+    event.respondWith(networkFirst(event.request));
+  }
+});
+
+// Fingerprinted assets never change, so a cached copy is always current
+async function cacheFirst(request) {
+  const cached = await caches.match(request);
+  if (cached) {
+    return cached;
+  }
+  const response = await fetch(request);
+  if (response.ok) {
+    const cache = await caches.open(SHELL_CACHE);
+    cache.put(request, response.clone());
+  }
+  return response;
+}
+
+// Session pages open instantly from cache; the page applies its local
+// drafts on load, and the cache is refreshed for next time
+async function staleWhileRevalidate(event, pathname) {
+  const cache = await caches.open(PAGES_CACHE);
+  const cached = await cache.match(pathname);
+  const refresh = fetch(event.request).then((response) => {
+    if (response.ok) {
+      cache.put(pathname, response.clone());
+    } else if (response.status === 404) {
+      cache.delete(pathname);
+    }
+    return response;
+  });
+  if (cached) {
+    event.waitUntil(refresh.catch(() => {}));
+    return cached;
+  }
+  return refresh;
+}
+
+// Cards are fetched after the page has loaded, so a stale copy would undo
+// newer data; the cached one is only for when the network is gone
+async function networkFirstCached(request, pathname) {
+  const cache = await caches.open(PAGES_CACHE);
+  try {
+    const response = await fetch(request);
+    if (response.ok) {
+      cache.put(pathname, response.clone());
+    } else if (response.status === 404) {
+      cache.delete(pathname);
+    }
+    return response;
+  } catch (error) {
+    const cached = await cache.match(pathname);
+    if (cached) {
+      return cached;
+    }
+    throw error;
+  }
+}
+
+async function networkFirst(request) {
+  try {
+    return await fetch(request);
+  } catch (error) {
+    const cached = await caches.match(request, { ignoreSearch: true });
+    if (cached) {
+      return cached;
+    }
+    throw error;
+  }
+}
+
+// A finished or discarded session, and its cards, must not be served from
+// cache again
+async function forgetSessionPage(request, sessionId) {
+  const response = await fetch(request);
+  if (response.ok) {
+    const cache = await caches.open(PAGES_CACHE);
+    const prefix = `/sessions/${sessionId}`;
+    const cached = await cache.keys();
+    await Promise.all(
+      cached
+        .filter((entry) => {
+          const { pathname } = new URL(entry.url);
+          return pathname === prefix || pathname.startsWith(`${prefix}/`);
+        })
+        .map((entry) => cache.delete(entry))
+    );
+  }
+  return response;
+}
+
+// Background Sync (where supported): ask open pages to replay their outbox
+self.addEventListener("sync", (event) => {
+  if (event.tag === "koifit-outbox") {
+    event.waitUntil(
+      clients.matchAll({ type: "window" }).then((clientList) => {
+        for (const client of clientList) {
+          client.postMessage({ type: "REPLAY_OUTBOX" });
+        }
+      })
+    );
+  }
 });
 
 // Listen for messages from the main app
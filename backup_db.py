@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+Write a compressed snapshot of the database into the backup directory.
+"""
+
+import asyncio
+
+from koifit.backup import create_backup
+from koifit.settings import get_backup_dir, get_backup_keep, get_db_path
+
+
+async def main():
+    """
+    Snapshot the database now and prune old snapshots.
+
+    Safe while the app is running: the copy is taken with the online backup
+    API and does not hold up writes.
+    """
+    db_path = get_db_path()
+    backup_dir = get_backup_dir(db_path)
+    print(f"Backing up {db_path} to {backup_dir}")
+    report = await create_backup(db_path, backup_dir, get_backup_keep())
+    if report is None:
+        raise SystemExit("Another backup is in progress.")
+    print(
+        f"Wrote {report['snapshot']} ({report['bytes']} bytes) in "
+        f"{report['copy_ms'] + report['check_ms'] + report['compress_ms']:.0f} ms; "
+        f"pruned {report['pruned']} old snapshots."
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
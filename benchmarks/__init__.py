@@ -0,0 +1,3 @@
+"""
+Benchmarks for Koifit hot paths.
+"""
@@ -0,0 +1,140 @@
+"""
+Benchmark the autosave write path against the previous per-set implementation.
+
+Usage: python -m benchmarks.autosave
+
+Commits are counted through the trace hook; each commit is one durable
+journal sync, so it is the fsync count per save.
+"""
+
+import asyncio
+
+from benchmarks.common import seeded_database, time_async
+from koifit.autosave import save_exercise_data
+from koifit.models import SaveExerciseRequest
+
+REPEAT = 200
+SET_COUNTS = [1, 3, 6]
+
+
+async def legacy_save(db, session_id, session_exercise_id, data):
+    """The original save_exercise body: SELECT + UPDATE/INSERT per set, two commits."""
+    cursor = await db.execute(
+        "SELECT id FROM session_exercise WHERE id = ? AND session_id = ?",
+        (session_exercise_id, session_id),
+    )
+    await cursor.fetchone()
+    updates = []
+    params = []
+    if data.notes is not None:
+        updates.append("next_time_note = ?")
+        params.append(data.notes)
+    if data.effort_tag is not None:
+        updates.append("effort_tag = ?")
+        params.append(data.effort_tag)
+    if data.dropset_done is not None:
+        updates.append("dropset_done = ?")
+        params.append(data.dropset_done)
+    if updates:
+        params.append(session_exercise_id)
+        await db.execute(
+            f"UPDATE session_exercise SET {', '.join(updates)} WHERE id = ?", params
+        )
+        await db.commit()
+    if data.sets:
+        for s in data.sets:
+            cursor = await db.execute(
+                "SELECT id FROM set_entry WHERE session_exercise_id = ? AND set_number = ?",
+                (session_exercise_id, s.set_number),
+            )
+            existing = await cursor.fetchone()
+            if existing:
+                await db.execute(
+                    "UPDATE set_entry SET weight_kg = ?, reps = ?, is_done = ? WHERE id = ?",
+                    (s.weight_kg, s.reps, s.is_done, existing[0]),
+                )
+            else:
+                await db.execute(
+                    """INSERT INTO set_entry
+                       (session_exercise_id, set_number, weight_kg, reps, is_done, is_drop)
+                       VALUES (?, ?, ?, ?, ?, 0)""",
+                    (session_exercise_id, s.set_number, s.weight_kg, s.reps, s.is_done),
+                )
+        await db.commit()
+
+
+class StatementLog:
+    """Trace hook counting statements and commits."""
+
+    def __init__(self):
+        self.statements = 0
+        self.commits = 0
+
+    def __call__(self, statement):
+        keyword = statement.lstrip().split(None, 1)[0].upper()
+        if keyword == "COMMIT":
+            self.commits += 1
+        elif keyword != "BEGIN":
+            self.statements += 1
+
+
+def payload(set_count, n, notes="Stay tight"):
+    return SaveExerciseRequest(
+        notes=notes,
+        dropset_done=0,
+        sets=[
+            {"set_number": i + 1, "weight_kg": 50.0 + n, "reps": 8, "is_done": 1}
+            for i in range(set_count)
+        ],
+    )
+
+
+async def run_case(save, set_count, changing):
+    """Return (median ms, max ms, statements/save, commits/save)."""
+    async with seeded_database() as (_, db):
+        cursor = await db.execute(
+            "INSERT INTO session (day_id, date, is_finished) VALUES (1, '2030-01-01', 0)"
+        )
+        session_id = cursor.lastrowid
+        cursor = await db.execute(
+            """INSERT INTO session_exercise (session_id, slot_id, exercise_id, dropset_done)
+               VALUES (?, 1, 1, 0)""",
+            (session_id,),
+        )
+        se_id = cursor.lastrowid
+        await db.commit()
+        await save(db, session_id, se_id, payload(set_count, 0))
+
+        log = StatementLog()
+        await db.set_trace_callback(log)
+        counter = iter(range(1, REPEAT + 1))
+
+        async def one_save():
+            n = next(counter) if changing else 0
+            await save(db, session_id, se_id, payload(set_count, n))
+
+        median, worst = await time_async(one_save, REPEAT)
+        await db.set_trace_callback(None)
+        return median, worst, log.statements / REPEAT, log.commits / REPEAT
+
+
+async def main():
+    print(
+        f"{'impl':>8} {'sets':>5} {'payload':>10} {'p50 ms':>8} {'max ms':>8} "
+        f"{'stmts':>6} {'fsyncs':>7}"
+    )
+    for set_count in SET_COUNTS:
+        for changing in (True, False):
+            for name, save in (("legacy", legacy_save), ("upsert", save_exercise_data)):
+                median, worst, statements, commits = await run_case(
+                    save, set_count, changing
+                )
+                kind = "changed" if changing else "unchanged"
+                print(
+                    f"{name:>8} {set_count:>5} {kind:>10} {median:>8.3f} {worst:>8.3f} "
+                    f"{statements:>6.1f} {commits:>7.1f}"
+                )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,152 @@
+"""
+Benchmark autosave latency while a backup is running.
+
+Usage: python -m benchmarks.backup [--years 10] [--other-users 0]
+       [--idle 3]
+
+Autosaves are sent back to back through create_app and the httpx ASGI
+transport while the database is being backed up, and their latency is
+reported for each way of taking the backup:
+
+  idle               no backup, for --idle seconds
+  online, stepped    koifit.backup defaults: small steps with pauses
+  online, one step   backup API copying everything in a single step
+  locked copy        file copy holding the writer lock, so the copy
+                     cannot be torn; what copying db.sqlite safely costs
+
+Every backup runs in a thread, as the app's does; the timings include
+the integrity check and the compression.
+"""
+
+import argparse
+import asyncio
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+from asgi_lifespan import LifespanManager
+from httpx import ASGITransport, AsyncClient
+
+from benchmarks.common import percentile
+from benchmarks.generate import generate
+from koifit import backup
+from main import create_app
+
+# Seconds of autosaves before the first measured run
+WARMUP = 0.5
+
+
+async def _setup_session(client, pool):
+    """Start a session on day 1; return its autosave URL."""
+    resp = await client.post("/sessions/start/1", follow_redirects=False)
+    session_id = int(resp.headers["location"].rsplit("/", 1)[-1])
+    await client.get(f"/sessions/{session_id}")
+    async with pool.reader() as db:
+        cursor = await db.execute(
+            "SELECT id FROM session_exercise WHERE session_id = ? ORDER BY id",
+            (session_id,),
+        )
+        se_id = (await cursor.fetchall())[0]["id"]
+    return f"/sessions/{session_id}/exercises/{se_id}/save"
+
+
+async def _autosave_until(client, url, done):
+    """Save back to back until done() is true; returns latencies in ms."""
+    samples = []
+    n = 0
+    while not done():
+        sets = [{"set_number": 1, "weight_kg": 50 + n % 10, "reps": 8, "is_done": 1}]
+        started = time.perf_counter()
+        resp = await client.post(url, json={"sets": sets})
+        samples.append((time.perf_counter() - started) * 1000)
+        resp.raise_for_status()
+        n += 1
+    return samples
+
+
+async def _locked_copy(pool, db_path, backup_dir):
+    """Copy the database file while holding the writer lock."""
+    async with pool.writer() as db:
+        # Everything in the WAL goes into the main file before copying it
+        await db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        target = backup_dir / "locked-copy.sqlite"
+        await asyncio.to_thread(shutil.copyfile, db_path, target)
+    await asyncio.to_thread(backup.compress_file, target, target.with_suffix(".gz"))
+    target.unlink()
+
+
+def _scenarios(pool, db_path, backup_dir):
+    """name -> coroutine function taking the backup, None for idle."""
+    return {
+        "idle": None,
+        "online, stepped": lambda: backup.create_backup(db_path, backup_dir, keep=1),
+        "online, one step": lambda: backup.create_backup(
+            db_path, backup_dir, keep=1, pages=-1, pause=0
+        ),
+        "locked copy": lambda: _locked_copy(pool, db_path, backup_dir),
+    }
+
+
+async def run(db_path, backup_dir, idle):
+    app = create_app(db_path=db_path)
+    async with LifespanManager(app):
+        transport = ASGITransport(app=app)
+        async with AsyncClient(transport=transport, base_url="http://bench") as client:
+            pool = app.state.pool
+            url = await _setup_session(client, pool)
+            warmup = time.monotonic() + WARMUP
+            await _autosave_until(client, url, lambda: time.monotonic() > warmup)
+
+            results = {}
+            for name, take_backup in _scenarios(pool, db_path, backup_dir).items():
+                started = time.perf_counter()
+                if take_backup is None:
+                    deadline = time.monotonic() + idle
+                    samples = await _autosave_until(
+                        client, url, lambda d=deadline: time.monotonic() > d
+                    )
+                else:
+                    task = asyncio.create_task(take_backup())
+                    samples = await _autosave_until(client, url, task.done)
+                    await task
+                results[name] = {
+                    "duration_ms": (time.perf_counter() - started) * 1000,
+                    "saves": len(samples),
+                    "p50_ms": percentile(samples, 50),
+                    "p99_ms": percentile(samples, 99),
+                    "max_ms": max(samples),
+                }
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--years", type=int, default=10)
+    parser.add_argument("--other-users", type=int, default=0)
+    parser.add_argument("--idle", type=float, default=3, help="idle run seconds")
+    return parser.parse_args(argv)
+
+
+async def main():
+    args = parse_args()
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        db_path = tmp / "bench.sqlite"
+        await generate(db_path, years=args.years, other_users=args.other_users)
+        print(f"Database: {db_path.stat().st_size / 2**20:.1f} MiB")
+        results = await run(db_path, tmp / "backups", args.idle)
+
+    print(
+        f"{'backup':<18}{'duration ms':>12}{'saves':>8}"
+        f"{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}"
+    )
+    for name, r in results.items():
+        print(
+            f"{name:<18}{r['duration_ms']:>12.0f}{r['saves']:>8}"
+            f"{r['p50_ms']:>10.2f}{r['p99_ms']:>10.2f}{r['max_ms']:>10.2f}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,178 @@
+"""
+Shared helpers for benchmarks: fresh databases, synthetic history and query counting.
+"""
+
+import math
+import statistics
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from datetime import date, timedelta
+from pathlib import Path
+
+import aiosqlite
+
+from koifit.db import init_database
+from koifit.users import DEFAULT_USER_ID
+
+
+@asynccontextmanager
+async def seeded_database():
+    """Yield (path, connection) for a freshly seeded database in a temp dir."""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "bench.sqlite"
+        await init_database(path, overwrite=True)
+        async with aiosqlite.connect(str(path)) as db:
+            db.row_factory = aiosqlite.Row
+            yield path, db
+
+
+async def add_day(db, slot_count, label="Bench"):
+    """Add a day with slot_count slots reusing the seeded exercises; return day id."""
+    cursor = await db.execute("SELECT COALESCE(MAX(ordinal), 0) + 1 FROM day")
+    ordinal = (await cursor.fetchone())[0]
+    cursor = await db.execute(
+        "INSERT INTO day (label, ordinal) VALUES (?, ?)", (label, ordinal)
+    )
+    day_id = cursor.lastrowid
+    cursor = await db.execute("SELECT id FROM exercise ORDER BY id")
+    exercise_ids = [row[0] for row in await cursor.fetchall()]
+    await db.executemany(
+        """INSERT INTO slot (day_id, ordinal, title, preferred_exercise_id, warmup_sets,
+                             working_sets_count, rep_target, rpe_range, rest_minutes, has_dropset)
+           VALUES (?, ?, ?, ?, '1', 3, '8-10', '9-10', 2.0, 0)""",
+        [
+            (day_id, i + 1, f"Slot {i + 1}", exercise_ids[i % len(exercise_ids)])
+            for i in range(slot_count)
+        ],
+    )
+    await db.commit()
+    return day_id
+
+
+async def add_history(db, day_id, session_count, sets_per_exercise=3, start=None):
+    """Add session_count finished sessions for day_id, one per day from start."""
+    start = start or date(2015, 1, 1)
+    cursor = await db.execute(
+        "SELECT id, preferred_exercise_id FROM slot WHERE day_id = ?", (day_id,)
+    )
+    slots = await cursor.fetchall()
+    for n in range(session_count):
+        cursor = await db.execute(
+            "INSERT INTO session (day_id, date, is_finished) VALUES (?, ?, 1)",
+            (day_id, (start + timedelta(days=n)).isoformat()),
+        )
+        session_id = cursor.lastrowid
+        for slot_id, exercise_id in slots:
+            cursor = await db.execute(
+                """INSERT INTO session_exercise
+                   (session_id, slot_id, exercise_id, effort_tag, dropset_done)
+                   VALUES (?, ?, ?, 'good', 0)""",
+                (session_id, slot_id, exercise_id),
+            )
+            se_id = cursor.lastrowid
+            await db.executemany(
+                """INSERT INTO set_entry
+                   (session_exercise_id, set_number, weight_kg, reps, is_done, is_drop)
+                   VALUES (?, ?, ?, ?, 1, 0)""",
+                [
+                    (se_id, s + 1, 40.0 + (n % 20) * 2.5, 10 - s)
+                    for s in range(sets_per_exercise)
+                ],
+            )
+    await db.commit()
+
+
+async def add_years(
+    db,
+    years,
+    sessions_per_week=4,
+    sets_per_exercise=3,
+    start=None,
+    user_id=DEFAULT_USER_ID,
+):
+    """
+    Add years of finished sessions cycling through the user's days.
+
+    Trains sessions_per_week days a week (at most 7); weights creep up over
+    time. Summaries are not written; call rebuild_summaries afterwards if
+    they are needed. Returns the number of sessions added.
+    """
+    start = start or date(2015, 1, 1)
+    cursor = await db.execute(
+        "SELECT id FROM day WHERE user_id = ? ORDER BY ordinal", (user_id,)
+    )
+    day_ids = [row[0] for row in await cursor.fetchall()]
+    cursor = await db.execute(
+        """SELECT sl.id, sl.day_id, sl.preferred_exercise_id
+           FROM slot sl JOIN day d ON d.id = sl.day_id WHERE d.user_id = ?""",
+        (user_id,),
+    )
+    slots = {}
+    for slot_id, day_id, exercise_id in await cursor.fetchall():
+        slots.setdefault(day_id, []).append((slot_id, exercise_id))
+
+    added = 0
+    for offset in range(years * 365):
+        if offset % 7 >= sessions_per_week:
+            continue
+        day_id = day_ids[added % len(day_ids)]
+        cursor = await db.execute(
+            "INSERT INTO session (user_id, day_id, date, is_finished) VALUES (?, ?, ?, 1)",
+            (user_id, day_id, (start + timedelta(days=offset)).isoformat()),
+        )
+        session_id = cursor.lastrowid
+        weight = 40.0 + (offset // 28) * 0.5
+        for slot_id, exercise_id in slots.get(day_id, []):
+            cursor = await db.execute(
+                """INSERT INTO session_exercise
+                   (session_id, slot_id, exercise_id, effort_tag, dropset_done)
+                   VALUES (?, ?, ?, 'good', 0)""",
+                (session_id, slot_id, exercise_id),
+            )
+            await db.executemany(
+                """INSERT INTO set_entry
+                   (session_exercise_id, set_number, weight_kg, reps, is_done, is_drop)
+                   VALUES (?, ?, ?, ?, 1, 0)""",
+                [
+                    (cursor.lastrowid, s + 1, weight, 10 - s)
+                    for s in range(sets_per_exercise)
+                ],
+            )
+        added += 1
+    await db.commit()
+    return added
+
+
+class QueryCounter:
+    """Count statements executed on an aiosqlite connection via the trace hook."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, statement):
+        if not statement.lstrip().upper().startswith(("BEGIN", "COMMIT")):
+            self.count += 1
+
+    async def attach(self, db):
+        await db.set_trace_callback(self)
+
+    async def detach(self, db):
+        await db.set_trace_callback(None)
+
+
+async def time_async(fn, repeat):
+    """Run fn repeat times; return (median, max) latency in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        await fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples), max(samples)
+
+
+def percentile(samples, pct):
+    """Nearest-rank percentile of samples (pct in 0-100)."""
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
@@ -0,0 +1,246 @@
+"""
+End-to-end benchmark of the main endpoints against a large synthetic history.
+
+Usage: python -m benchmarks.endpoints [--years 10] [--sessions-per-week 4]
+       [--sets 3] [--other-users 0] [--repeat 200] [--output FILE]
+       [--compare FILE]
+
+Requests go through create_app and the httpx ASGI transport, so routing,
+dependencies, templates and middleware are all included. For every
+endpoint it reports p50/p99 latency, SQL statements per request and the
+peak Python memory allocated while handling one request. Requests are
+made as the default user; --other-users adds users with the same history,
+which should leave the timings flat. Results are
+written as JSON (benchmarks/results/<commit>.json by default); --compare
+prints the change against an earlier result file.
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import sqlite3
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from datetime import UTC, datetime
+from pathlib import Path
+
+from asgi_lifespan import LifespanManager
+from httpx import ASGITransport, AsyncClient
+
+from benchmarks.common import percentile
+from benchmarks.generate import generate
+from main import create_app
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+# Requests measured with tracemalloc on; it slows them down, so they are
+# kept out of the latency samples
+ALLOC_REPEAT = 20
+
+WARMUP = 5
+
+
+class StatementCounter:
+    """Trace hook counting statements, transaction control excluded."""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, statement):
+        if not statement.lstrip().upper().startswith(("BEGIN", "COMMIT")):
+            self.count += 1
+
+
+async def _setup_session(client, pool):
+    """Start a session on day 1; return (session_id, session_exercise_id, slot_id)."""
+    resp = await client.post("/sessions/start/1", follow_redirects=False)
+    session_id = int(resp.headers["location"].rsplit("/", 1)[-1])
+    await client.get(f"/sessions/{session_id}")
+    async with pool.reader() as db:
+        cursor = await db.execute(
+            "SELECT id, slot_id FROM session_exercise WHERE session_id = ? ORDER BY id",
+            (session_id,),
+        )
+        rows = await cursor.fetchall()
+    return session_id, rows[0]["id"], rows[0]["slot_id"]
+
+
+def _endpoints(session_id, se_id, slot_id):
+    """name -> callable(client, n) issuing the n-th request of that endpoint."""
+
+    def save_exercise(client, n):
+        sets = [{"set_number": 1, "weight_kg": 50 + n % 10, "reps": 8, "is_done": 1}]
+        return client.post(
+            f"/sessions/{session_id}/exercises/{se_id}/save", json={"sets": sets}
+        )
+
+    def save_session(client, n):
+        sets = [
+            {"set_number": s, "weight_kg": 50 + n % 10, "reps": 8, "is_done": 1}
+            for s in (1, 2, 3)
+        ]
+        return client.post(
+            f"/sessions/{session_id}/save",
+            json={"exercises": [{"session_exercise_id": se_id, "sets": sets}]},
+        )
+
+    return {
+        "home": lambda client, n: client.get("/"),
+        "days": lambda client, n: client.get("/days"),
+        "session_page": lambda client, n: client.get(f"/sessions/{session_id}"),
+        "save_exercise": save_exercise,
+        "save_session": save_session,
+        "slot_history": lambda client, n: client.get(f"/slots/{slot_id}/history"),
+        "slot_history_json": lambda client, n: client.get(
+            f"/slots/{slot_id}/history.json"
+        ),
+        "analytics_json": lambda client, n: client.get("/analytics.json?weeks=52"),
+    }
+
+
+async def _measure(client, pool, request, repeat):
+    for n in range(WARMUP):
+        (await request(client, n)).raise_for_status()
+
+    # Past the warmup values, so saves really write
+    counter = StatementCounter()
+    await pool.set_trace_callback(counter)
+    (await request(client, WARMUP)).raise_for_status()
+    await pool.set_trace_callback(None)
+
+    samples = []
+    for n in range(repeat):
+        started = time.perf_counter()
+        resp = await request(client, n)
+        samples.append((time.perf_counter() - started) * 1000)
+        resp.raise_for_status()
+
+    peaks = []
+    tracemalloc.start()
+    try:
+        for n in range(ALLOC_REPEAT):
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            await request(client, n)
+            peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "requests": repeat,
+        "p50_ms": round(percentile(samples, 50), 3),
+        "p99_ms": round(percentile(samples, 99), 3),
+        "max_ms": round(max(samples), 3),
+        "queries": counter.count,
+        "alloc_peak_kib": round(percentile(peaks, 50) / 1024, 1),
+    }
+
+
+async def run(db_path, repeat):
+    app = create_app(db_path=db_path)
+    results = {}
+    async with LifespanManager(app):
+        pool = app.state.pool
+        transport = ASGITransport(app=app)
+        async with AsyncClient(transport=transport, base_url="http://bench") as client:
+            session_id, se_id, slot_id = await _setup_session(client, pool)
+            for name, request in _endpoints(session_id, se_id, slot_id).items():
+                results[name] = await _measure(client, pool, request, repeat)
+                print(_format_row(name, results[name]))
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _format_row(name, result):
+    return (
+        f"{name:<18} {result['p50_ms']:>8.2f} {result['p99_ms']:>8.2f} "
+        f"{result['queries']:>8} {result['alloc_peak_kib']:>10.1f}"
+    )
+
+
+def compare(previous, current):
+    """Print per-endpoint changes of current against a previous result file."""
+    print(f"\nAgainst {previous.get('commit') or 'previous run'}:")
+    for name, result in current["endpoints"].items():
+        before = previous["endpoints"].get(name)
+        if before is None:
+            continue
+        changes = []
+        for key in ("p50_ms", "p99_ms", "alloc_peak_kib"):
+            if before[key]:
+                delta = (result[key] - before[key]) / before[key] * 100
+                changes.append(f"{key} {delta:+.0f}%")
+        if result["queries"] != before["queries"]:
+            changes.append(f"queries {before['queries']} -> {result['queries']}")
+        print(f"{name:<18} " + ", ".join(changes))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--years", type=int, default=10)
+    parser.add_argument("--sessions-per-week", type=int, default=4, choices=range(1, 8))
+    parser.add_argument("--sets", type=int, default=3, help="sets per exercise")
+    parser.add_argument("--other-users", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--output", type=Path, help="result JSON file")
+    parser.add_argument("--compare", type=Path, help="earlier result JSON file")
+    return parser.parse_args(argv)
+
+
+async def main():
+    args = parse_args()
+    commit = _git_commit()
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "bench.sqlite"
+        sessions = await generate(
+            db_path, args.years, args.sessions_per_week, args.sets, args.other_users
+        )
+        print(
+            f"{sessions} sessions over {args.years} years, "
+            f"{args.other_users} other users\n"
+        )
+        print(
+            f"{'endpoint':<18} {'p50 ms':>8} {'p99 ms':>8} {'queries':>8} {'alloc KiB':>10}"
+        )
+        endpoints = await run(db_path, args.repeat)
+
+    result = {
+        "commit": commit,
+        "created_at": datetime.now(UTC).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "params": {
+            "years": args.years,
+            "sessions_per_week": args.sessions_per_week,
+            "sets_per_exercise": args.sets,
+            "sessions": sessions,
+            "other_users": args.other_users,
+            "repeat": args.repeat,
+        },
+        "endpoints": endpoints,
+    }
+    output = args.output or RESULTS_DIR / f"{commit or 'latest'}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(result, indent=2) + "\n")
+    print(f"\nWrote {output}")
+
+    if args.compare:
+        compare(json.loads(args.compare.read_text()), result)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,75 @@
+"""
+Build a database with years of synthetic history for the seeded program.
+
+Usage: python -m benchmarks.generate OUTPUT [--years 10] [--sessions-per-week 4]
+       [--sets 3] [--other-users 0]
+
+--other-users adds that many more users, each with their own copy of the
+program and the same amount of history; the default user's history is
+unchanged, so endpoint timings show what other users' data costs.
+"""
+
+import argparse
+import asyncio
+import time
+from pathlib import Path
+
+import aiosqlite
+
+from benchmarks.common import add_years
+from koifit.db import init_database
+from koifit.summaries import rebuild_summaries
+from koifit.users import create_user
+
+
+async def generate(
+    path, years=10, sessions_per_week=4, sets_per_exercise=3, other_users=0
+):
+    """
+    Create path from schema + seed, add history and its summaries.
+
+    Returns the number of sessions of the default user.
+    """
+    await init_database(path, overwrite=True)
+    async with aiosqlite.connect(str(path)) as db:
+        db.row_factory = aiosqlite.Row
+        sessions = await add_years(
+            db, years, sessions_per_week, sets_per_exercise=sets_per_exercise
+        )
+        for n in range(other_users):
+            user = await create_user(db, f"bench-{n + 1}")
+            await add_years(
+                db,
+                years,
+                sessions_per_week,
+                sets_per_exercise=sets_per_exercise,
+                user_id=user.id,
+            )
+        await rebuild_summaries(db)
+    return sessions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("output", type=Path, help="database file (overwritten)")
+    parser.add_argument("--years", type=int, default=10)
+    parser.add_argument("--sessions-per-week", type=int, default=4, choices=range(1, 8))
+    parser.add_argument("--sets", type=int, default=3, help="sets per exercise")
+    parser.add_argument("--other-users", type=int, default=0)
+    return parser.parse_args(argv)
+
+
+async def main():
+    args = parse_args()
+    started = time.perf_counter()
+    sessions = await generate(
+        args.output, args.years, args.sessions_per_week, args.sets, args.other_users
+    )
+    print(
+        f"Wrote {sessions} sessions to {args.output} "
+        f"in {time.perf_counter() - started:.1f}s"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,68 @@
+"""
+Benchmark the session page loader as slots and history grow.
+
+Usage: python -m benchmarks.session_page
+"""
+
+import asyncio
+
+from benchmarks.common import (
+    QueryCounter,
+    add_day,
+    add_history,
+    seeded_database,
+    time_async,
+)
+from koifit.catalog import ProgramCatalog
+from koifit.loaders import load_session_view
+
+SLOT_COUNTS = [5, 10, 20, 40]
+HISTORY_SIZES = [0, 100, 1000]
+REPEAT = 50
+
+
+async def run_case(slot_count, history_size):
+    """Return (first-load queries, steady-state queries, median ms, max ms)."""
+    async with seeded_database() as (_, db):
+        day_id = await add_day(db, slot_count)
+        await add_history(db, day_id, history_size)
+        cursor = await db.execute(
+            "INSERT INTO session (day_id, date, is_finished) VALUES (?, '2030-01-01', 0)",
+            (day_id,),
+        )
+        session_id = cursor.lastrowid
+        await db.commit()
+        catalog = ProgramCatalog()
+        await catalog.reload(db)
+
+        counter = QueryCounter()
+        await counter.attach(db)
+        await load_session_view(db, session_id, catalog)
+        first_load = counter.count
+        counter.count = 0
+        await load_session_view(db, session_id, catalog)
+        steady = counter.count
+        await counter.detach(db)
+
+        median, worst = await time_async(
+            lambda: load_session_view(db, session_id, catalog), REPEAT
+        )
+        return first_load, steady, median, worst
+
+
+async def main():
+    print(
+        f"{'slots':>6} {'history':>8} {'q(first)':>9} {'q(steady)':>10} "
+        f"{'p50 ms':>8} {'max ms':>8}"
+    )
+    for slot_count in SLOT_COUNTS:
+        for history_size in HISTORY_SIZES:
+            first, steady, median, worst = await run_case(slot_count, history_size)
+            print(
+                f"{slot_count:>6} {history_size:>8} {first:>9} {steady:>10} "
+                f"{median:>8.2f} {worst:>8.2f}"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,254 @@
+"""
+Benchmark cold start: import time and time to the first response.
+
+Usage: python -m benchmarks.startup [--repeat 10] [--path /] [--imports 15]
+
+Every run is a fresh interpreter that imports main, runs the app's startup
+(lifespan) and serves one GET through a bare ASGI call, as a container
+woken by a request would. Runs are timed with the system-wide monotonic
+clock from before the process is spawned; "interpreter" is everything
+before `import main`, the benchmark's own imports included. Scenarios:
+
+  restart            existing database, bytecode and templates compiled
+  first boot         no database: migrations and seed are run
+  first boot, copy   no database: the TEMPLATE_DB_PATH file is copied
+  no bytecode        existing database, nothing compiled beforehand
+
+--imports also lists the modules that take longest to import themselves
+(python -X importtime), to see what deferring an import would save.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+PHASES = ("interpreter", "imports", "startup", "first_response", "total")
+
+
+async def _lifespan(app, event):
+    """Send a lifespan event; returns the task running the lifespan."""
+    received = asyncio.Queue()
+    sent = asyncio.Queue()
+    await received.put({"type": f"lifespan.{event}"})
+
+    task = asyncio.create_task(
+        app(
+            {"type": "lifespan", "asgi": {"version": "3.0"}, "state": {}},
+            received.get,
+            sent.put,
+        )
+    )
+    message = await sent.get()
+    if message["type"] != "lifespan.startup.complete":
+        raise RuntimeError(f"Startup failed: {message}")
+    return task, received, sent
+
+
+async def _get(app, path):
+    """Status of a GET request made straight to the ASGI app."""
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(b"host", b"bench"), (b"accept-encoding", b"gzip")],
+        "client": ("127.0.0.1", 0),
+        "server": ("bench", 80),
+        "state": {},
+    }
+    await app(scope, receive, send)
+    return messages[0]["status"]
+
+
+async def _serve_first_request(app, path):
+    task, received, sent = await _lifespan(app, "startup")
+    ready = time.monotonic()
+    status = await _get(app, path)
+    first_response = time.monotonic()
+    await received.put({"type": "lifespan.shutdown"})
+    await sent.get()
+    await task
+    return ready, first_response, status
+
+
+def child(path):
+    """One cold start; prints the phase timestamps as JSON."""
+    started = time.monotonic()
+    import main
+
+    imported = time.monotonic()
+    ready, first_response, status = asyncio.run(_serve_first_request(main.app, path))
+    print(
+        json.dumps(
+            {
+                "started": started,
+                "imported": imported,
+                "ready": ready,
+                "first_response": first_response,
+                "status": status,
+            }
+        )
+    )
+
+
+def run_once(env, path):
+    """Seconds spent in each phase of one cold start."""
+    spawned = time.monotonic()
+    result = subprocess.run(
+        [sys.executable, "-m", "benchmarks.startup", "--child", path],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = json.loads(result.stdout.splitlines()[-1])
+    if times["status"] != 200:
+        raise RuntimeError(f"GET {path} returned {times['status']}")
+    return {
+        "interpreter": times["started"] - spawned,
+        "imports": times["imported"] - times["started"],
+        "startup": times["ready"] - times["imported"],
+        "first_response": times["first_response"] - times["ready"],
+        "total": times["first_response"] - spawned,
+    }
+
+
+def _base_env(tmp):
+    env = dict(os.environ)
+    env.update(
+        KOIFIT_ENV="production",
+        MAINTENANCE_INTERVAL="0",
+        TEMPLATE_CACHE_DIR=str(tmp / "template-cache"),
+    )
+    env.pop("TEMPLATE_DB_PATH", None)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    return env
+
+
+def _prepare(env, tmp):
+    """Build the template database and warm the bytecode caches."""
+    prepared = dict(env, TEMPLATE_DB_PATH=str(tmp / "template.sqlite"))
+    subprocess.run(
+        [sys.executable, "prepare_image.py"],
+        cwd=ROOT,
+        env=prepared,
+        check=True,
+        capture_output=True,
+    )
+    subprocess.run(
+        [sys.executable, "-m", "compileall", "-q", "koifit", "main.py"],
+        cwd=ROOT,
+        check=True,
+    )
+    return prepared
+
+
+def scenarios(tmp, repeat):
+    """name -> list of environments, one per run."""
+    env = _base_env(tmp)
+    prepared = _prepare(env, tmp)
+    existing = dict(env, DB_PATH=str(tmp / "existing.sqlite"))
+    return {
+        "restart": [existing] * repeat,
+        "first boot": [
+            dict(env, DB_PATH=str(tmp / f"seeded-{n}.sqlite")) for n in range(repeat)
+        ],
+        "first boot, copy": [
+            dict(prepared, DB_PATH=str(tmp / f"copied-{n}.sqlite"))
+            for n in range(repeat)
+        ],
+        "no bytecode": [
+            dict(
+                existing,
+                PYTHONPYCACHEPREFIX=str(tmp / f"pycache-{n}"),
+                TEMPLATE_CACHE_DIR=str(tmp / f"template-cache-{n}"),
+            )
+            for n in range(repeat)
+        ],
+    }
+
+
+def import_profile(limit):
+    """The modules with the longest own import time when importing main."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=ROOT,
+        env=dict(os.environ, MAINTENANCE_INTERVAL="0"),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        own, cumulative, name = line.removeprefix("import time:").split("|")
+        if own.strip().isdigit():
+            modules.append((int(own), int(cumulative), name.strip()))
+    total = sum(own for own, _, _ in modules)
+    modules.sort(reverse=True)
+    return total, modules[:limit]
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--path", default="/", help="URL of the first request")
+    parser.add_argument(
+        "--imports", type=int, default=15, help="slowest imports to list; 0 skips"
+    )
+    parser.add_argument("--child", metavar="PATH", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main():
+    args = parse_args()
+    if args.child:
+        child(args.child)
+        return
+
+    print(f"{'scenario':<18}" + "".join(f"{phase + ' ms':>18}" for phase in PHASES))
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        for name, envs in scenarios(tmp, args.repeat).items():
+            runs = [run_once(env, args.path) for env in envs]
+            medians = {
+                phase: statistics.median(run[phase] for run in runs) * 1000
+                for phase in PHASES
+            }
+            print(f"{name:<18}" + "".join(f"{medians[p]:>18.1f}" for p in PHASES))
+
+    if args.imports:
+        total, slowest = import_profile(args.imports)
+        print(f"\nimport main: {total / 1000:.1f} ms in all modules; slowest own time:")
+        for own, cumulative, name in slowest:
+            print(
+                f"{own / 1000:>8.1f} ms {cumulative / 1000:>8.1f} ms cumulative  {name}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Benchmark throughput as uvicorn workers are added.
+
+Usage: python -m benchmarks.workers [--workers 1 2 4] [--duration 10]
+       [--concurrency 16] [--years 2]
+
+For every worker count, `uvicorn main:app --workers N` is started against
+the same generated database (WEB_CONCURRENCY=N, so the workers run in
+multi-worker mode, see koifit/workers.py) and --concurrency clients send
+a mix of session page views, slot history reads and autosaves over HTTP
+for --duration seconds. It reports requests per second and p50/p99
+latency. The clients share this process, so on a machine with few cores
+they compete with the workers: scaling shows best with cores to spare.
+"""
+
+import argparse
+import asyncio
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from benchmarks.common import percentile
+from benchmarks.generate import generate
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Weights of the request mix: mostly reads, as a session page is used
+MIX = (("session_page", 4), ("slot_history_json", 2), ("save_exercise", 1))
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(db_path, workers, port):
+    """Start uvicorn with the given worker count; returns the process."""
+    env = dict(
+        os.environ,
+        DB_PATH=str(db_path),
+        WEB_CONCURRENCY=str(workers),
+        KOIFIT_ENV="production",
+        MAINTENANCE_INTERVAL="0",
+    )
+    return subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "main:app",
+            "--port",
+            str(port),
+            "--workers",
+            str(workers),
+            "--no-access-log",
+            "--log-level",
+            "warning",
+        ],
+        cwd=ROOT,
+        env=env,
+    )
+
+
+async def wait_ready(client, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/health")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.1)
+    raise RuntimeError("Server did not start")
+
+
+async def setup_session(client, db_path):
+    """Start a session on day 1; return (session_id, session_exercise_id, slot_id)."""
+    resp = await client.post("/sessions/start/1", follow_redirects=False)
+    session_id = int(resp.headers["location"].rsplit("/", 1)[-1])
+    (await client.get(f"/sessions/{session_id}")).raise_for_status()
+    with sqlite3.connect(db_path) as db:
+        se_id, slot_id = db.execute(
+            "SELECT id, slot_id FROM session_exercise WHERE session_id = ? ORDER BY id",
+            (session_id,),
+        ).fetchone()
+    return session_id, se_id, slot_id
+
+
+def requests(session_id, se_id, slot_id):
+    """The request mix as a list of callable(client, n), repeated by weight."""
+
+    def save_exercise(client, n):
+        sets = [{"set_number": 1, "weight_kg": 50 + n % 10, "reps": 8, "is_done": 1}]
+        return client.post(
+            f"/sessions/{session_id}/exercises/{se_id}/save", json={"sets": sets}
+        )
+
+    endpoints = {
+        "session_page": lambda client, n: client.get(f"/sessions/{session_id}"),
+        "slot_history_json": lambda client, n: client.get(
+            f"/slots/{slot_id}/history.json"
+        ),
+        "save_exercise": save_exercise,
+    }
+    return [endpoints[name] for name, weight in MIX for _ in range(weight)]
+
+
+async def drive(client, mix, duration, concurrency):
+    """Send the mix from concurrency clients; returns latency samples in ms."""
+    samples = []
+    deadline = time.monotonic() + duration
+
+    async def one_client(offset):
+        n = offset
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            resp = await mix[n % len(mix)](client, n)
+            samples.append((time.perf_counter() - started) * 1000)
+            resp.raise_for_status()
+            n += 1
+
+    await asyncio.gather(*(one_client(c) for c in range(concurrency)))
+    return samples
+
+
+async def run(db_path, workers, duration, concurrency):
+    port = _free_port()
+    server = start_server(db_path, workers, port)
+    limits = httpx.Limits(max_connections=concurrency)
+    try:
+        async with httpx.AsyncClient(
+            base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=30
+        ) as client:
+            await wait_ready(client)
+            mix = requests(*await setup_session(client, db_path))
+            await drive(client, mix, 1, concurrency)
+            samples = await drive(client, mix, duration, concurrency)
+    finally:
+        server.terminate()
+        server.wait()
+    return {
+        "requests_per_s": len(samples) / duration,
+        "p50_ms": percentile(samples, 50),
+        "p99_ms": percentile(samples, 99),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--duration", type=float, default=10, help="seconds per run")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--years", type=int, default=2)
+    return parser.parse_args(argv)
+
+
+async def main():
+    args = parse_args()
+    print(f"{os.cpu_count()} cores, {args.concurrency} concurrent clients")
+    print(f"{'workers':<10}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "bench.sqlite"
+        await generate(db_path, years=args.years)
+        for workers in args.workers:
+            result = await run(db_path, workers, args.duration, args.concurrency)
+            print(
+                f"{workers:<10}{result['requests_per_s']:>10.0f}"
+                f"{result['p50_ms']:>10.1f}{result['p99_ms']:>10.1f}"
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Export the training history as CSV files or a single JSONL file.
+"""
+
+import argparse
+import asyncio
+from pathlib import Path
+
+from koifit.db import DatabasePool
+from koifit.export import TABLE_COLUMNS, stream_export
+from koifit.settings import get_db_path
+from koifit.users import find_user
+
+
+async def write_export(pool, path, tables, fmt, user_id):
+    """Stream the user's rows of tables into path; returns the bytes written."""
+    written = 0
+    # Blocking writes are fine here: nothing else runs on this loop
+    with open(path, "w", newline="", encoding="utf-8") as f:  # noqa: ASYNC230
+        async for chunk in stream_export(pool.reader, tables, fmt, user_id=user_id):
+            written += f.write(chunk)
+    return written
+
+
+async def main():
+    """
+    Write a user's history.jsonl, or one CSV per table with --csv, into a directory.
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("directory", type=Path)
+    parser.add_argument("--csv", action="store_true", help="one CSV file per table")
+    parser.add_argument("--user", default="default", help="login to export")
+    args = parser.parse_args()
+
+    db_path = get_db_path()
+    pool = DatabasePool(db_path, readers=1)
+    await pool.open()
+    try:
+        async with pool.reader() as db:
+            user = await find_user(db, args.user)
+        if user is None:
+            raise SystemExit(f"No user {args.user!r} in {db_path}")
+        args.directory.mkdir(parents=True, exist_ok=True)
+        if args.csv:
+            exports = [(table, [table], "csv") for table in TABLE_COLUMNS]
+        else:
+            exports = [("history", list(TABLE_COLUMNS), "jsonl")]
+        for name, tables, fmt in exports:
+            path = args.directory / f"{name}.{fmt}"
+            size = await write_export(pool, path, tables, fmt, user.id)
+            print(f"Wrote {path} ({size} bytes) from {db_path}")
+    finally:
+        await pool.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Import training history exported by export_history.py.
+"""
+
+import argparse
+import asyncio
+import time
+from pathlib import Path
+
+from koifit.db import DatabasePool, ensure_database
+from koifit.db.migrate import run_online_migrations
+from koifit.importer import import_history, read_export
+from koifit.settings import get_db_path
+from koifit.users import find_user
+
+
+async def main():
+    """
+    Append the rows of history.jsonl, or of the per-table CSV files, as new history.
+
+    CSV files must be given parents first: session, session_exercise,
+    set_entry. The rows go to --user, whose program they must refer to.
+    Stop the app first: imported ids are allocated up front.
+    """
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("files", nargs="+", type=Path)
+    parser.add_argument("--chunk-size", type=int, default=2000)
+    parser.add_argument("--user", default="default", help="login to import into")
+    args = parser.parse_args()
+
+    db_path = get_db_path()
+    pending = await ensure_database(db_path)
+    pool = DatabasePool(db_path, readers=0)
+    await pool.open()
+    try:
+        await run_online_migrations(pool.writer, pending)
+        async with pool.writer() as db:
+            user = await find_user(db, args.user)
+        if user is None:
+            raise SystemExit(f"No user {args.user!r} in {db_path}")
+        started = time.perf_counter()
+        counts = await import_history(
+            pool.writer,
+            read_export(args.files),
+            chunk_size=args.chunk_size,
+            user_id=user.id,
+        )
+        elapsed = time.perf_counter() - started
+    finally:
+        await pool.close()
+
+    summaries = counts.pop("summaries")
+    counts.pop("targets")
+    rows = sum(counts.values())
+    for table, count in counts.items():
+        print(f"{table}: {count} rows")
+    print(f"Imported {rows} rows into {db_path} in {elapsed:.2f}s", end=" ")
+    print(f"({rows / max(elapsed, 1e-9):.0f} rows/s), wrote {summaries} summaries.")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
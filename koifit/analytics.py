@@ -0,0 +1,364 @@
+"""
+Whole-history training analytics: e1RM trends, weekly volume, rep-range
+PRs and acute:chronic workload ratios.
+
+Done working sets of finished sessions are loaded once into columns
+(stdlib arrays, one per field) and every metric is derived column-wise
+with map/accumulate over those arrays instead of building per-set
+objects. Each user's result is kept by AnalyticsCache until they finish
+a session, so dashboard requests after the first cost no queries.
+"""
+
+import asyncio
+import operator
+from array import array
+from bisect import bisect_right
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import date
+from functools import partial
+from itertools import accumulate
+
+from fastapi import Request
+
+from koifit.users import DEFAULT_USER_ID
+
+# The sets summarize_sets counts toward 1RM and volume, with at least one rep.
+# idx_session_user_finished_date keeps this to the user's own sessions.
+LOAD_SETS_SQL = """SELECT s.id, s.date, se.slot_id, se.exercise_id, st.weight_kg, st.reps
+   FROM session s
+   JOIN session_exercise se ON se.session_id = s.id
+   JOIN set_entry st ON st.session_exercise_id = se.id
+   WHERE s.user_id = ? AND s.is_finished = 1 AND st.is_done = 1 AND st.is_drop = 0
+     AND st.weight_kg > 0 AND st.reps > 0
+   ORDER BY s.date, s.id"""
+
+FETCH_SIZE = 5000
+
+# Best e1RM over this many trailing weeks smooths out light weeks
+ROLLING_WEEKS = 4
+
+# Acute load is the latest week, chronic the mean of the trailing weeks
+CHRONIC_WEEKS = 4
+
+# Reports kept per analytics result, one per distinct query
+MAX_REPORTS = 32
+
+# Lower bounds of the rep ranges PRs are tracked in; the last is open
+REP_RANGE_STARTS = (1, 6, 9, 13)
+REP_RANGE_LABELS = ("1-5", "6-8", "9-12", "13+")
+
+
+def _zeros(length):
+    return array("d", bytes(8 * length))
+
+
+def _week_start(week):
+    """Monday of week, counted in weeks since date.min (also a Monday)."""
+    return date.fromordinal(week * 7 + 1).isoformat()
+
+
+def _shifted(values, weeks):
+    """values delayed by weeks, zero-filled at the start."""
+    weeks = min(weeks, len(values))
+    return _zeros(weeks) + values[: len(values) - weeks]
+
+
+def rolling_max(values, weeks):
+    """Elementwise max over a trailing window of weeks entries."""
+    if not values:
+        return array("d")
+    return array("d", map(max, *(_shifted(values, k) for k in range(weeks))))
+
+
+def rolling_mean(values, weeks):
+    """Elementwise mean over a trailing window of weeks entries."""
+    prefix = array("d", accumulate(values))
+    sums = map(operator.sub, prefix, _shifted(prefix, weeks))
+    return array("d", map((1 / weeks).__mul__, sums))
+
+
+def _ratio(acute, chronic):
+    return round(acute / chronic, 2) if chronic else None
+
+
+def workload_ratios(volume, weeks=CHRONIC_WEEKS):
+    """Acute:chronic workload ratio per week; None without chronic load."""
+    return list(map(_ratio, volume, rolling_mean(volume, weeks)))
+
+
+def group_by_week(keys, weeks, values, week_count, combine):
+    """
+    Combine values per (key, week) into one dense weekly array per key.
+
+    Every key gets a week_count-long run of one flat array, so the only
+    per-set work left is a single indexed update.
+    """
+    offsets = {key: i * week_count for i, key in enumerate(sorted(set(keys)))}
+    grouped = _zeros(len(offsets) * week_count)
+    positions = map(operator.add, map(offsets.__getitem__, keys), weeks)
+    for position, value in zip(positions, values):
+        grouped[position] = combine(grouped[position], value)
+    return {
+        key: grouped[offset : offset + week_count] for key, offset in offsets.items()
+    }
+
+
+@dataclass(slots=True)
+class SetColumns:
+    """Done working sets in date order, one array per field."""
+
+    session: array
+    week: array
+    slot: array
+    exercise: array
+    weight: array
+    reps: array
+
+    @classmethod
+    async def load(cls, db, user_id=DEFAULT_USER_ID):
+        columns = cls(*(array("q") for _ in range(4)), array("d"), array("q"))
+        weeks = {}
+        cursor = await db.execute(LOAD_SETS_SQL, (user_id,))
+        while rows := await cursor.fetchmany(FETCH_SIZE):
+            session, day, slot, exercise, weight, reps = zip(*rows)
+            for text in set(day).difference(weeks):
+                weeks[text] = (date.fromisoformat(text).toordinal() - 1) // 7
+            columns.session.extend(session)
+            columns.week.extend(map(weeks.__getitem__, day))
+            columns.slot.extend(slot)
+            columns.exercise.extend(exercise)
+            columns.weight.extend(weight)
+            columns.reps.extend(reps)
+        return columns
+
+    def volume(self):
+        return array("d", map(operator.mul, self.weight, self.reps))
+
+    def e1rm(self, volume):
+        """Epley estimate per set: weight * (1 + reps / 30) = weight + volume / 30."""
+        return array("d", map(operator.add, self.weight, map((1 / 30).__mul__, volume)))
+
+    def rep_ranges(self):
+        return array("b", map(partial(bisect_right, REP_RANGE_STARTS), self.reps))
+
+
+@dataclass(slots=True)
+class TrainingAnalytics:
+    """Weekly series over the whole history plus rep-range bests and PRs."""
+
+    first_week: int
+    set_count: int
+    session_count: int
+    total_volume: array
+    exercise_volume: dict
+    slot_volume: dict
+    best_e1rm: dict
+    rolling_e1rm: dict
+    bests: dict
+    prs: list
+    reports: dict = field(default_factory=dict)
+
+    @property
+    def week_count(self):
+        return len(self.total_volume)
+
+    @classmethod
+    def compute(cls, columns):
+        if not columns.week:
+            return cls(0, 0, 0, array("d"), {}, {}, {}, {}, {}, [])
+        first_week = columns.week[0]
+        weeks = array("q", map((-first_week).__add__, columns.week))
+        week_count = weeks[-1] + 1
+        volume = columns.volume()
+        e1rm = columns.e1rm(volume)
+
+        exercise_volume = group_by_week(
+            columns.exercise, weeks, volume, week_count, operator.add
+        )
+        best_e1rm = group_by_week(columns.exercise, weeks, e1rm, week_count, max)
+        bests, prs = detect_prs(columns, weeks, columns.rep_ranges())
+        return cls(
+            first_week=first_week,
+            set_count=len(weeks),
+            session_count=1
+            + sum(map(operator.ne, columns.session[1:], columns.session[:-1])),
+            total_volume=array("d", map(sum, zip(*exercise_volume.values()))),
+            exercise_volume=exercise_volume,
+            slot_volume=group_by_week(
+                columns.slot, weeks, volume, week_count, operator.add
+            ),
+            best_e1rm=best_e1rm,
+            rolling_e1rm={
+                exercise_id: rolling_max(series, ROLLING_WEEKS)
+                for exercise_id, series in best_e1rm.items()
+            },
+            bests=bests,
+            prs=prs,
+        )
+
+    def report(self, catalog, weeks=12, pr_limit=20):
+        """
+        Plain data for the dashboard and JSON API, memoized per query.
+
+        Series cover the latest weeks weeks of history, oldest first;
+        names come from the program catalog.
+        """
+        key = (catalog.version, weeks, pr_limit)
+        report = self.reports.get(key)
+        if report is None:
+            if len(self.reports) >= MAX_REPORTS:
+                self.reports.clear()
+            report = self.reports[key] = self._build_report(catalog, weeks, pr_limit)
+        return report
+
+    def _build_report(self, catalog, weeks, pr_limit):
+        start = max(0, self.week_count - weeks)
+        acwr = workload_ratios(self.total_volume)
+
+        def recent(series):
+            return [round(value, 1) for value in series[start:]]
+
+        def exercise_name(exercise_id):
+            exercise = catalog.exercise(exercise_id)
+            return exercise.name if exercise else f"Exercise {exercise_id}"
+
+        exercises = []
+        for exercise_id, volume in self.exercise_volume.items():
+            ratios = workload_ratios(volume)
+            exercises.append(
+                {
+                    "exercise_id": exercise_id,
+                    "name": exercise_name(exercise_id),
+                    "weekly_volume": recent(volume),
+                    "best_e1rm": recent(self.best_e1rm[exercise_id]),
+                    "rolling_e1rm": recent(self.rolling_e1rm[exercise_id]),
+                    "acwr": ratios[-1],
+                    "bests": [
+                        {
+                            "rep_range": REP_RANGE_LABELS[rep_range - 1],
+                            "weight_kg": weight,
+                            "reps": reps,
+                            "week": _week_start(self.first_week + week),
+                        }
+                        for (best_exercise, rep_range), (weight, reps, week) in sorted(
+                            self.bests.items()
+                        )
+                        if best_exercise == exercise_id
+                    ],
+                }
+            )
+        exercises.sort(key=lambda e: e["name"])
+
+        slots = []
+        for slot_id, volume in self.slot_volume.items():
+            slot = catalog.slot(slot_id)
+            slots.append(
+                {
+                    "slot_id": slot_id,
+                    "title": slot.title if slot else f"Slot {slot_id}",
+                    "weekly_volume": recent(volume),
+                }
+            )
+        slots.sort(key=lambda s: s["slot_id"])
+
+        return {
+            "set_count": self.set_count,
+            "session_count": self.session_count,
+            "weeks": [
+                _week_start(self.first_week + week)
+                for week in range(start, self.week_count)
+            ],
+            "total_volume": recent(self.total_volume),
+            "acwr": acwr[start:],
+            "exercises": exercises,
+            "slots": slots,
+            "prs": [
+                {
+                    "exercise_id": exercise_id,
+                    "name": exercise_name(exercise_id),
+                    "rep_range": REP_RANGE_LABELS[rep_range - 1],
+                    "weight_kg": weight,
+                    "reps": reps,
+                    "previous_kg": previous,
+                    "week": _week_start(self.first_week + week),
+                }
+                for exercise_id, rep_range, weight, reps, previous, week in reversed(
+                    self.prs[max(len(self.prs) - pr_limit, 0) :]
+                )
+            ],
+        }
+
+
+def detect_prs(columns, weeks, rep_ranges):
+    """
+    Heaviest set per (exercise, rep range) and every time it was beaten.
+
+    Returns (bests, prs): bests maps (exercise_id, rep range) to
+    (weight, reps, week); prs lists (exercise_id, rep range, weight, reps,
+    previous weight, week) in date order. The first set in a range sets
+    the baseline and is not a PR.
+    """
+    bests = {}
+    prs = []
+    for exercise_id, rep_range, weight, reps, week in zip(
+        columns.exercise, rep_ranges, columns.weight, columns.reps, weeks
+    ):
+        key = (exercise_id, rep_range)
+        best = bests.get(key)
+        if best is None or weight > best[0]:
+            bests[key] = (weight, reps, week)
+            if best is not None:
+                prs.append((exercise_id, rep_range, weight, reps, best[0], week))
+    return bests, prs
+
+
+async def load_analytics(db, user_id=DEFAULT_USER_ID):
+    """Read the user's done working sets and compute TrainingAnalytics."""
+    return TrainingAnalytics.compute(await SetColumns.load(db, user_id))
+
+
+class AnalyticsCache:
+    """
+    TrainingAnalytics per user, computed on first use and kept until invalidated.
+
+    Only finishing a session changes what the analytics read, so
+    finish_session calls invalidate() for its user; concurrent requests
+    after that share a single reload.
+    """
+
+    def __init__(self):
+        self._analytics = {}
+        self._generations = defaultdict(int)
+        self._locks = defaultdict(asyncio.Lock)
+        self.loads = 0
+
+    def invalidate(self, user_id=None):
+        """Drop the user's analytics, or everyone's without user_id."""
+        user_ids = list(self._analytics) if user_id is None else [user_id]
+        for key in user_ids:
+            self._analytics.pop(key, None)
+            self._generations[key] += 1
+
+    async def get(self, reader, user_id=DEFAULT_USER_ID):
+        """Cached analytics, reloading through reader (e.g. pool.reader) if needed."""
+        analytics = self._analytics.get(user_id)
+        if analytics is not None:
+            return analytics
+        async with self._locks[user_id]:
+            analytics = self._analytics.get(user_id)
+            if analytics is not None:
+                return analytics
+            generation = self._generations[user_id]
+            async with reader() as db:
+                analytics = await load_analytics(db, user_id)
+            self.loads += 1
+            # A session finished while loading: serve this result, don't keep it
+            if generation == self._generations[user_id]:
+                self._analytics[user_id] = analytics
+            return analytics
+
+
+def get_analytics_cache(request: Request):
+    """FastAPI dependency returning the app's analytics cache."""
+    return request.app.state.analytics
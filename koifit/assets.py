@@ -0,0 +1,185 @@
+"""
+Static assets: content-hash fingerprinted URLs, served precompressed from memory.
+
+Every file under the assets directory is read, hashed and compressed once
+at startup. Templates link to fingerprinted URLs (base.3f2a9c1d0e.css),
+which never change content and are cached forever by the browser; the plain
+URLs keep working with ETag revalidation for files that need a stable
+address (sw.js, manifest.json).
+"""
+
+import gzip
+import hashlib
+import json
+import mimetypes
+from dataclasses import dataclass
+from pathlib import Path
+
+from fastapi import Request, Response
+
+from koifit.http_cache import accepted_encodings, if_none_match
+
+try:
+    import brotli
+except ImportError:  # Optional: gzip only without the brotli package
+    brotli = None
+
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE_CONTROL = "no-cache"
+
+# Already-compressed formats are served as is
+COMPRESSIBLE_SUFFIXES = {".css", ".js", ".json", ".svg", ".html", ".txt", ".map"}
+
+# Compression is skipped when it saves less than this fraction
+MIN_SAVING = 0.1
+
+# Fingerprinted files the service worker precaches as the app shell
+PRECACHE_DIRS = ("javascripts/", "stylesheets/", "images/")
+
+
+@dataclass(slots=True)
+class Asset:
+    path: str
+    url: str
+    media_type: str
+    etag: str
+    body: bytes
+    gzip: bytes | None
+    brotli: bytes | None
+
+
+def fingerprint_path(path, digest):
+    """stylesheets/base.css -> stylesheets/base.<digest>.css"""
+    stem, dot, suffix = path.rpartition(".")
+    if not dot or "/" in suffix:
+        return f"{path}.{digest}"
+    return f"{stem}.{digest}.{suffix}"
+
+
+def _compressed(body, compress):
+    data = compress(body)
+    return data if len(data) <= len(body) * (1 - MIN_SAVING) else None
+
+
+class AssetStore:
+    """All files of an assets directory, keyed by plain and fingerprinted path."""
+
+    def __init__(self, directory, prefix="/assets"):
+        self.directory = Path(directory)
+        self.prefix = prefix
+        self._by_path = {}
+        self._by_fingerprint = {}
+        self.version = None
+        self.service_worker = None
+
+    def load(self):
+        """Read, hash and precompress every file; returns self."""
+        by_path = {}
+        by_fingerprint = {}
+        combined = hashlib.sha256()
+        for file in sorted(self.directory.rglob("*")):
+            if not file.is_file():
+                continue
+            path = file.relative_to(self.directory).as_posix()
+            body = file.read_bytes()
+            digest = hashlib.sha256(body).hexdigest()[:10]
+            combined.update(f"{path}:{digest}".encode())
+            fingerprinted = fingerprint_path(path, digest)
+            asset = self._asset(path, f"{self.prefix}/{fingerprinted}", body, digest)
+            by_path[path] = asset
+            by_fingerprint[fingerprinted] = asset
+        self._by_path = by_path
+        self._by_fingerprint = by_fingerprint
+        self.version = combined.hexdigest()[:10]
+        if "sw.js" in by_path:
+            self.service_worker = self._build_service_worker(by_path["sw.js"])
+        return self
+
+    def _asset(self, path, url, body, digest):
+        media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        compressible = Path(path).suffix in COMPRESSIBLE_SUFFIXES
+        return Asset(
+            path=path,
+            url=url,
+            media_type=media_type,
+            etag=f'"{digest}"',
+            body=body,
+            gzip=_compressed(body, lambda b: gzip.compress(b, 9, mtime=0))
+            if compressible
+            else None,
+            brotli=_compressed(body, brotli.compress)
+            if compressible and brotli is not None
+            else None,
+        )
+
+    def _build_service_worker(self, source):
+        """
+        sw.js served from the root, so its scope covers every page.
+
+        The asset version and the fingerprinted app shell are prepended, so
+        any asset change also changes the worker and triggers its update.
+        """
+        precache = [
+            asset.url
+            for asset in self._by_path.values()
+            if asset.path.startswith(PRECACHE_DIRS)
+        ]
+        prelude = (
+            f"self.ASSET_VERSION = {json.dumps(self.version)};\n"
+            f"self.PRECACHE_URLS = {json.dumps(precache)};\n"
+        )
+        body = prelude.encode() + source.body
+        digest = hashlib.sha256(body).hexdigest()[:10]
+        return self._asset("sw.js", "/sw.js", body, digest)
+
+    def url(self, path):
+        """Fingerprinted URL for an asset path; the plain URL if unknown."""
+        asset = self._by_path.get(path.lstrip("/"))
+        return asset.url if asset else f"{self.prefix}/{path.lstrip('/')}"
+
+    def import_map(self):
+        """
+        Import map sending plain JS module URLs to their fingerprinted copies.
+
+        Modules import each other by relative plain path (./auto-save.js);
+        the map makes those imports immutable-cacheable too.
+        """
+        return {
+            "imports": {
+                f"{self.prefix}/{asset.path}": asset.url
+                for asset in self._by_path.values()
+                if asset.path.startswith("javascripts/")
+            }
+        }
+
+    def response(self, request: Request, path):
+        """Serve path (plain or fingerprinted), or None if there is no such asset."""
+        asset = self._by_fingerprint.get(path)
+        if asset is not None:
+            return self.serve(request, asset, immutable=True)
+        asset = self._by_path.get(path)
+        if asset is not None:
+            return self.serve(request, asset)
+        return None
+
+    def serve(self, request: Request, asset, immutable=False):
+        """Response for asset, honoring If-None-Match and Accept-Encoding."""
+        headers = {
+            "ETag": asset.etag,
+            "Cache-Control": IMMUTABLE_CACHE_CONTROL
+            if immutable
+            else REVALIDATE_CACHE_CONTROL,
+            "Vary": "Accept-Encoding",
+        }
+        if if_none_match(request, asset.etag):
+            return Response(status_code=304, headers=headers)
+
+        accepted = accepted_encodings(request)
+        body = asset.body
+        if asset.brotli is not None and "br" in accepted:
+            body = asset.brotli
+            headers["Content-Encoding"] = "br"
+        elif asset.gzip is not None and "gzip" in accepted:
+            body = asset.gzip
+            headers["Content-Encoding"] = "gzip"
+        return Response(body, media_type=asset.media_type, headers=headers)
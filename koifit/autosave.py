@@ -0,0 +1,404 @@
+"""
+Autosave write path: diff a save payload against stored state and apply it in one transaction.
+
+Saves carry only what changed, each field group and set with the revision
+the client last saw. Every write to a session_exercise gives it the next
+revision, and the fields and sets it wrote that revision too. A change to
+something written since the client's revision is a conflict: the stored
+value is kept and sent back, the rest of the save is applied. Writes are
+conditional on the session_exercise revision that was read, so saves
+racing in from other worker processes are retried rather than lost.
+"""
+
+import json
+
+from koifit.models import SaveExerciseRequest
+from koifit.users import DEFAULT_USER_ID
+
+UPSERT_SET_SQL = """INSERT INTO set_entry
+       (session_exercise_id, set_number, weight_kg, reps, is_done, is_drop, revision)
+       VALUES (?, ?, ?, ?, ?, 0, ?)
+       ON CONFLICT(session_exercise_id, set_number) DO UPDATE SET
+           weight_kg = excluded.weight_kg,
+           reps = excluded.reps,
+           is_done = excluded.is_done,
+           revision = excluded.revision"""
+
+# Reads and writes of one save are retried this many times when another
+# process writes the same session_exercise in between
+SAVE_ATTEMPTS = 3
+
+PAYLOAD_FIELDS = set(SaveExerciseRequest.model_fields)
+
+# Request field -> session_exercise column
+METADATA_COLUMNS = {
+    "notes": "next_time_note",
+    "effort_tag": "effort_tag",
+    "dropset_done": "dropset_done",
+}
+
+METADATA_FIELDS = {column: field for field, column in METADATA_COLUMNS.items()}
+
+
+def merge_changes(earlier, later):
+    """
+    Combine two payloads for the same exercise; fields and sets in later win.
+
+    Mirrors mergeData in auto-save.js so coalesced batches behave the
+    same as the individual saves they replace.
+    """
+    if earlier is None:
+        return SaveExerciseRequest(**later.model_dump(include=PAYLOAD_FIELDS))
+    merged = earlier.model_dump(include=PAYLOAD_FIELDS)
+    for field in (*METADATA_COLUMNS, "fields_revision"):
+        value = getattr(later, field)
+        if value is not None:
+            merged[field] = value
+    if later.sets:
+        sets = {s["set_number"]: s for s in merged["sets"] or []}
+        sets.update((s.set_number, s.model_dump()) for s in later.sets)
+        merged["sets"] = list(sets.values())
+    return SaveExerciseRequest(**merged)
+
+
+async def load_stored_states(
+    db, session_id, session_exercise_ids, user_id=DEFAULT_USER_ID
+):
+    """
+    Read metadata and sets for several session_exercises in a single query.
+
+    Returns {session_exercise_id: (metadata, sets)} for the ids that belong
+    to the user's session; ids from other sessions are left out. metadata
+    also holds the revision, fields_revision and the session's is_finished,
+    and sets map set_number to (weight_kg, reps, is_done, revision).
+    """
+    placeholders = ", ".join("?" for _ in session_exercise_ids)
+    cursor = await db.execute(
+        f"""SELECT se.id, s.is_finished, se.revision, se.fields_revision, se.next_time_note,
+                   se.effort_tag, se.dropset_done, st.set_number, st.weight_kg,
+                   st.reps, st.is_done, st.revision AS set_revision
+            FROM session s
+            JOIN session_exercise se ON se.session_id = s.id
+            LEFT JOIN set_entry st ON st.session_exercise_id = se.id
+            WHERE s.id = ? AND s.user_id = ? AND se.id IN ({placeholders})""",
+        (session_id, user_id, *session_exercise_ids),
+    )
+    states = {}
+    for row in await cursor.fetchall():
+        state = states.get(row["id"])
+        if state is None:
+            metadata = {
+                column: row[column]
+                for column in (
+                    *METADATA_COLUMNS.values(),
+                    "revision",
+                    "fields_revision",
+                    "is_finished",
+                )
+            }
+            state = states[row["id"]] = (metadata, {})
+        if row["set_number"] is not None:
+            state[1][row["set_number"]] = (
+                row["weight_kg"],
+                row["reps"],
+                row["is_done"],
+                row["set_revision"],
+            )
+    return states
+
+
+class StaleRevision(Exception):
+    """A session_exercise changed between reading it and writing to it."""
+
+
+def diff_save(data, metadata, sets):
+    """
+    Compare a SaveExerciseRequest with stored state.
+
+    Returns (column updates, set rows to upsert, conflicts) containing only
+    real changes. conflicts is (columns, set numbers) of the changes left
+    out because what they change was written after the revision they carry.
+    """
+    updates = {}
+    conflicting_columns = []
+    stale = (
+        data.fields_revision is not None
+        and metadata["fields_revision"] > data.fields_revision
+    )
+    for field, column in METADATA_COLUMNS.items():
+        value = getattr(data, field)
+        if value is None or value == metadata[column]:
+            continue
+        if stale:
+            conflicting_columns.append(column)
+        else:
+            updates[column] = value
+
+    changed_sets = []
+    conflicting_sets = []
+    for s in {s.set_number: s for s in data.sets or []}.values():
+        values = (s.weight_kg, s.reps, s.is_done)
+        stored = sets.get(s.set_number)
+        if stored is not None and stored[:3] == values:
+            continue
+        if stored is not None and s.revision is not None and stored[3] > s.revision:
+            conflicting_sets.append(s.set_number)
+        else:
+            changed_sets.append((s.set_number, *values))
+    return updates, changed_sets, (conflicting_columns, conflicting_sets)
+
+
+def change_delta(session_exercise_id, updates, changed_sets, revision):
+    """
+    A diff_save result in save payload form, for live sync.
+
+    Only changed fields and sets are included, with the revision the save
+    gave them, so other devices can apply it with the same code that
+    applies local drafts.
+    """
+    delta = {"session_exercise_id": int(session_exercise_id)}
+    for column, value in updates.items():
+        delta[METADATA_FIELDS[column]] = value
+    if updates:
+        delta["fields_revision"] = revision
+    delta["sets"] = [
+        {
+            "set_number": set_number,
+            "weight_kg": weight,
+            "reps": reps,
+            "is_done": done,
+            "revision": revision,
+        }
+        for set_number, weight, reps, done in changed_sets
+    ]
+    return delta
+
+
+def conflict_delta(session_exercise_id, metadata, sets, columns, set_numbers):
+    """The stored values, and revisions, of conflicting fields and sets."""
+    delta = {"session_exercise_id": int(session_exercise_id)}
+    for column in columns:
+        delta[METADATA_FIELDS[column]] = metadata[column]
+    if columns:
+        delta["fields_revision"] = metadata["fields_revision"]
+    delta["sets"] = [
+        {
+            "set_number": set_number,
+            "weight_kg": sets[set_number][0],
+            "reps": sets[set_number][1],
+            "is_done": sets[set_number][2],
+            "revision": sets[set_number][3],
+        }
+        for set_number in set_numbers
+    ]
+    return delta
+
+
+async def write_changes(
+    db, session_exercise_id, updates, changed_sets, revision, read_revision
+):
+    """
+    Queue metadata and set changes on the current transaction without committing.
+
+    Everything written gets revision, if the session_exercise is still at
+    read_revision; otherwise nothing is written and StaleRevision is raised.
+    """
+    assignments = ["revision = ?"]
+    params = [revision]
+    if updates:
+        assignments += [f"{column} = ?" for column in updates]
+        assignments.append("fields_revision = ?")
+        params += [*updates.values(), revision]
+    cursor = await db.execute(
+        f"""UPDATE session_exercise SET {", ".join(assignments)}
+            WHERE id = ? AND revision = ?""",
+        (*params, session_exercise_id, read_revision),
+    )
+    if cursor.rowcount == 0:
+        raise StaleRevision(session_exercise_id)
+    if changed_sets:
+        await db.executemany(
+            UPSERT_SET_SQL,
+            [(session_exercise_id, *row, revision) for row in changed_sets],
+        )
+
+
+async def _load_receipt(db, idempotency_key):
+    """Response recorded for an idempotency key, or None if it was never applied."""
+    cursor = await db.execute(
+        "SELECT saved, response FROM save_receipt WHERE idempotency_key = ?",
+        (idempotency_key,),
+    )
+    row = await cursor.fetchone()
+    if row is None:
+        return None
+    if row[1] is None:
+        # Recorded before receipts kept the response
+        return _response(row[0])
+    response = json.loads(row[1])
+    response["revisions"] = {int(k): v for k, v in response["revisions"].items()}
+    response.setdefault("status", "conflict" if response["conflicts"] else "ok")
+    return response
+
+
+def _response(saved, revisions=None, conflicts=None, status=None):
+    return {
+        "status": status or ("conflict" if conflicts else "ok"),
+        "saved": saved,
+        "revisions": revisions or {},
+        "conflicts": conflicts or [],
+    }
+
+
+async def save_session_changes(
+    db,
+    session_id,
+    changes,
+    idempotency_key=None,
+    user_id=DEFAULT_USER_ID,
+    relay=None,
+    origin=None,
+):
+    """
+    Apply autosave payloads like save_session_data, returning what changed.
+
+    Returns None if any id is not part of the user's session, otherwise
+    (response, deltas). response holds status: "ok", "conflict", or
+    "finished" when the session is finished and nothing was written;
+    saved, the save_session_data result; revisions, each requested
+    session_exercise's revision after the save; and conflicts, a
+    conflict_delta per session_exercise with changes that were not
+    applied. deltas has a change_delta per session_exercise written.
+    Replays of an applied key return the recorded response and no deltas.
+    With a relay (multi-worker mode), the deltas are recorded as a "changes"
+    event from origin in the save's own transaction.
+    """
+    if idempotency_key is not None:
+        response = await _load_receipt(db, idempotency_key)
+        if response is not None:
+            return response, []
+    if not changes:
+        return _response(0), []
+
+    for _ in range(SAVE_ATTEMPTS):
+        states = await load_stored_states(db, session_id, list(changes), user_id)
+        if len(states) != len(changes):
+            return None
+        if any(metadata["is_finished"] for metadata, _ in states.values()):
+            # Its summaries, targets and analytics were computed from the
+            # sets as they were at finish
+            return _response(0, status="finished"), []
+        try:
+            return await _apply_changes(
+                db, session_id, changes, states, idempotency_key, relay, origin
+            )
+        except StaleRevision:
+            await db.rollback()
+        except Exception:
+            await db.rollback()
+            raise
+
+    # Other processes kept writing these exercises: report every change as
+    # a conflict, with what is stored now
+    states = await load_stored_states(db, session_id, list(changes), user_id)
+    return _unsaved_response(changes, states), []
+
+
+def _unsaved_response(changes, states):
+    conflicts = []
+    for session_exercise_id, data in changes.items():
+        se_id = int(session_exercise_id)
+        metadata, sets = states[se_id]
+        updates, changed_sets, (columns, set_numbers) = diff_save(data, metadata, sets)
+        columns = [*updates, *columns]
+        # Sets that were never stored have no value to send back
+        set_numbers = [row[0] for row in changed_sets if row[0] in sets] + set_numbers
+        if columns or set_numbers:
+            conflicts.append(
+                conflict_delta(se_id, metadata, sets, columns, set_numbers)
+            )
+    return _response(0, conflicts=conflicts, status="conflict")
+
+
+async def _apply_changes(
+    db, session_id, changes, states, idempotency_key, relay=None, origin=None
+):
+    """Diff changes against states and write them in one commit."""
+    diffs = []
+    revisions = {}
+    conflicts = []
+    for session_exercise_id, data in changes.items():
+        se_id = int(session_exercise_id)
+        metadata, sets = states[se_id]
+        updates, changed_sets, (columns, set_numbers) = diff_save(data, metadata, sets)
+        revisions[se_id] = metadata["revision"]
+        if updates or changed_sets:
+            revisions[se_id] += 1
+            diffs.append(
+                (se_id, updates, changed_sets, revisions[se_id], metadata["revision"])
+            )
+        if columns or set_numbers:
+            conflicts.append(
+                conflict_delta(se_id, metadata, sets, columns, set_numbers)
+            )
+    response = _response(len(diffs), revisions, conflicts)
+    if not diffs and idempotency_key is None:
+        return response, []
+
+    for diff in diffs:
+        await write_changes(db, *diff)
+    if idempotency_key is not None:
+        cursor = await db.execute(
+            """INSERT OR IGNORE INTO save_receipt
+                   (idempotency_key, session_id, saved, response)
+               VALUES (?, ?, ?, ?)""",
+            (idempotency_key, session_id, len(diffs), json.dumps(response)),
+        )
+        if cursor.rowcount == 0:
+            # Another worker applied the same batch since _load_receipt
+            await db.rollback()
+            return await _load_receipt(db, idempotency_key), []
+    deltas = [change_delta(*diff[:4]) for diff in diffs]
+    if relay is not None and deltas:
+        await relay.record(
+            db, int(session_id), "changes", {"exercises": deltas}, origin
+        )
+    await db.commit()
+    return response, deltas
+
+
+async def save_session_data(
+    db, session_id, changes, idempotency_key=None, user_id=DEFAULT_USER_ID
+):
+    """
+    Apply autosave payloads for several session_exercises atomically.
+
+    changes maps session_exercise_id to a SaveExerciseRequest. Returns None
+    (and writes nothing) if any id is not part of the user's session, otherwise the
+    number of session_exercises that changed. All writes share one commit.
+
+    With an idempotency_key, a batch is applied at most once: replays of an
+    already applied key return the recorded result without writing, so an
+    old batch retried after newer saves cannot overwrite them.
+    """
+    result = await save_session_changes(
+        db, session_id, changes, idempotency_key, user_id
+    )
+    return None if result is None else result[0]["saved"]
+
+
+async def save_exercise_data(
+    db, session_id, session_exercise_id, data, user_id=DEFAULT_USER_ID
+):
+    """
+    Apply an autosave payload with at most one commit.
+
+    Returns None if the session_exercise is not found, otherwise whether
+    anything was written. Payloads that match stored state skip the write.
+    """
+    saved = await save_session_data(
+        db, session_id, {int(session_exercise_id): data}, user_id=user_id
+    )
+    if saved is None:
+        return None
+    return saved > 0
@@ -0,0 +1,262 @@
+"""
+Online backups: compressed snapshots of the live database.
+
+Snapshots are taken with the SQLite backup API on a connection of their
+own, a few pages per step with a pause between steps, in a thread so the
+event loop keeps serving requests. The source connection holds one read
+transaction for the whole copy: under WAL this never blocks the writer,
+and the backup copies that one consistent state instead of restarting
+every time an autosave commits. The copy is checked, gzipped and renamed
+into place, so a snapshot file is always complete.
+"""
+
+import asyncio
+import gzip
+import logging
+import os
+import shutil
+import sqlite3
+import time
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Not on Windows: backups there are not locked
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_PATTERN = "koifit-*.sqlite.gz"
+
+# Pages copied per step (1 MiB with 4 KiB pages) and the pause after each,
+# which leaves the disk and the GIL to requests
+BACKUP_PAGES = 256
+BACKUP_PAUSE = 0.005
+
+# Snapshots are compressed in chunks of this size with the same pause after
+# each; the fastest level, as compression is most of a backup's CPU time
+COMPRESS_CHUNK = 1024 * 1024
+COMPRESS_LEVEL = 1
+
+# Never back up sooner than this after startup
+BACKUP_DELAY = 60.0
+
+
+def list_snapshots(backup_dir):
+    """Snapshot files in backup_dir, oldest first."""
+    if not backup_dir.is_dir():
+        return []
+    # Names carry the timestamp, so they sort by age
+    return sorted(backup_dir.glob(SNAPSHOT_PATTERN))
+
+
+def snapshot_age(backup_dir):
+    """Seconds since the newest snapshot was written; None if there is none."""
+    snapshots = list_snapshots(backup_dir)
+    if not snapshots:
+        return None
+    return time.time() - snapshots[-1].stat().st_mtime
+
+
+def _quick_check(path):
+    db = sqlite3.connect(path)
+    try:
+        result = db.execute("PRAGMA quick_check").fetchone()[0]
+    finally:
+        db.close()
+    if result != "ok":
+        raise sqlite3.DatabaseError(f"{path} failed its integrity check: {result}")
+
+
+def copy_database(db_path, target, pages=BACKUP_PAGES, pause=BACKUP_PAUSE):
+    """
+    Copy the database at db_path to target with the online backup API.
+
+    Returns the number of backup steps taken.
+    """
+    source = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, isolation_level=None)
+    destination = sqlite3.connect(target)
+    steps = 0
+
+    def progress(status, remaining, total):
+        nonlocal steps
+        steps += 1
+        if remaining and pause:
+            time.sleep(pause)
+
+    try:
+        # Pin one snapshot for every step; see the module docstring
+        source.execute("BEGIN")
+        source.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchall()
+        source.backup(destination, pages=pages, progress=progress)
+        source.execute("COMMIT")
+    finally:
+        destination.close()
+        source.close()
+    return steps
+
+
+def compress_file(source, target, pause=BACKUP_PAUSE):
+    """Gzip source into target, which only appears once complete."""
+    partial = target.with_name(f"{target.name}.partial")
+    with (
+        open(source, "rb") as raw,
+        gzip.open(partial, "wb", compresslevel=COMPRESS_LEVEL) as out,
+    ):
+        while chunk := raw.read(COMPRESS_CHUNK):
+            out.write(chunk)
+            if pause:
+                time.sleep(pause)
+    os.replace(partial, target)
+
+
+def backup_database(
+    db_path, backup_dir, pages=BACKUP_PAGES, pause=BACKUP_PAUSE, min_age=None
+):
+    """
+    Write a gzipped snapshot of db_path into backup_dir.
+
+    Returns a report, or None when another process is already backing up
+    or, with min_age (seconds), when the newest snapshot is younger than
+    that. Blocking: call it from a thread, see create_backup.
+    """
+    backup_dir.mkdir(parents=True, exist_ok=True)
+    with open(backup_dir / ".lock", "a") as lock_file:
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return None
+        # Checked under the lock, so workers sharing backup_dir back up once
+        age = snapshot_age(backup_dir)
+        if min_age is not None and age is not None and age < min_age:
+            return None
+
+        name = f"koifit-{datetime.now():%Y%m%d-%H%M%S}"
+        raw = backup_dir / f"{name}.sqlite.partial"
+        snapshot = backup_dir / f"{name}.sqlite.gz"
+        started = time.perf_counter()
+        try:
+            steps = copy_database(db_path, raw, pages=pages, pause=pause)
+            copied = time.perf_counter()
+            _quick_check(raw)
+            checked = time.perf_counter()
+            compress_file(raw, snapshot, pause=pause)
+        finally:
+            raw.unlink(missing_ok=True)
+        finished = time.perf_counter()
+
+    return {
+        "snapshot": str(snapshot),
+        "steps": steps,
+        "bytes": snapshot.stat().st_size,
+        "copy_ms": round((copied - started) * 1000, 1),
+        "check_ms": round((checked - copied) * 1000, 1),
+        "compress_ms": round((finished - checked) * 1000, 1),
+    }
+
+
+def prune_snapshots(backup_dir, keep):
+    """Delete all but the newest keep snapshots; returns the deleted paths."""
+    snapshots = list_snapshots(backup_dir)
+    expired = snapshots[: max(len(snapshots) - keep, 0)]
+    for path in expired:
+        path.unlink(missing_ok=True)
+    return expired
+
+
+async def create_backup(db_path, backup_dir, keep, min_age=None, **kwargs):
+    """Snapshot the database without blocking the event loop, then prune."""
+    report = await asyncio.to_thread(
+        backup_database, db_path, backup_dir, min_age=min_age, **kwargs
+    )
+    if report is None:
+        return None
+    report["pruned"] = len(await asyncio.to_thread(prune_snapshots, backup_dir, keep))
+    logger.info(
+        "Backup written to %s (%d bytes) in %.1f ms, %d old snapshots pruned",
+        report["snapshot"],
+        report["bytes"],
+        report["copy_ms"] + report["check_ms"] + report["compress_ms"],
+        report["pruned"],
+    )
+    return report
+
+
+def restore_snapshot(snapshot, db_path):
+    """
+    Replace the database at db_path with a snapshot.
+
+    The app must be stopped. The current database, with its WAL files, is
+    kept next to it with a .pre-restore suffix; returns that path.
+    """
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    partial = db_path.with_name(f"{db_path.name}.partial")
+    with gzip.open(snapshot, "rb") as compressed, open(partial, "wb") as out:
+        shutil.copyfileobj(compressed, out, length=1024 * 1024)
+    try:
+        _quick_check(partial)
+    except sqlite3.DatabaseError:
+        partial.unlink(missing_ok=True)
+        raise
+
+    # A WAL left next to the restored file would be replayed into it
+    previous = db_path.with_name(f"{db_path.name}.pre-restore")
+    for suffix in ("", "-wal", "-shm"):
+        current = db_path.with_name(f"{db_path.name}{suffix}")
+        if current.exists():
+            os.replace(current, previous.with_name(f"{previous.name}{suffix}"))
+    os.replace(partial, db_path)
+    return previous
+
+
+class BackupTask:
+    """Snapshots the database every interval seconds, keeping the newest keep."""
+
+    def __init__(self, db_path, backup_dir, interval, keep, delay=BACKUP_DELAY):
+        self.db_path = db_path
+        self.backup_dir = backup_dir
+        self.interval = interval
+        self.keep = keep
+        self.delay = delay
+        self.last_report = None
+        self._task = None
+
+    def start(self):
+        """Start the background loop; a zero interval disables it."""
+        if self.interval > 0:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        """Cancel the loop and wait for it to exit."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def seconds_until_due(self):
+        """Time left until the next snapshot, counted from the newest on disk."""
+        age = snapshot_age(self.backup_dir)
+        return 0.0 if age is None else max(self.interval - age, 0.0)
+
+    async def _loop(self):
+        while True:
+            # Scheduling from the files rather than from startup means
+            # restarts never postpone a backup
+            await asyncio.sleep(max(self.seconds_until_due(), self.delay))
+            try:
+                report = await create_backup(
+                    self.db_path,
+                    self.backup_dir,
+                    self.keep,
+                    min_age=self.interval * 0.9,
+                )
+            except Exception:
+                logger.exception("Backup failed")
+            else:
+                if report is not None:
+                    self.last_report = report
@@ -0,0 +1,185 @@
+"""
+In-memory program catalog: days, slots and exercises.
+
+The program only changes when the seed is reapplied or edited by hand, so it
+is loaded once at startup and served from memory. Call reload() after
+editing the program; the catalog then picks up the new program_version.
+"""
+
+from dataclasses import dataclass
+from datetime import UTC, datetime
+
+from fastapi import Request
+
+from koifit.db.setup import bump_program_version, get_program_version
+
+
+@dataclass(slots=True, frozen=True)
+class Exercise:
+    id: int
+    name: str
+    min_increment: float
+    active: int
+    notes: str | None
+    user_id: int
+
+
+@dataclass(slots=True, frozen=True)
+class Day:
+    id: int
+    label: str
+    ordinal: int
+    user_id: int
+
+
+@dataclass(slots=True, frozen=True)
+class Slot:
+    id: int
+    day_id: int
+    ordinal: int
+    title: str
+    preferred_exercise_id: int
+    warmup_sets: str
+    working_sets_count: int
+    rep_target: str
+    rpe_range: str | None
+    rest_minutes: float
+    has_dropset: int
+    # Owner of the slot's day
+    user_id: int
+    # Denormalized from the preferred exercise for templates
+    exercise_name: str
+    exercise_notes: str | None
+
+
+class ProgramCatalog:
+    """Days, slots and exercises indexed by id, with lookup counters."""
+
+    def __init__(self):
+        self.version = None
+        self.loaded_at = None
+        self.exercises = {}
+        self.days = {}
+        self.slots = {}
+        self._days_ordered = []
+        self._days_by_user = {}
+        self._slots_by_day = {}
+        self.hits = 0
+        self.misses = 0
+        self.reloads = 0
+
+    async def reload(self, db):
+        """Replace the catalog contents with the program currently in db."""
+        version = await get_program_version(db)
+
+        cursor = await db.execute(
+            "SELECT id, name, min_increment, active, notes, user_id FROM exercise"
+        )
+        exercises = {row[0]: Exercise(*row) for row in await cursor.fetchall()}
+
+        cursor = await db.execute(
+            "SELECT id, label, ordinal, user_id FROM day ORDER BY user_id, ordinal"
+        )
+        days_ordered = [Day(*row) for row in await cursor.fetchall()]
+        days_by_user = {}
+        for day in days_ordered:
+            days_by_user.setdefault(day.user_id, []).append(day)
+
+        cursor = await db.execute(
+            """SELECT sl.id, sl.day_id, sl.ordinal, sl.title, sl.preferred_exercise_id,
+                      sl.warmup_sets, sl.working_sets_count, sl.rep_target, sl.rpe_range,
+                      sl.rest_minutes, sl.has_dropset, d.user_id
+               FROM slot sl JOIN day d ON d.id = sl.day_id
+               ORDER BY sl.day_id, sl.ordinal"""
+        )
+        slots = {}
+        slots_by_day = {day.id: [] for day in days_ordered}
+        for row in await cursor.fetchall():
+            exercise = exercises.get(row[4])
+            slot = Slot(
+                *row,
+                exercise_name=exercise.name if exercise else "",
+                exercise_notes=exercise.notes if exercise else None,
+            )
+            slots[slot.id] = slot
+            slots_by_day.setdefault(slot.day_id, []).append(slot)
+
+        # Swap everything at once so readers never see a half-loaded catalog
+        self.exercises = exercises
+        self.days = {day.id: day for day in days_ordered}
+        self.slots = slots
+        self._days_ordered = days_ordered
+        self._days_by_user = days_by_user
+        self._slots_by_day = slots_by_day
+        self.version = version
+        self.loaded_at = datetime.now(UTC).replace(microsecond=0)
+        self.reloads += 1
+
+    def _lookup(self, table, key, user_id=None):
+        try:
+            value = table[int(key)]
+        except (KeyError, ValueError, TypeError):
+            self.misses += 1
+            return None
+        # Another user's row is reported exactly like a missing one
+        if user_id is not None and value.user_id != user_id:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def day(self, day_id, user_id=None):
+        """Day by id, or None; with user_id, only that user's."""
+        return self._lookup(self.days, day_id, user_id)
+
+    def slot(self, slot_id, user_id=None):
+        """Slot by id, or None; with user_id, only that user's."""
+        return self._lookup(self.slots, slot_id, user_id)
+
+    def exercise(self, exercise_id, user_id=None):
+        """Exercise by id, or None; with user_id, only that user's."""
+        return self._lookup(self.exercises, exercise_id, user_id)
+
+    def ordered_days(self, user_id=None):
+        """Days in program order; with user_id, only that user's."""
+        self.hits += 1
+        if user_id is None:
+            return self._days_ordered
+        return self._days_by_user.get(user_id, [])
+
+    def slots_for_day(self, day_id):
+        """Slots of a day in order; empty if the day is unknown."""
+        slots = self._lookup(self._slots_by_day, day_id)
+        return slots if slots is not None else []
+
+    def stats(self):
+        """Counters for monitoring cache effectiveness."""
+        return {
+            "version": self.version,
+            "hits": self.hits,
+            "misses": self.misses,
+            "reloads": self.reloads,
+            "users": len(self._days_by_user),
+            "days": len(self.days),
+            "slots": len(self.slots),
+            "exercises": len(self.exercises),
+        }
+
+
+def get_catalog(request: Request):
+    """FastAPI dependency returning the app's program catalog."""
+    return request.app.state.catalog
+
+
+async def reload_program(app):
+    """
+    Reload the app's catalog after the program was edited in the database.
+
+    Bumps program_version first, so fragments rendered from the old program
+    are dropped even when the edit was made by hand.
+    """
+    async with app.state.pool.writer() as db:
+        await bump_program_version(db)
+        await db.commit()
+        await app.state.catalog.reload(db)
+    app.state.fragments.set_version(app.state.catalog.version)
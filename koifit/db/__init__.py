@@ -2,6 +2,13 @@
 Database setup and connection helpers.
 """
 
+from .pool import DatabasePool, get_reader, get_writer
 from .setup import ensure_database, init_database
 
-__all__ = ["ensure_database", "init_database"]
+__all__ = [
+    "DatabasePool",
+    "ensure_database",
+    "get_reader",
+    "get_writer",
+    "init_database",
+]
@@ -0,0 +1,236 @@
+"""
+Versioned schema migrations.
+
+Migrations live in db/migrations as numbered files, NNNN_name.sql or
+NNNN_name.py, and are applied in order, each in its own transaction that
+also records it in schema_version. PRAGMA user_version holds the highest
+version up to which every migration is applied, so a startup with nothing
+to do costs one header read.
+
+A Python migration defines `async def migrate(db)`, run inside its
+transaction. With `ONLINE = True` it is a data backfill instead: it gets a
+writer factory (DatabasePool.writer), commits in its own short chunks, and
+runs in the background once the app is serving. It is recorded only when it
+finishes, so an interrupted one starts over on the next run and must be
+safe to repeat. Worker processes take turns through a lock, and a backfill
+another worker already finished is skipped.
+"""
+
+import asyncio
+import importlib.util
+import logging
+import re
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent / "migrations"
+
+MIGRATION_NAME = re.compile(r"^(\d{4})_([a-z0-9_]+)\.(sql|py)$")
+
+SCHEMA_VERSION_SQL = """CREATE TABLE IF NOT EXISTS schema_version (
+    version INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    applied_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+)"""
+
+
+@dataclass(frozen=True, slots=True)
+class Migration:
+    version: int
+    name: str
+    path: Path
+
+    @property
+    def online(self):
+        return self.path.suffix == ".py" and getattr(self.module(), "ONLINE", False)
+
+    def module(self):
+        spec = importlib.util.spec_from_file_location(
+            f"koifit_migration_{self.version:04d}", self.path
+        )
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module
+
+
+def discover_migrations(directory=MIGRATIONS_DIR):
+    """Migrations in directory, ordered by version."""
+    migrations = {}
+    for path in sorted(Path(directory).iterdir()):
+        match = MIGRATION_NAME.match(path.name)
+        if not match:
+            continue
+        version = int(match.group(1))
+        if version in migrations:
+            raise ValueError(f"Duplicate migration version {version}: {path.name}")
+        migrations[version] = Migration(version, match.group(2), path)
+    return [migrations[version] for version in sorted(migrations)]
+
+
+def _contiguous_version(migrations, applied):
+    """Highest version with every migration up to it applied."""
+    version = 0
+    for migration in migrations:
+        if migration.version not in applied:
+            break
+        version = migration.version
+    return version
+
+
+async def get_user_version(db):
+    cursor = await db.execute("PRAGMA user_version")
+    return (await cursor.fetchone())[0]
+
+
+async def _applied_versions(db):
+    cursor = await db.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'schema_version'"
+    )
+    if not await cursor.fetchall():
+        return set()
+    cursor = await db.execute("SELECT version FROM schema_version")
+    return {row[0] for row in await cursor.fetchall()}
+
+
+def _record_sql(migration, user_version):
+    # schema_version is created with the first migration rather than up
+    # front: settings such as auto_vacuum only apply to an empty database.
+    # Versions and names are validated by MIGRATION_NAME, so inlining is safe.
+    return (
+        f"{SCHEMA_VERSION_SQL};\n"
+        f"INSERT OR IGNORE INTO schema_version (version, name) "
+        f"VALUES ({migration.version}, '{migration.name}');\n"
+        f"PRAGMA user_version = {user_version};\n"
+    )
+
+
+async def _apply(db, migration, user_version):
+    """Apply one offline migration and record it, all in one transaction."""
+    try:
+        if migration.path.suffix == ".sql":
+            script = migration.path.read_text()
+            await db.executescript(
+                f"BEGIN;\n{script}\n;\n{_record_sql(migration, user_version)}COMMIT;"
+            )
+        else:
+            await db.execute("BEGIN")
+            await migration.module().migrate(db)
+            await db.executescript(_record_sql(migration, user_version) + "COMMIT;")
+    except Exception:
+        if db.in_transaction:
+            await db.rollback()
+        raise
+
+
+async def apply_migrations(db, migrations=None):
+    """
+    Apply every pending offline migration, in order.
+
+    Returns the pending online migrations, for run_online_migrations.
+    """
+    migrations = discover_migrations() if migrations is None else migrations
+    if not migrations or await get_user_version(db) >= migrations[-1].version:
+        return []
+
+    applied = await _applied_versions(db)
+    online = []
+    for migration in migrations:
+        if migration.version in applied:
+            continue
+        if migration.online:
+            online.append(migration)
+            continue
+        started = time.perf_counter()
+        version = _contiguous_version(migrations, applied | {migration.version})
+        await _apply(db, migration, version)
+        applied.add(migration.version)
+        logger.info(
+            "applied migration %04d_%s in %.0f ms",
+            migration.version,
+            migration.name,
+            (time.perf_counter() - started) * 1000,
+        )
+    return online
+
+
+async def run_online_migrations(writer, migrations, all_migrations=None):
+    """
+    Run online migrations one after another, recording each when it finishes.
+
+    writer is a context manager factory yielding the writer connection.
+    Migrations recorded since they were found pending are skipped.
+    """
+    all_migrations = discover_migrations() if all_migrations is None else all_migrations
+    for migration in migrations:
+        async with writer() as db:
+            if migration.version in await _applied_versions(db):
+                continue
+        started = time.perf_counter()
+        await migration.module().migrate(writer)
+        async with writer() as db:
+            applied = await _applied_versions(db) | {migration.version}
+            version = _contiguous_version(all_migrations, applied)
+            try:
+                await db.executescript(
+                    "BEGIN;\n" + _record_sql(migration, version) + "COMMIT;"
+                )
+            except Exception:
+                if db.in_transaction:
+                    await db.rollback()
+                raise
+        logger.info(
+            "applied online migration %04d_%s in %.0f ms",
+            migration.version,
+            migration.name,
+            (time.perf_counter() - started) * 1000,
+        )
+
+
+def start_online_migrations(pool, migrations, lock=None):
+    """
+    Background task running migrations on the pool; None if there are none.
+
+    lock is an async context manager held while they run, so worker
+    processes sharing the database run them one at a time.
+    """
+    if not migrations:
+        return None
+    return asyncio.create_task(_run_in_background(pool, migrations, lock))
+
+
+async def _run_in_background(pool, migrations, lock):
+    try:
+        if lock is None:
+            await run_online_migrations(pool.writer, migrations)
+        else:
+            async with lock:
+                await run_online_migrations(pool.writer, migrations)
+    except Exception:
+        logger.exception("online migration failed; it is retried on next start")
+
+
+async def stop_online_migrations(task):
+    """Cancel an unfinished online migration task; it reruns on next start."""
+    if task is None:
+        return
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+
+
+async def migrate_database(db, migrations=None):
+    """Apply every migration, online ones included, on a single connection."""
+
+    @asynccontextmanager
+    async def writer():
+        yield db
+
+    migrations = discover_migrations() if migrations is None else migrations
+    online = await apply_migrations(db, migrations)
+    await run_online_migrations(writer, online, migrations)
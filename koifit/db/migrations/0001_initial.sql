@@ -1,4 +1,9 @@
--- Koifit Workout Tracker Database Schema
+-- Koifit Workout Tracker Database Schema: the tables the app started with.
+-- IF NOT EXISTS throughout, so databases created before migrations adopt it.
+
+-- Free pages are returned by the maintenance task's incremental vacuum.
+-- Only takes effect on a new database; run vacuum_db.py to convert one.
+PRAGMA auto_vacuum = INCREMENTAL;
 
 -- Exercise table
 CREATE TABLE IF NOT EXISTS exercise (
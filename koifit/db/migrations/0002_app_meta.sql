@@ -0,0 +1,5 @@
+-- Application metadata (e.g. program_version, bumped whenever the seed is applied)
+CREATE TABLE IF NOT EXISTS app_meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
@@ -0,0 +1,20 @@
+-- Session Exercise Summary table (one row per finished session_exercise with done sets)
+CREATE TABLE IF NOT EXISTS session_exercise_summary (
+    session_exercise_id INTEGER PRIMARY KEY,
+    session_id INTEGER NOT NULL,
+    slot_id INTEGER NOT NULL,
+    exercise_id INTEGER NOT NULL,
+    date TEXT NOT NULL,
+    best_1rm REAL NOT NULL,
+    volume REAL NOT NULL,
+    top_weight_kg REAL,
+    top_reps INTEGER,
+    set_count INTEGER NOT NULL,
+    sets_json TEXT NOT NULL,
+    FOREIGN KEY (session_exercise_id) REFERENCES session_exercise(id),
+    FOREIGN KEY (session_id) REFERENCES session(id),
+    FOREIGN KEY (slot_id) REFERENCES slot(id),
+    FOREIGN KEY (exercise_id) REFERENCES exercise(id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_summary_slot_date ON session_exercise_summary(slot_id, date, session_id);
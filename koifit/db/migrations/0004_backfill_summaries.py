@@ -0,0 +1,13 @@
+"""
+Summaries for sessions finished before session_exercise_summary existed.
+"""
+
+from koifit.summaries import backfill_summaries
+
+# Runs in the background once the app is serving
+ONLINE = True
+
+
+async def migrate(writer):
+    """Backfill in chunks, each under the writer lock."""
+    await backfill_summaries(writer)
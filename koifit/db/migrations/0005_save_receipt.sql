@@ -0,0 +1,8 @@
+-- Save Receipt table (idempotency keys of applied batch saves, for replay dedupe)
+CREATE TABLE IF NOT EXISTS save_receipt (
+    idempotency_key TEXT PRIMARY KEY,
+    session_id INTEGER NOT NULL,
+    saved INTEGER NOT NULL,
+    created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (session_id) REFERENCES session(id)
+);
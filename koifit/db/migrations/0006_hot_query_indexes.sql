@@ -0,0 +1,32 @@
+-- Indexes matched to the hot queries; tests/test_query_plans.py checks them
+-- with EXPLAIN QUERY PLAN against ten years of synthetic history.
+
+-- Previous-session lookup: a day's finished sessions newest first, so the
+-- walk stops at the first session that did the slot's exercise
+CREATE INDEX IF NOT EXISTS idx_session_finished_day_date
+    ON session(day_id, date, id) WHERE is_finished = 1;
+DROP INDEX IF EXISTS idx_session_day_date;
+
+-- The unfinished session (at most one) for the home page and session start;
+-- is_finished alone has two values and indexed every row
+CREATE INDEX IF NOT EXISTS idx_session_unfinished
+    ON session(is_finished, day_id) WHERE is_finished = 0;
+DROP INDEX IF EXISTS idx_session_finished;
+
+-- Per-session probe of the previous-session lookup, the missing-row check
+-- on first load, and session loads in slot order; replaces the
+-- session_id-only index
+CREATE INDEX IF NOT EXISTS idx_session_exercise_session_slot
+    ON session_exercise(session_id, slot_id);
+DROP INDEX IF EXISTS idx_session_exercise_session;
+
+-- Duplicates the UNIQUE(session_exercise_id, set_number) index, which also
+-- returns sets in order
+DROP INDEX IF EXISTS idx_set_entry_session_exercise;
+
+-- Same columns as UNIQUE(day_id, ordinal)
+DROP INDEX IF EXISTS idx_slot_day_ordinal;
+
+-- finish_session rewrites the summaries of one session
+CREATE INDEX IF NOT EXISTS idx_summary_session
+    ON session_exercise_summary(session_id);
@@ -0,0 +1,12 @@
+-- Progression Target table (suggested weight/reps for each slot's next session)
+CREATE TABLE IF NOT EXISTS progression_target (
+    slot_id INTEGER PRIMARY KEY,
+    exercise_id INTEGER NOT NULL,
+    session_id INTEGER NOT NULL,
+    weight_kg REAL NOT NULL,
+    reps INTEGER NOT NULL,
+    reason TEXT NOT NULL,
+    FOREIGN KEY (slot_id) REFERENCES slot(id),
+    FOREIGN KEY (exercise_id) REFERENCES exercise(id),
+    FOREIGN KEY (session_id) REFERENCES session(id)
+);
@@ -0,0 +1,15 @@
+"""
+Targets for slots trained before progression_target existed.
+"""
+
+from koifit.progression import rebuild_progression_targets
+
+# Runs in the background once the app is serving
+ONLINE = True
+
+
+async def migrate(writer):
+    """One pass over the latest finished session of every slot."""
+    async with writer() as db:
+        await rebuild_progression_targets(db)
+        await db.commit()
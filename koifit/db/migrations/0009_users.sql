@@ -0,0 +1,41 @@
+-- Users: every session and program row belongs to one. Existing data goes
+-- to user 1, which also serves single-user mode (no USER_HEADER set).
+CREATE TABLE IF NOT EXISTS user (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    login TEXT NOT NULL UNIQUE,
+    created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+INSERT OR IGNORE INTO user (id, login) VALUES (1, 'default');
+
+-- Day ordinals become unique per user. SQLite cannot change a table's
+-- constraints in place, so the table is rebuilt with the same ids.
+CREATE TABLE day_new (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL DEFAULT 1,
+    label TEXT NOT NULL,
+    ordinal INTEGER NOT NULL,
+    FOREIGN KEY (user_id) REFERENCES user(id),
+    UNIQUE(user_id, ordinal)
+);
+INSERT INTO day_new (id, user_id, label, ordinal)
+    SELECT id, 1, label, ordinal FROM day;
+DROP TABLE day;
+ALTER TABLE day_new RENAME TO day;
+
+-- Slots belong to the user of their day
+ALTER TABLE exercise ADD COLUMN user_id INTEGER NOT NULL DEFAULT 1 REFERENCES user(id);
+ALTER TABLE session ADD COLUMN user_id INTEGER NOT NULL DEFAULT 1 REFERENCES user(id);
+
+CREATE INDEX IF NOT EXISTS idx_exercise_user ON exercise(user_id);
+
+-- A user's unfinished session, for the home page and session start
+CREATE INDEX IF NOT EXISTS idx_session_user_unfinished
+    ON session(user_id, day_id) WHERE is_finished = 0;
+DROP INDEX IF EXISTS idx_session_unfinished;
+
+-- A user's finished sessions in date order, for analytics
+CREATE INDEX IF NOT EXISTS idx_session_user_finished_date
+    ON session(user_id, date, id) WHERE is_finished = 1;
+
+-- A user's sessions in id order, for export
+CREATE INDEX IF NOT EXISTS idx_session_user ON session(user_id, id);
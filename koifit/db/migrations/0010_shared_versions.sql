@@ -0,0 +1,18 @@
+-- Counters worker processes use to notice each other's writes (see
+-- koifit/workers.py). data_modified is a Unix timestamp.
+INSERT OR IGNORE INTO app_meta (key, value) VALUES ('data_version', 0);
+INSERT OR IGNORE INTO app_meta (key, value)
+    VALUES ('data_modified', CAST(strftime('%s', 'now') AS INTEGER));
+INSERT OR IGNORE INTO app_meta (key, value) VALUES ('analytics_version', 0);
+
+-- Live session events, relayed to the other workers' open pages; swept by
+-- maintenance once every worker has had time to read them
+CREATE TABLE IF NOT EXISTS live_event (
+    id INTEGER PRIMARY KEY,
+    session_id INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    data TEXT NOT NULL,
+    origin TEXT,
+    worker INTEGER NOT NULL,
+    created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
@@ -0,0 +1,10 @@
+-- Revisions for optimistic concurrency on autosave (see koifit/autosave.py).
+-- session_exercise.revision counts every change to the exercise or its
+-- sets; fields_revision and set_entry.revision are the revision at which the
+-- exercise's own fields, and each set, last changed.
+ALTER TABLE session_exercise ADD COLUMN revision INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE session_exercise ADD COLUMN fields_revision INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE set_entry ADD COLUMN revision INTEGER NOT NULL DEFAULT 0;
+
+-- What an applied batch returned, so a replay gets the same answer
+ALTER TABLE save_receipt ADD COLUMN response TEXT;
@@ -0,0 +1,178 @@
+"""
+Connection pool: one writer connection and a set of read-only connections.
+
+SQLite allows a single writer at a time, so writes are serialized through one
+connection guarded by a lock. With WAL journaling, readers never block the
+writer and see the last committed state, so history pages and session loads
+run on their own connections without waiting for autosaves.
+
+With shared=True (multi-worker mode) the data version lives in app_meta
+instead of in memory, so every worker process derives the same cache
+validators; see koifit/workers.py.
+"""
+
+import asyncio
+import secrets
+from contextlib import asynccontextmanager
+from datetime import UTC, datetime
+
+import aiosqlite
+from fastapi import Request
+
+from koifit.instrumentation import InstrumentedConnection
+
+# Applied to every connection. Values are per connection except journal_mode,
+# which is persisted in the database file.
+CONNECTION_PRAGMAS = (
+    "PRAGMA busy_timeout = 5000",
+    # WAL fsyncs on checkpoint rather than on every commit; a crash can lose
+    # the last commits but never corrupts the file.
+    "PRAGMA synchronous = NORMAL",
+    # Negative values are KiB: 16 MiB page cache per connection
+    "PRAGMA cache_size = -16000",
+    "PRAGMA mmap_size = 134217728",
+    "PRAGMA temp_store = MEMORY",
+)
+
+BUMP_SHARED_VERSION_SQL = """UPDATE app_meta
+    SET value = CASE key
+        WHEN 'data_version' THEN value + 1
+        ELSE CAST(strftime('%s', 'now') AS INTEGER)
+    END
+    WHERE key IN ('data_version', 'data_modified')
+    RETURNING key, value"""
+
+
+async def configure_connection(db, read_only=False):
+    """Apply connection pragmas and the row factory routes expect."""
+    db.row_factory = aiosqlite.Row
+    for pragma in CONNECTION_PRAGMAS:
+        await db.execute(pragma)
+    if read_only:
+        await db.execute("PRAGMA query_only = 1")
+
+
+class DatabasePool:
+    """A single serialized writer plus `readers` read-only connections."""
+
+    def __init__(self, db_path, readers=4, metrics=None, shared=False):
+        self.db_path = db_path
+        self.reader_count = readers
+        self.shared = shared
+        # Connections are handed out wrapped, so every statement is timed
+        self.metrics = metrics
+        self._writer = None
+        # total_changes already covered by a shared data version bump
+        self._versioned_changes = 0
+        self._write_lock = asyncio.Lock()
+        self._readers = asyncio.Queue()
+        self._all_readers = []
+        # Bumped whenever a writer block changed rows; cheap cache validator
+        self.data_version = 0
+        # The in-memory version restarts at 0 with the process, so validators
+        # also carry this boot's epoch; the shared version is persisted
+        self.data_epoch = "" if shared else secrets.token_hex(4)
+        self.data_modified = datetime.now(UTC).replace(microsecond=0)
+
+    async def _connect(self, commit_hook=None):
+        db = await aiosqlite.connect(str(self.db_path))
+        return InstrumentedConnection(db, self.metrics, commit_hook)
+
+    async def open(self):
+        """Open all connections and switch the database to WAL."""
+        self._writer = await self._connect(
+            self._commit_with_version if self.shared else None
+        )
+        await self._writer.execute("PRAGMA journal_mode = WAL")
+        await configure_connection(self._writer)
+        for _ in range(self.reader_count):
+            reader = await self._connect()
+            await configure_connection(reader, read_only=True)
+            self._all_readers.append(reader)
+            self._readers.put_nowait(reader)
+
+    async def close(self):
+        """Close every connection; the pool cannot be used afterwards."""
+        for reader in self._all_readers:
+            await reader.close()
+        self._all_readers.clear()
+        if self._writer is not None:
+            await self._writer.close()
+            self._writer = None
+
+    async def set_trace_callback(self, callback):
+        """Call callback with every statement run on any connection; None stops."""
+        for db in (self._writer, *self._all_readers):
+            await db.set_trace_callback(callback)
+
+    @asynccontextmanager
+    async def writer(self):
+        """Hold the writer connection exclusively for the duration of the block."""
+        async with self._write_lock:
+            changes = self._writer.total_changes
+            self._versioned_changes = changes
+            try:
+                yield self._writer
+            finally:
+                # Never hand the next caller a half-finished transaction
+                if self._writer.in_transaction:
+                    await self._writer.rollback()
+                    self._versioned_changes = self._writer.total_changes
+                if not self.shared:
+                    if self._writer.total_changes != changes:
+                        self.data_version += 1
+                        self.data_modified = datetime.now(UTC).replace(microsecond=0)
+                elif self._writer.total_changes != self._versioned_changes:
+                    # Committed by a script (migrations), past the commit hook
+                    await self._writer.execute("BEGIN")
+                    await self._writer.commit()
+
+    async def _commit_with_version(self, commit):
+        """
+        Commit the writer, bumping the shared data version in the same transaction.
+
+        Readers in other workers see the new data and the new version together,
+        at no extra commit.
+        """
+        db = self._writer
+        if not db.in_transaction or db.total_changes == self._versioned_changes:
+            await commit()
+            return
+        cursor = await db.execute(BUMP_SHARED_VERSION_SQL)
+        versions = dict(await cursor.fetchall())
+        await commit()
+        self._versioned_changes = db.total_changes
+        self.observe_data_version(versions["data_version"], versions["data_modified"])
+
+    def observe_data_version(self, version, modified):
+        """Adopt the shared data version, modified being a Unix timestamp."""
+        if version > self.data_version:
+            self.data_version = version
+            self.data_modified = datetime.fromtimestamp(modified, UTC)
+
+    @asynccontextmanager
+    async def reader(self):
+        """Borrow a read-only connection, waiting if all are in use."""
+        reader = await self._readers.get()
+        try:
+            yield reader
+        finally:
+            self._readers.put_nowait(reader)
+
+
+async def get_writer(request: Request):
+    """
+    FastAPI dependency yielding the writer connection.
+
+    Dependencies are resolved in the order they are declared, and the
+    writer is held until the response is sent: declare get_current_user
+    before it, as resolving a new login takes the writer too.
+    """
+    async with request.app.state.pool.writer() as db:
+        yield db
+
+
+async def get_reader(request: Request):
+    """FastAPI dependency yielding a read-only connection."""
+    async with request.app.state.pool.reader() as db:
+        yield db
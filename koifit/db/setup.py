@@ -2,18 +2,22 @@
 Utilities for creating and seeding the SQLite database.
 """
 
+import asyncio
+import os
+import shutil
+from contextlib import asynccontextmanager
 from pathlib import Path
 
 import aiosqlite
 
-SQL_DIR = Path(__file__).resolve().parent / "sql"
+from .migrate import apply_migrations, migrate_database
 
+try:
+    import fcntl
+except ImportError:  # Not on Windows: startup is not locked there
+    fcntl = None
 
-async def apply_schema(db):
-    """Apply the SQL schema from db/schema.sql."""
-    schema_path = SQL_DIR / "schema.sql"
-    schema_sql = schema_path.read_text()
-    await db.executescript(schema_sql)
+SQL_DIR = Path(__file__).resolve().parent / "sql"
 
 
 async def apply_seed(db):
@@ -21,6 +25,30 @@ async def apply_seed(db):
     seed_path = SQL_DIR / "seed.sql"
     seed_sql = seed_path.read_text()
     await db.executescript(seed_sql)
+    await bump_program_version(db)
+
+
+async def bump_program_version(db):
+    """Mark the program (days, slots, exercises) as changed."""
+    await bump_version(db, "program_version")
+
+
+async def bump_version(db, key):
+    """Increment an app_meta counter, creating it at 1. Does not commit."""
+    await db.execute(
+        """INSERT INTO app_meta (key, value) VALUES (?, 1)
+           ON CONFLICT(key) DO UPDATE SET value = value + 1""",
+        (key,),
+    )
+
+
+async def get_program_version(db):
+    """Current program version; 0 if the program was never seeded."""
+    cursor = await db.execute(
+        "SELECT value FROM app_meta WHERE key = 'program_version'"
+    )
+    row = await cursor.fetchone()
+    return row[0] if row else 0
 
 
 async def init_database(db_path, overwrite=False):
@@ -34,15 +62,91 @@ async def init_database(db_path, overwrite=False):
         db_path.unlink()
 
     async with aiosqlite.connect(str(db_path)) as db:
-        await apply_schema(db)
+        db.row_factory = aiosqlite.Row
+        await migrate_database(db)
         await apply_seed(db)
         await db.commit()
 
 
-async def ensure_database(db_path):
+def copy_template_database(template_path, db_path):
     """
-    Ensure the database file exists; if missing, create and seed it.
+    Copy a pre-seeded database file to db_path.
+
+    The copy goes to a temporary file first, so an interrupted copy never
+    leaves a partial database behind.
     """
-    if db_path.exists():
-        return
-    await init_database(db_path, overwrite=False)
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    partial = db_path.with_name(f"{db_path.name}.partial")
+    shutil.copyfile(template_path, partial)
+    os.replace(partial, db_path)
+
+
+async def ensure_database(db_path, template_path=None):
+    """
+    Ensure the database exists and its schema is current.
+
+    A missing database is copied from template_path when that file exists,
+    otherwise created and seeded. An existing or copied one gets its
+    pending migrations; the online ones (backfills) are returned for the
+    app to run in the background, see start_online_migrations.
+
+    Worker processes starting together take turns through a lock file next
+    to the database, so only the first one creates or migrates it.
+    """
+    lock_file = await asyncio.to_thread(_lock_database, db_path)
+    try:
+        return await _ensure_database(db_path, template_path)
+    finally:
+        # Closing the file releases the lock
+        lock_file.close()
+
+
+def _lock_database(db_path, suffix=".lock", blocking=True):
+    """
+    Open the database's lock file and take an exclusive lock on it.
+
+    Without blocking, returns None instead of waiting when it is held.
+    """
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    lock_file = open(db_path.with_name(f"{db_path.name}{suffix}"), "a")  # noqa: SIM115
+    if fcntl is not None:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            lock_file.close()
+            return None
+    return lock_file
+
+
+# Seconds between attempts to take the online migration lock
+MIGRATION_LOCK_POLL = 0.5
+
+
+@asynccontextmanager
+async def lock_online_migrations(db_path):
+    """
+    Hold the database's online migration lock, waiting while another
+    worker process runs them.
+
+    This is a lock file of its own: a backfill can run for minutes, and
+    holding the startup lock that long would hold up workers starting.
+    Waiting polls, so a worker shutting down can cancel it.
+    """
+    while (lock_file := _lock_database(db_path, ".migrate.lock", False)) is None:
+        await asyncio.sleep(MIGRATION_LOCK_POLL)
+    try:
+        yield
+    finally:
+        lock_file.close()
+
+
+async def _ensure_database(db_path, template_path):
+    if not db_path.exists():
+        if template_path is None or not template_path.exists():
+            await init_database(db_path, overwrite=False)
+            return []
+        copy_template_database(template_path, db_path)
+
+    async with aiosqlite.connect(str(db_path)) as db:
+        db.row_factory = aiosqlite.Row
+        return await apply_migrations(db)
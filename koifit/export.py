@@ -0,0 +1,153 @@
+"""
+Streaming export of training history as CSV or JSONL.
+
+An export covers one user's history. Rows are read session by session,
+a chunk of sessions at a time, each chunk on a briefly borrowed
+connection, and encoded as they go, so memory stays constant however long
+the history is. Chunks walk idx_session_user, so other users' history is
+never read. Ids are bounded by the maxima read in a single statement at
+the start, so rows written during an export are left out consistently.
+"""
+
+import csv
+import io
+import json
+
+from koifit.users import DEFAULT_USER_ID
+
+# Export order matters: the importer maps a row's parent ids as it goes
+TABLE_COLUMNS = {
+    "session": ("id", "day_id", "date", "is_finished"),
+    "session_exercise": (
+        "id",
+        "session_id",
+        "slot_id",
+        "exercise_id",
+        "effort_tag",
+        "next_time_note",
+        "dropset_done",
+    ),
+    "set_entry": (
+        "id",
+        "session_exercise_id",
+        "set_number",
+        "weight_kg",
+        "reps",
+        "is_done",
+        "is_drop",
+    ),
+}
+
+# Rows of a table for the user's sessions in (?, ?], in session order
+CHUNK_SQL = {
+    "session": """SELECT s.id, s.day_id, s.date, s.is_finished
+       FROM session s
+       WHERE s.user_id = ? AND s.id > ? AND s.id <= ? AND s.id <= ?
+       ORDER BY s.id""",
+    "session_exercise": """SELECT se.id, se.session_id, se.slot_id, se.exercise_id,
+              se.effort_tag, se.next_time_note, se.dropset_done
+       FROM session s
+       JOIN session_exercise se ON se.session_id = s.id
+       WHERE s.user_id = ? AND s.id > ? AND s.id <= ? AND se.id <= ?
+       ORDER BY s.id, se.slot_id, se.id""",
+    "set_entry": """SELECT st.id, st.session_exercise_id, st.set_number, st.weight_kg,
+              st.reps, st.is_done, st.is_drop
+       FROM session s
+       JOIN session_exercise se ON se.session_id = s.id
+       JOIN set_entry st ON st.session_exercise_id = se.id
+       WHERE s.user_id = ? AND s.id > ? AND s.id <= ? AND st.id <= ?
+       ORDER BY s.id, se.slot_id, se.id, st.set_number""",
+}
+
+# Last session id of the next chunk of the user's sessions
+CHUNK_END_SQL = """SELECT MAX(id) FROM (
+       SELECT id FROM session
+       WHERE user_id = ? AND id > ? AND id <= ?
+       ORDER BY id LIMIT ?)"""
+
+FORMATS = {"csv": "text/csv; charset=utf-8", "jsonl": "application/x-ndjson"}
+
+CHUNK_SIZE = 1000
+
+
+async def export_bounds(reader):
+    """Highest id of every exported table, read as one snapshot."""
+    maxima = ", ".join(
+        f"(SELECT COALESCE(MAX(id), 0) FROM {table})" for table in TABLE_COLUMNS
+    )
+    async with reader() as db:
+        cursor = await db.execute(f"SELECT {maxima}")
+        row = (await cursor.fetchall())[0]
+    return dict(zip(TABLE_COLUMNS, row))
+
+
+async def iter_chunks(
+    reader, table, bounds, chunk_size=CHUNK_SIZE, user_id=DEFAULT_USER_ID
+):
+    """
+    Yield lists of row tuples of table belonging to the user's sessions.
+
+    Each list covers up to chunk_size sessions, in session id order; rows
+    with ids above bounds[table] are left out.
+    """
+    last_session = 0
+    while True:
+        async with reader() as db:
+            cursor = await db.execute(
+                CHUNK_END_SQL, (user_id, last_session, bounds["session"], chunk_size)
+            )
+            chunk_end = (await cursor.fetchall())[0][0]
+            if chunk_end is None:
+                return
+            cursor = await db.execute(
+                CHUNK_SQL[table], (user_id, last_session, chunk_end, bounds[table])
+            )
+            rows = [tuple(row) for row in await cursor.fetchall()]
+        if rows:
+            yield rows
+        last_session = chunk_end
+
+
+def encode_csv(rows, header=None):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    if header:
+        writer.writerow(header)
+    writer.writerows(rows)
+    return buffer.getvalue()
+
+
+def encode_jsonl(table, rows):
+    columns = TABLE_COLUMNS[table]
+    return "".join(
+        json.dumps({"table": table, **dict(zip(columns, row))}, separators=(",", ":"))
+        + "\n"
+        for row in rows
+    )
+
+
+async def stream_export(
+    reader, tables, fmt, chunk_size=CHUNK_SIZE, user_id=DEFAULT_USER_ID
+):
+    """
+    Async generator of text chunks exporting the user's rows of tables.
+
+    reader is a context manager factory yielding a connection, such as
+    DatabasePool.reader. CSV takes a single table; JSONL lines carry a
+    "table" field, so several tables can share one file. chunk_size
+    counts sessions.
+    """
+    if fmt == "csv" and len(tables) != 1:
+        raise ValueError("CSV exports one table at a time")
+    bounds = await export_bounds(reader)
+    for table in tables:
+        header = TABLE_COLUMNS[table] if fmt == "csv" else None
+        async for rows in iter_chunks(reader, table, bounds, chunk_size, user_id):
+            if fmt == "csv":
+                yield encode_csv(rows, header)
+                header = None
+            else:
+                yield encode_jsonl(table, rows)
+        if header:
+            # Empty table: still a valid CSV with its header
+            yield encode_csv([], header)
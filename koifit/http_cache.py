@@ -0,0 +1,84 @@
+"""
+Conditional GET helpers: ETag/Last-Modified validators and 304 responses.
+"""
+
+import hashlib
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi import Request, Response
+
+
+def make_etag(*parts):
+    """Weak ETag derived from parts (versions, ids, query strings)."""
+    key = ":".join(str(part) for part in parts)
+    return f'W/"{hashlib.sha1(key.encode()).hexdigest()[:16]}"'
+
+
+def if_none_match(request: Request, etag):
+    """True if the request's If-None-Match header matches etag (weak comparison)."""
+    header = request.headers.get("if-none-match")
+    if header is None:
+        return False
+    if header.strip() == "*":
+        return True
+    tags = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return etag.removeprefix("W/") in tags
+
+
+def accepted_encodings(request: Request):
+    """Content codings listed in Accept-Encoding, without q-values."""
+    header = request.headers.get("accept-encoding", "")
+    return {coding.split(";")[0].strip().lower() for coding in header.split(",")}
+
+
+def validator_headers(etag, last_modified):
+    """Response headers letting the client revalidate instead of refetching."""
+    return {
+        "ETag": etag,
+        "Last-Modified": format_datetime(last_modified, usegmt=True),
+        "Cache-Control": "no-cache",
+    }
+
+
+def not_modified(request: Request, headers):
+    """
+    A 304 response if the client's copy is still current, else None.
+
+    If-None-Match takes precedence; If-Modified-Since is only checked when
+    the client sent no ETag.
+    """
+    if "if-none-match" in request.headers:
+        if if_none_match(request, headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+        return None
+    since = request.headers.get("if-modified-since")
+    if since:
+        try:
+            since = parsedate_to_datetime(since)
+            modified = parsedate_to_datetime(headers["Last-Modified"])
+        except (TypeError, ValueError):
+            return None
+        if modified <= since:
+            return Response(status_code=304, headers=headers)
+    return None
+
+
+def page_validators(request: Request, *parts):
+    """
+    Validators for a response built from the database and the program.
+
+    The ETag combines parts with the pool's data version and epoch, the
+    catalog version and the asset fingerprints, so any committed write,
+    restart, program reload or new deploy changes it; computing it costs no
+    queries.
+    """
+    state = request.app.state
+    etag = make_etag(
+        *parts,
+        state.pool.data_epoch,
+        state.pool.data_version,
+        state.catalog.version,
+        state.assets.version,
+    )
+    last_modified = max(state.pool.data_modified, state.catalog.loaded_at)
+    return validator_headers(etag, last_modified)
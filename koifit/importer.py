@@ -0,0 +1,201 @@
+"""
+Bulk import of training history written by koifit.export.
+
+Rows are streamed from the files, remapped and inserted with executemany,
+one transaction per chunk, so memory stays constant however long the
+history is. Imported ids are shifted past the current maximum of each
+table; that keeps existing rows intact and lets every reference be
+remapped without a lookup table.
+"""
+
+import csv
+import json
+from pathlib import Path
+
+from koifit.db.setup import bump_version
+from koifit.export import TABLE_COLUMNS
+from koifit.progression import rebuild_progression_targets
+from koifit.summaries import backfill_summaries
+from koifit.users import DEFAULT_USER_ID
+
+CHUNK_SIZE = 2000
+# Slots whose progression targets are rebuilt per writer hold
+TARGET_CHUNK_SIZE = 100
+
+COLUMN_TYPES = {
+    "id": int,
+    "day_id": int,
+    "date": str,
+    "is_finished": int,
+    "session_id": int,
+    "slot_id": int,
+    "exercise_id": int,
+    "effort_tag": str,
+    "next_time_note": str,
+    "dropset_done": int,
+    "session_exercise_id": int,
+    "set_number": int,
+    "weight_kg": float,
+    "reps": int,
+    "is_done": int,
+    "is_drop": int,
+}
+
+NULLABLE = {"effort_tag", "next_time_note"}
+
+# Child column -> the imported table it points into
+PARENTS = {"session_id": "session", "session_exercise_id": "session_exercise"}
+
+# Column -> the program table it must exist in
+PROGRAM_REFS = {"day_id": "day", "slot_id": "slot", "exercise_id": "exercise"}
+
+# Ids of the user's program rows, per PROGRAM_REFS table
+PROGRAM_SQL = {
+    "day": "SELECT id FROM day WHERE user_id = ?",
+    "slot": "SELECT sl.id FROM slot sl JOIN day d ON d.id = sl.day_id WHERE d.user_id = ?",
+    "exercise": "SELECT id FROM exercise WHERE user_id = ?",
+}
+
+
+def _coerce(table, row):
+    """Typed value tuple of row in TABLE_COLUMNS order; CSV gives strings."""
+    values = []
+    for column in TABLE_COLUMNS[table]:
+        if column not in row:
+            raise ValueError(f"{table} row is missing {column}")
+        value = row[column]
+        if value is None or value == "":
+            if column not in NULLABLE:
+                raise ValueError(f"{table}.{column} cannot be empty")
+            values.append(None)
+        else:
+            values.append(COLUMN_TYPES[column](value))
+    return values
+
+
+def read_jsonl(path):
+    """Yield (table, row) from a JSONL export."""
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                row = json.loads(line)
+                yield row.pop("table", None), row
+
+
+def read_csv(path):
+    """Yield (table, row) from a CSV export; the table is the file name."""
+    table = Path(path).stem
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            yield table, row
+
+
+def read_export(paths):
+    """Yield (table, row) from export files, in the order given."""
+    for path in paths:
+        if Path(path).suffix == ".jsonl":
+            yield from read_jsonl(path)
+        else:
+            yield from read_csv(path)
+
+
+async def _load_refs(writer, user_id):
+    async with writer() as db:
+        offsets = {}
+        for table in TABLE_COLUMNS:
+            cursor = await db.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}")
+            offsets[table] = (await cursor.fetchall())[0][0]
+        program = {}
+        for table, sql in PROGRAM_SQL.items():
+            cursor = await db.execute(sql, (user_id,))
+            program[table] = {row[0] for row in await cursor.fetchall()}
+    return offsets, program
+
+
+async def import_history(writer, rows, chunk_size=CHUNK_SIZE, user_id=DEFAULT_USER_ID):
+    """
+    Insert (table, row) pairs as the user's history, committing every chunk_size rows.
+
+    writer is a context manager factory such as DatabasePool.writer, held
+    for one chunk at a time. Parents must come before their children, as
+    in the export order. Days, slots and exercises must already exist and
+    belong to the user.
+    Raises ValueError on a malformed row; chunks committed before it are
+    kept. Summaries of imported finished sessions are written afterwards
+    and the progression targets of the slots the import trained recomputed,
+    TARGET_CHUNK_SIZE slots per writer hold.
+
+    Returns the number of rows imported per table plus "summaries" and
+    "targets".
+    """
+    offsets, program = await _load_refs(writer, user_id)
+    # Highest remapped id per table so far: children may only point at
+    # parents imported before them
+    imported_max = dict(offsets)
+    counts = dict.fromkeys(TABLE_COLUMNS, 0)
+    slot_ids = set()
+    buffer = []
+    buffer_table = None
+
+    async def flush():
+        if not buffer:
+            return
+        columns = TABLE_COLUMNS[buffer_table]
+        if buffer_table == "session":
+            columns += ("user_id",)
+        sql = (
+            f"INSERT INTO {buffer_table} ({', '.join(columns)}) "
+            f"VALUES ({', '.join('?' * len(columns))})"
+        )
+        async with writer() as db:
+            await db.executemany(sql, buffer)
+            await db.commit()
+        counts[buffer_table] += len(buffer)
+        buffer.clear()
+
+    for table, row in rows:
+        if table not in TABLE_COLUMNS:
+            raise ValueError(f"Unknown table {table!r}")
+        values = _coerce(table, row)
+        for i, column in enumerate(TABLE_COLUMNS[table]):
+            if column == "id":
+                values[i] += offsets[table]
+                imported_max[table] = max(imported_max[table], values[i])
+            elif column in PARENTS:
+                parent = PARENTS[column]
+                values[i] += offsets[parent]
+                if not offsets[parent] < values[i] <= imported_max[parent]:
+                    raise ValueError(
+                        f"{table}.{column} {row[column]} is not an imported {parent}"
+                    )
+            elif (
+                column in PROGRAM_REFS
+                and values[i] not in program[PROGRAM_REFS[column]]
+            ):
+                raise ValueError(f"{table}.{column} {values[i]} does not exist")
+        if table == "session":
+            values.append(user_id)
+        elif table == "session_exercise":
+            slot_ids.add(values[TABLE_COLUMNS[table].index("slot_id")])
+
+        if table != buffer_table:
+            await flush()
+            buffer_table = table
+        buffer.append(values)
+        if len(buffer) >= chunk_size:
+            await flush()
+    await flush()
+
+    counts["summaries"] = await backfill_summaries(writer, after_id=offsets["session"])
+    counts["targets"] = 0
+    slot_ids = sorted(slot_ids)
+    for start in range(0, len(slot_ids), TARGET_CHUNK_SIZE):
+        async with writer() as db:
+            counts["targets"] += await rebuild_progression_targets(
+                db, slot_ids[start : start + TARGET_CHUNK_SIZE]
+            )
+            await db.commit()
+    async with writer() as db:
+        await bump_version(db, "analytics_version")
+        await db.commit()
+    return counts
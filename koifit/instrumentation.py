@@ -0,0 +1,239 @@
+"""
+Per-request SQL instrumentation: statement counts and timings.
+
+Pool connections are wrapped in InstrumentedConnection, which times every
+statement, fetch and commit. Timings go to the RequestStats of the request
+being served (a context variable set by RequestTimingMiddleware) and to the
+process-wide Metrics behind /metrics. The middleware reports each request
+as a Server-Timing header and one structured log line; statements slower
+than SLOW_QUERY_MS are logged on their own.
+"""
+
+import json
+import logging
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from starlette.datastructures import MutableHeaders
+
+request_logger = logging.getLogger("koifit.requests")
+slow_query_logger = logging.getLogger("koifit.slow_queries")
+
+
+@dataclass(slots=True)
+class RequestStats:
+    method: str
+    path: str
+    started: float = field(default_factory=time.perf_counter)
+    statements: int = 0
+    sql_seconds: float = 0.0
+    slowest_seconds: float = 0.0
+    slowest_sql: str | None = None
+    commits: int = 0
+    commit_seconds: float = 0.0
+
+    def server_timing(self, total_seconds):
+        """Server-Timing header value; durations in milliseconds."""
+        metrics = [
+            f'sql;dur={self.sql_seconds * 1000:.2f};desc="{self.statements} statements"',
+            f"sql-slowest;dur={self.slowest_seconds * 1000:.2f}",
+        ]
+        if self.commits:
+            metrics.append(f"commit;dur={self.commit_seconds * 1000:.2f}")
+        metrics.append(f"total;dur={total_seconds * 1000:.2f}")
+        return ", ".join(metrics)
+
+
+current_stats: ContextVar[RequestStats | None] = ContextVar(
+    "current_stats", default=None
+)
+
+
+def _one_line(sql):
+    return " ".join(sql.split()) if sql else None
+
+
+class InstrumentedCursor:
+    """aiosqlite cursor whose fetches count toward its statement's time."""
+
+    def __init__(self, cursor, connection, sql, seconds):
+        self._cursor = cursor
+        self._connection = connection
+        self._sql = sql
+        self._seconds = seconds
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    async def _timed(self, fetch, *args):
+        started = time.perf_counter()
+        try:
+            return await fetch(*args)
+        finally:
+            elapsed = time.perf_counter() - started
+            self._seconds += elapsed
+            self._connection._record(self._sql, elapsed, self._seconds)
+
+    async def fetchone(self):
+        return await self._timed(self._cursor.fetchone)
+
+    async def fetchall(self):
+        return await self._timed(self._cursor.fetchall)
+
+    async def fetchmany(self, *args):
+        return await self._timed(self._cursor.fetchmany, *args)
+
+
+class InstrumentedConnection:
+    """
+    Thin timing wrapper around an aiosqlite connection.
+
+    Everything not overridden (row_factory, total_changes, in_transaction,
+    set_trace_callback, close...) goes straight to the wrapped connection.
+    commit_hook, if given, is awaited with the wrapped connection's commit
+    and must call it; the pool uses it to write into each transaction.
+    """
+
+    def __init__(self, db, metrics=None, commit_hook=None):
+        object.__setattr__(self, "_db", db)
+        object.__setattr__(self, "_metrics", metrics)
+        object.__setattr__(self, "_commit_hook", commit_hook)
+
+    def __getattr__(self, name):
+        return getattr(self._db, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._db, name, value)
+
+    def _record(self, sql, elapsed, statement_seconds, new_statement=False):
+        """Add elapsed to the current request; statement_seconds is its total so far."""
+        stats = current_stats.get()
+        if stats is not None:
+            stats.statements += new_statement
+            stats.sql_seconds += elapsed
+            if statement_seconds > stats.slowest_seconds:
+                stats.slowest_seconds = statement_seconds
+                stats.slowest_sql = sql
+        if self._metrics is None:
+            return
+        self._metrics.observe_statement(elapsed, new_statement)
+
+        # Logged once, when the statement (execute plus fetches) crosses it
+        threshold = self._metrics.slow_query_seconds
+        if threshold is None or statement_seconds < threshold:
+            return
+        if new_statement or statement_seconds - elapsed < threshold:
+            self._metrics.slow_queries += 1
+            slow_query_logger.warning(
+                json.dumps(
+                    {
+                        "event": "slow_query",
+                        "ms": round(statement_seconds * 1000, 2),
+                        "sql": _one_line(sql),
+                        "path": stats.path if stats else None,
+                    }
+                )
+            )
+
+    async def execute(self, sql, parameters=None):
+        started = time.perf_counter()
+        try:
+            cursor = await self._db.execute(sql, parameters)
+        finally:
+            elapsed = time.perf_counter() - started
+            self._record(sql, elapsed, elapsed, new_statement=True)
+        return InstrumentedCursor(cursor, self, sql, elapsed)
+
+    async def executemany(self, sql, parameters):
+        started = time.perf_counter()
+        try:
+            return await self._db.executemany(sql, parameters)
+        finally:
+            elapsed = time.perf_counter() - started
+            self._record(sql, elapsed, elapsed, new_statement=True)
+
+    async def executescript(self, script):
+        started = time.perf_counter()
+        try:
+            return await self._db.executescript(script)
+        finally:
+            elapsed = time.perf_counter() - started
+            self._record(script, elapsed, elapsed, new_statement=True)
+
+    async def commit(self):
+        started = time.perf_counter()
+        try:
+            if self._commit_hook is None:
+                await self._db.commit()
+            else:
+                await self._commit_hook(self._db.commit)
+        finally:
+            elapsed = time.perf_counter() - started
+            stats = current_stats.get()
+            if stats is not None:
+                stats.commits += 1
+                stats.commit_seconds += elapsed
+            if self._metrics is not None:
+                self._metrics.observe_commit(elapsed)
+
+
+class RequestTimingMiddleware:
+    """
+    Per-request stats, reported as Server-Timing and one access log line.
+
+    Pure ASGI rather than BaseHTTPMiddleware, so the endpoint runs in this
+    context and sees current_stats.
+    """
+
+    def __init__(self, app, metrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(scope["method"], scope["path"])
+        token = current_stats.set(stats)
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append(
+                    "Server-Timing",
+                    stats.server_timing(time.perf_counter() - stats.started),
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            current_stats.reset(token)
+            total = time.perf_counter() - stats.started
+            route = scope.get("route")
+            route_path = route.path if route is not None else "unmatched"
+            self.metrics.observe_request(stats.method, route_path, status, total)
+            if request_logger.isEnabledFor(logging.INFO):
+                request_logger.info(
+                    json.dumps(
+                        {
+                            "event": "request",
+                            "method": stats.method,
+                            "path": stats.path,
+                            "route": route_path,
+                            "status": status,
+                            "ms": round(total * 1000, 2),
+                            "statements": stats.statements,
+                            "sql_ms": round(stats.sql_seconds * 1000, 2),
+                            "slowest_ms": round(stats.slowest_seconds * 1000, 2),
+                            "slowest_sql": _one_line(stats.slowest_sql),
+                            "commits": stats.commits,
+                            "commit_ms": round(stats.commit_seconds * 1000, 2),
+                        }
+                    )
+                )
@@ -0,0 +1,245 @@
+"""
+Live session sync: server-sent events pushed to every open copy of a session.
+
+Saves publish the set rows and fields they actually changed; each
+subscriber (one per open page) gets them through its own bounded queue,
+so a slow or stalled client can hold at most QUEUE_SIZE events. A
+subscriber that falls further behind is dropped with a "resync" event
+and reloads the page instead of growing memory. Events are encoded once
+per publish and shared by all subscribers.
+
+In multi-worker mode a page may be subscribed on another process than the
+one handling a save, so events are also written to live_event and every
+worker's LiveRelay polls that table for the others' events.
+"""
+
+import asyncio
+import json
+import logging
+import os
+from dataclasses import dataclass, field
+
+from fastapi import Request
+
+# Events a subscriber may have waiting before it is told to resync
+QUEUE_SIZE = 32
+
+# Open pages per session; more is a runaway client, not a second device
+MAX_SUBSCRIBERS = 8
+
+# Comment sent on idle streams so proxies keep them open
+KEEPALIVE_SECONDS = 15.0
+
+# Client reconnect delay sent with the first event, in milliseconds
+RETRY_MS = 3000
+
+RESYNC = b"event: resync\ndata: {}\n\n"
+
+# Seconds between polls for events published by other workers
+RELAY_INTERVAL = 0.2
+
+# Events that end a session's streams rather than patch its pages
+END_EVENTS = ("finished", "discarded")
+
+logger = logging.getLogger(__name__)
+
+
+def encode_event(name, data):
+    """One server-sent event as bytes."""
+    payload = json.dumps(data, separators=(",", ":"))
+    return f"event: {name}\ndata: {payload}\n\n".encode()
+
+
+@dataclass(slots=True, eq=False)
+class Subscriber:
+    session_id: int
+    client_id: str | None
+    queue: asyncio.Queue = field(
+        default_factory=lambda: asyncio.Queue(maxsize=QUEUE_SIZE)
+    )
+    # Set once the stream should end after what is queued
+    closing: bool = False
+
+    def send(self, event):
+        """Queue an encoded event; on overflow, replace the backlog with a resync."""
+        if self.closing:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.close(RESYNC)
+
+    def close(self, last_event=None):
+        """End the stream: drop the backlog and queue last_event, if any."""
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        if last_event is not None:
+            self.queue.put_nowait(last_event)
+        self.queue.put_nowait(None)
+        self.closing = True
+
+
+class SessionHub:
+    """In-process pub/sub of session changes, keyed by session id."""
+
+    def __init__(self):
+        self._subscribers = {}
+        self.published = 0
+        self.dropped = 0
+
+    def __len__(self):
+        return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def subscribe(self, session_id, client_id=None):
+        """
+        New Subscriber for session_id, or None if the session has too many.
+
+        Events published with origin == client_id are not sent back to it.
+        """
+        subscribers = self._subscribers.setdefault(session_id, set())
+        if len(subscribers) >= MAX_SUBSCRIBERS:
+            return None
+        subscriber = Subscriber(session_id, client_id)
+        subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        subscribers = self._subscribers.get(subscriber.session_id)
+        if subscribers is None:
+            return
+        subscribers.discard(subscriber)
+        if not subscribers:
+            del self._subscribers[subscriber.session_id]
+
+    def publish(self, session_id, name, data, origin=None):
+        """Send an event to the session's subscribers, except the origin client."""
+        subscribers = self._subscribers.get(session_id)
+        if not subscribers:
+            return
+        event = encode_event(name, data)
+        self.published += 1
+        for subscriber in subscribers:
+            if subscriber.closing or (
+                origin is not None and subscriber.client_id == origin
+            ):
+                continue
+            subscriber.send(event)
+            if subscriber.closing:
+                self.dropped += 1
+
+    def end_session(self, session_id, name, data):
+        """Send a final event to every subscriber and end their streams."""
+        event = encode_event(name, data)
+        for subscriber in self._subscribers.pop(session_id, ()):
+            subscriber.close(event)
+
+    def close(self):
+        """End every stream, e.g. at shutdown."""
+        for session_id in list(self._subscribers):
+            for subscriber in self._subscribers.pop(session_id):
+                subscriber.close()
+
+
+class LiveRelay:
+    """
+    Relays session events between worker processes through live_event.
+
+    record() adds an event to the caller's write transaction; the relay of
+    every other worker picks it up within RELAY_INTERVAL and hands it to its
+    own hub. Events from this process are skipped: its hub already has them.
+    """
+
+    def __init__(self, hub, pool, interval=RELAY_INTERVAL):
+        self.hub = hub
+        self.pool = pool
+        self.interval = interval
+        self.worker = os.getpid()
+        self.relayed = 0
+        self._last_id = 0
+        self._task = None
+
+    async def start(self):
+        """Skip events recorded before this worker started, then poll."""
+        async with self.pool.reader() as db:
+            cursor = await db.execute("SELECT COALESCE(MAX(id), 0) FROM live_event")
+            self._last_id = (await cursor.fetchone())[0]
+        self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def record(self, db, session_id, name, data, origin=None):
+        """Queue an event for the other workers. Does not commit."""
+        await db.execute(
+            """INSERT INTO live_event (session_id, name, data, origin, worker)
+               VALUES (?, ?, ?, ?, ?)""",
+            (
+                session_id,
+                name,
+                json.dumps(data, separators=(",", ":")),
+                origin,
+                self.worker,
+            ),
+        )
+
+    async def poll(self):
+        """Hand events other workers recorded since the last poll to the hub."""
+        async with self.pool.reader() as db:
+            cursor = await db.execute(
+                """SELECT id, session_id, name, data, origin, worker FROM live_event
+                   WHERE id > ? ORDER BY id""",
+                (self._last_id,),
+            )
+            rows = await cursor.fetchall()
+        for row in rows:
+            self._last_id = row["id"]
+            if row["worker"] == self.worker:
+                continue
+            data = json.loads(row["data"])
+            if row["name"] in END_EVENTS:
+                self.hub.end_session(row["session_id"], row["name"], data)
+            else:
+                self.hub.publish(row["session_id"], row["name"], data, row["origin"])
+            self.relayed += 1
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.poll()
+            except Exception:
+                logger.exception("Polling live events failed")
+
+
+def get_live_relay(request: Request):
+    """FastAPI dependency returning the app's LiveRelay, None with one worker."""
+    return request.app.state.relay
+
+
+async def stream_events(hub, subscriber, keepalive=KEEPALIVE_SECONDS):
+    """Async generator of the subscriber's events as SSE bytes, until closed."""
+    try:
+        yield f"retry: {RETRY_MS}\n\n".encode()
+        while True:
+            try:
+                event = await asyncio.wait_for(subscriber.queue.get(), keepalive)
+            except TimeoutError:
+                yield b": keepalive\n\n"
+                continue
+            if event is None:
+                return
+            yield event
+    finally:
+        hub.unsubscribe(subscriber)
+
+
+def get_session_hub(request: Request):
+    """FastAPI dependency returning the app's session hub."""
+    return request.app.state.live
@@ -0,0 +1,14 @@
+"""
+Set-based loaders that build page view models in a fixed number of queries.
+"""
+
+from .history import load_history_page, load_history_series
+from .session import load_card_view, load_previous_view, load_session_view
+
+__all__ = [
+    "load_card_view",
+    "load_history_page",
+    "load_history_series",
+    "load_previous_view",
+    "load_session_view",
+]
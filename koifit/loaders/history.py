@@ -0,0 +1,107 @@
+"""
+Slot history loader: keyset-paginated sessions and downsampled chart series.
+
+Everything reads session_exercise_summary, so the cost depends on the page
+size and requested point count, not on how many years of history exist.
+"""
+
+import json
+from datetime import date
+
+from koifit.downsample import lttb
+
+MAX_PAGE_SIZE = 200
+
+
+def encode_cursor(row):
+    """Cursor pointing just past row in newest-first order."""
+    return f"{row['date']}.{row['session_id']}"
+
+
+def decode_cursor(cursor):
+    """Parse a cursor into (date, session_id); raises ValueError if malformed."""
+    day, _, session_id = cursor.partition(".")
+    return date.fromisoformat(day).isoformat(), int(session_id)
+
+
+def _range_filter(start, end):
+    """SQL conditions and params restricting summaries to [start, end]."""
+    conditions = []
+    params = []
+    if start is not None:
+        conditions.append("sm.date >= ?")
+        params.append(start.isoformat())
+    if end is not None:
+        conditions.append("sm.date <= ?")
+        params.append(end.isoformat())
+    return "".join(f" AND {c}" for c in conditions), params
+
+
+async def load_history_page(db, slot_id, start=None, end=None, after=None, limit=50):
+    """
+    Return (sessions, next_cursor) for a slot, newest first.
+
+    after is the next_cursor returned for the previous page; next_cursor is
+    None on the last page.
+    """
+    where, params = _range_filter(start, end)
+    if after is not None:
+        # Row-value comparison keeps the keyset walk on idx_summary_slot_date
+        where += " AND (sm.date, sm.session_id) < (?, ?)"
+        params.extend(decode_cursor(after))
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+
+    cursor = await db.execute(
+        f"""SELECT sm.session_id, sm.date, se.effort_tag, se.next_time_note,
+                   sm.best_1rm, sm.volume, sm.sets_json
+            FROM session_exercise_summary sm
+            JOIN session_exercise se ON se.id = sm.session_exercise_id
+            WHERE sm.slot_id = ?{where}
+            ORDER BY sm.date DESC, sm.session_id DESC
+            LIMIT ?""",
+        (slot_id, *params, limit + 1),
+    )
+    rows = await cursor.fetchall()
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    sessions = [
+        {
+            "session_id": row["session_id"],
+            "date": row["date"],
+            "effort_tag": row["effort_tag"],
+            "next_time_note": row["next_time_note"],
+            "sets": json.loads(row["sets_json"]),
+            "best_1rm": row["best_1rm"],
+            "volume": row["volume"],
+        }
+        for row in rows[:limit]
+    ]
+    return sessions, next_cursor
+
+
+async def load_history_series(db, slot_id, points, start=None, end=None):
+    """
+    Return {"1rm": [...], "volume": [...]} chart series, oldest first.
+
+    Each series is downsampled with LTTB to at most points entries, so
+    peaks survive while the payload stays bounded.
+    """
+    where, params = _range_filter(start, end)
+    cursor = await db.execute(
+        f"""SELECT sm.session_id, sm.date, sm.best_1rm, sm.volume
+            FROM session_exercise_summary sm
+            WHERE sm.slot_id = ?{where}
+            ORDER BY sm.date ASC, sm.session_id ASC""",
+        (slot_id, *params),
+    )
+    rows = await cursor.fetchall()
+    series = {}
+    for metric, column in (("1rm", "best_1rm"), ("volume", "volume")):
+        raw = [
+            (date.fromisoformat(row["date"]).toordinal(), row[column], row)
+            for row in rows
+        ]
+        series[metric] = [
+            {"session_id": row["session_id"], "date": row["date"], "value": value}
+            for _, value, row in lttb(raw, points)
+        ]
+    return series
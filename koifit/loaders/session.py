@@ -0,0 +1,260 @@
+"""
+Session page loader.
+
+Builds the whole session view model with a constant number of queries,
+independent of how many slots the day has or how much history exists.
+Day and slot metadata come from the in-memory program catalog. Rows are
+only written on the first load of a session.
+"""
+
+from koifit.users import DEFAULT_USER_ID
+
+
+async def _ensure_session_exercises(db, session_id, day_id):
+    """Create any missing session_exercise rows for the day in one statement."""
+    cursor = await db.execute(
+        """INSERT INTO session_exercise (session_id, slot_id, exercise_id, dropset_done)
+           SELECT ?, sl.id, sl.preferred_exercise_id, 0
+           FROM slot sl
+           WHERE sl.day_id = ?
+             AND NOT EXISTS (
+                 SELECT 1 FROM session_exercise se
+                 WHERE se.session_id = ? AND se.slot_id = sl.id
+             )""",
+        (session_id, day_id, session_id),
+    )
+    if cursor.rowcount:
+        await db.commit()
+
+
+async def _load_current(db, session_id, slot_id=None):
+    """
+    Return {slot_id: session_exercise dict with sets} for the session.
+
+    With slot_id, only that slot's session_exercise is read.
+    """
+    slot_filter = "" if slot_id is None else "AND se.slot_id = ?"
+    params = (session_id,) if slot_id is None else (session_id, slot_id)
+    cursor = await db.execute(
+        f"""SELECT se.id, se.slot_id, se.effort_tag, se.next_time_note, se.dropset_done,
+                  se.fields_revision, st.set_number, st.weight_kg, st.reps,
+                  st.is_done, st.is_drop, st.revision
+           FROM session_exercise se
+           LEFT JOIN set_entry st ON st.session_exercise_id = se.id
+           WHERE se.session_id = ? {slot_filter}
+           ORDER BY se.slot_id, se.id, st.set_number""",
+        params,
+    )
+    current = {}
+    for row in await cursor.fetchall():
+        se = current.get(row["slot_id"])
+        if se is None:
+            se = current[row["slot_id"]] = {
+                "id": row["id"],
+                "effort_tag": row["effort_tag"],
+                "next_time_note": row["next_time_note"],
+                "dropset_done": row["dropset_done"],
+                "fields_revision": row["fields_revision"],
+                "sets": [],
+            }
+        elif se["id"] != row["id"]:
+            # Duplicate session_exercise for the slot; the first one wins
+            continue
+        if row["set_number"] is not None:
+            se["sets"].append(
+                {
+                    "set_number": row["set_number"],
+                    "weight_kg": row["weight_kg"],
+                    "reps": row["reps"],
+                    "is_done": row["is_done"],
+                    "is_drop": row["is_drop"],
+                    "revision": row["revision"],
+                }
+            )
+    return current
+
+
+async def _load_previous(db, day_id, slot_id=None):
+    """
+    Return {slot_id: previous dict} from the latest finished session per slot.
+
+    Each also carries the slot's stored progression target, if any. With
+    slot_id, only that slot of the day is looked up.
+    """
+    slot_filter = "" if slot_id is None else "AND sl.id = ?"
+    params = (day_id,) if slot_id is None else (day_id, slot_id)
+    # Walking the day's finished sessions newest-first through
+    # idx_session_finished_day_date stops at the first match, so the cost does
+    # not grow with history length.
+    cursor = await db.execute(
+        f"""WITH latest AS (
+               SELECT sl.id AS slot_id, sl.ordinal,
+                      (SELECT se.id
+                       FROM session s
+                       JOIN session_exercise se ON se.session_id = s.id
+                       WHERE s.day_id = sl.day_id AND s.is_finished = 1
+                         AND se.slot_id = sl.id
+                         AND se.exercise_id = sl.preferred_exercise_id
+                       ORDER BY s.date DESC, s.id DESC
+                       LIMIT 1) AS prev_se_id
+               FROM slot sl
+               WHERE sl.day_id = ? {slot_filter}
+           )
+           SELECT l.slot_id, ps.date, se.next_time_note, se.effort_tag,
+                  pt.weight_kg AS target_kg, pt.reps AS target_reps,
+                  pt.reason AS target_reason,
+                  st.set_number, st.weight_kg, st.reps
+           FROM latest l
+           JOIN session_exercise se ON se.id = l.prev_se_id
+           JOIN session ps ON ps.id = se.session_id
+           LEFT JOIN progression_target pt
+             ON pt.slot_id = l.slot_id AND pt.exercise_id = se.exercise_id
+           LEFT JOIN set_entry st
+             ON st.session_exercise_id = se.id AND st.is_drop = 0
+           ORDER BY l.ordinal, st.set_number""",
+        params,
+    )
+    previous = {}
+    for row in await cursor.fetchall():
+        prev = previous.get(row["slot_id"])
+        if prev is None:
+            prev = previous[row["slot_id"]] = {
+                "date": row["date"],
+                "next_time_note": row["next_time_note"],
+                "effort_tag": row["effort_tag"],
+                "target": None,
+                "sets": [],
+            }
+            if row["target_kg"] is not None:
+                prev["target"] = {
+                    "weight_kg": row["target_kg"],
+                    "reps": row["target_reps"],
+                    "reason": row["target_reason"],
+                }
+        if row["set_number"] is not None:
+            prev["sets"].append(
+                {
+                    "set_number": row["set_number"],
+                    "weight_kg": row["weight_kg"],
+                    "reps": row["reps"],
+                }
+            )
+    return previous
+
+
+async def load_session_view(
+    db, session_id, catalog, writer=None, user_id=DEFAULT_USER_ID
+):
+    """
+    Load the session page view model.
+
+    Returns None if the session does not exist or belongs to another user.
+    Missing session_exercise rows are created on the way, so the page always
+    has one per slot. If db is a read-only connection, pass writer: a
+    callable returning an async context manager that yields a writable
+    connection (DatabasePool.writer).
+    """
+    cursor = await db.execute(
+        "SELECT id, day_id, date FROM session WHERE id = ? AND user_id = ?",
+        (session_id, user_id),
+    )
+    session = await cursor.fetchone()
+    if not session:
+        return None
+
+    day = catalog.day(session["day_id"])
+    slots = catalog.slots_for_day(session["day_id"])
+
+    current = await _load_current(db, session["id"])
+    if any(slot.id not in current for slot in slots):
+        if writer is None:
+            await _ensure_session_exercises(db, session["id"], session["day_id"])
+        else:
+            async with writer() as write_db:
+                await _ensure_session_exercises(
+                    write_db, session["id"], session["day_id"]
+                )
+        current = await _load_current(db, session["id"])
+    previous = await _load_previous(db, session["day_id"])
+
+    session_exercises = []
+    for slot in slots:
+        se = current.get(slot.id)
+        if se is None:
+            # Slot removed from the program since the catalog was loaded
+            continue
+        session_exercises.append(_card(slot, se, previous.get(slot.id)))
+
+    return {
+        "session": {"id": session["id"], "date": session["date"]},
+        "day": {"id": session["day_id"], "label": day.label if day else "Workout"},
+        "session_exercises": session_exercises,
+    }
+
+
+def _card(slot, se, previous):
+    """View model of one exercise card."""
+    return {
+        "id": se["id"],
+        "slot": slot,
+        "effort_tag": se["effort_tag"],
+        "next_time_note": se["next_time_note"],
+        "dropset_done": se["dropset_done"],
+        "fields_revision": se["fields_revision"],
+        "sets": se["sets"],
+        "previous": previous,
+    }
+
+
+async def load_card_view(
+    db, session_id, session_exercise_id, catalog, user_id=DEFAULT_USER_ID
+):
+    """
+    Load a single exercise card of a session, for the card fragment.
+
+    Reads only the card's slot, in a fixed number of queries. Returns None
+    if the session_exercise is not part of the user's session or its slot
+    is no longer in the program.
+    """
+    row = await _find_session_exercise(db, session_id, session_exercise_id, user_id)
+    slot = catalog.slot(row["slot_id"]) if row else None
+    if slot is None:
+        return None
+
+    current = await _load_current(db, row["session_id"], slot.id)
+    se = current.get(slot.id)
+    if se is None or se["id"] != int(session_exercise_id):
+        # A duplicate session_exercise the page never shows
+        return None
+    previous = await _load_previous(db, row["day_id"], slot.id)
+    return {
+        "session": {"id": row["session_id"]},
+        "se": _card(slot, se, previous.get(slot.id)),
+    }
+
+
+async def load_previous_view(
+    db, session_id, session_exercise_id, user_id=DEFAULT_USER_ID
+):
+    """
+    Load the "last time" panel of an exercise card: the slot's latest
+    finished session. Returns None if the session_exercise is not part of
+    the user's session; "previous" is None if the slot was never done.
+    """
+    row = await _find_session_exercise(db, session_id, session_exercise_id, user_id)
+    if not row:
+        return None
+    previous = await _load_previous(db, row["day_id"], row["slot_id"])
+    return {"previous": previous.get(row["slot_id"])}
+
+
+async def _find_session_exercise(db, session_id, session_exercise_id, user_id):
+    """The session_exercise's session id, day id and slot id, or None."""
+    cursor = await db.execute(
+        """SELECT s.id AS session_id, s.day_id, se.slot_id
+           FROM session s
+           JOIN session_exercise se ON se.session_id = s.id
+           WHERE s.id = ? AND s.user_id = ? AND se.id = ?""",
+        (session_id, user_id, session_exercise_id),
+    )
+    return await cursor.fetchone()
@@ -0,0 +1,173 @@
+"""
+Background maintenance: expire old rows, sweep orphans and vacuum.
+
+Starting or discarding a workout deletes the session with its exercises
+and sets in one transaction. The sweep is a safety net for rows orphaned
+some other way, e.g. by hand edits; it runs in small chunks, each holding
+the writer lock briefly so autosaves are never held up for long.
+"""
+
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Save receipts only need to outlive client retries
+RECEIPT_TTL = "-7 days"
+
+# Relayed live events only need to outlive the workers' polls
+LIVE_EVENT_TTL = "-5 minutes"
+
+# Table -> (key, condition for deleting a row), in dependency order:
+# set_entry and summaries are orphaned by the session_exercise sweep that
+# runs before them
+ORPHAN_SWEEPS = {
+    "session_exercise": (
+        "id",
+        "NOT EXISTS (SELECT 1 FROM session s WHERE s.id = session_exercise.session_id)",
+    ),
+    "set_entry": (
+        "id",
+        """NOT EXISTS (SELECT 1 FROM session_exercise se
+                       WHERE se.id = set_entry.session_exercise_id)""",
+    ),
+    "session_exercise_summary": (
+        "session_exercise_id",
+        """NOT EXISTS (SELECT 1 FROM session_exercise se
+                       WHERE se.id = session_exercise_summary.session_exercise_id)""",
+    ),
+    "save_receipt": (
+        "rowid",
+        f"""created_at < datetime('now', '{RECEIPT_TTL}')
+            OR NOT EXISTS (SELECT 1 FROM session s WHERE s.id = save_receipt.session_id)""",
+    ),
+    "live_event": ("id", f"created_at < datetime('now', '{LIVE_EVENT_TTL}')"),
+}
+
+# Pages returned to the filesystem per run; the rest waits for the next one
+VACUUM_PAGES = 2000
+
+
+async def _sweep_chunk(db, table, last_key, chunk_size):
+    """
+    Delete the orphans among the chunk_size rows after last_key and commit.
+
+    Returns (rows deleted, last key examined), or None past the last row.
+    """
+    key, condition = ORPHAN_SWEEPS[table]
+    cursor = await db.execute(
+        f"""SELECT MAX({key}) FROM (
+               SELECT {key} FROM {table} WHERE {key} > ? ORDER BY {key} LIMIT ?)""",
+        (last_key, chunk_size),
+    )
+    end_key = (await cursor.fetchone())[0]
+    if end_key is None:
+        return None
+    cursor = await db.execute(
+        f"DELETE FROM {table} WHERE {key} > ? AND {key} <= ? AND ({condition})",
+        (last_key, end_key),
+    )
+    await db.commit()
+    return cursor.rowcount, end_key
+
+
+async def sweep_orphans(pool, chunk_size=500):
+    """
+    Delete orphaned and expired rows; returns {table: rows deleted}.
+
+    Each table is walked in key order, chunk_size rows per writer hold, so
+    a chunk costs the same however long the history grows.
+    """
+    deleted = {}
+    for table in ORPHAN_SWEEPS:
+        total = 0
+        last_key = 0
+        while True:
+            async with pool.writer() as db:
+                chunk = await _sweep_chunk(db, table, last_key, chunk_size)
+            if chunk is None:
+                break
+            total += chunk[0]
+            last_key = chunk[1]
+            # Let queued writers in between chunks
+            await asyncio.sleep(0)
+        deleted[table] = total
+    return deleted
+
+
+async def incremental_vacuum(pool, pages=VACUUM_PAGES):
+    """
+    Return up to pages free pages to the filesystem.
+
+    Returns the number of pages reclaimed, or None if the database was not
+    created with auto_vacuum = INCREMENTAL.
+    """
+    async with pool.writer() as db:
+        cursor = await db.execute("PRAGMA auto_vacuum")
+        if (await cursor.fetchone())[0] != 2:
+            return None
+        cursor = await db.execute("PRAGMA freelist_count")
+        before = (await cursor.fetchone())[0]
+        # Each step frees one page, so the cursor must be drained
+        cursor = await db.execute(f"PRAGMA incremental_vacuum({int(pages)})")
+        await cursor.fetchall()
+        cursor = await db.execute("PRAGMA freelist_count")
+        return before - (await cursor.fetchone())[0]
+
+
+async def run_maintenance(pool):
+    """Sweep orphans, then vacuum; returns and logs a timing report."""
+    started = time.perf_counter()
+    deleted = await sweep_orphans(pool)
+    swept = time.perf_counter()
+    reclaimed = await incremental_vacuum(pool)
+    finished = time.perf_counter()
+    report = {
+        "deleted": deleted,
+        "pages_reclaimed": reclaimed,
+        "sweep_ms": round((swept - started) * 1000, 1),
+        "vacuum_ms": round((finished - swept) * 1000, 1),
+    }
+    logger.info(
+        "Maintenance swept %d rows in %.1f ms, reclaimed %s pages in %.1f ms",
+        sum(deleted.values()),
+        report["sweep_ms"],
+        reclaimed,
+        report["vacuum_ms"],
+    )
+    return report
+
+
+class MaintenanceTask:
+    """Runs run_maintenance every interval seconds."""
+
+    def __init__(self, pool, interval):
+        self.pool = pool
+        self.interval = interval
+        self.last_report = None
+        self._task = None
+
+    def start(self):
+        """Start the background loop; a zero interval disables it."""
+        if self.interval > 0:
+            self._task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        """Cancel the loop and wait for it to exit."""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _loop(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                self.last_report = await run_maintenance(self.pool)
+            except Exception:
+                logger.exception("Maintenance run failed")
@@ -0,0 +1,141 @@
+"""
+Process-wide counters exposed at /metrics in the Prometheus text format.
+
+Kept dependency-free: a handful of counters and one latency histogram per
+route are all the app needs.
+"""
+
+from collections import defaultdict
+
+# Request latency histogram buckets, in seconds
+DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels):
+    inner = ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items())
+    return f"{{{inner}}}"
+
+
+def _sample(name, kind, help_text, value):
+    formatted = f"{value:.6f}" if isinstance(value, float) else str(value)
+    return [
+        f"# HELP {name} {help_text}",
+        f"# TYPE {name} {kind}",
+        f"{name} {formatted}",
+    ]
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense."""
+
+    __slots__ = ("count", "counts", "sum")
+
+    def __init__(self):
+        self.counts = [0] * len(DURATION_BUCKETS)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(DURATION_BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+class Metrics:
+    """Request, SQL and commit totals since the process started."""
+
+    def __init__(self, slow_query_ms=None):
+        self.slow_query_seconds = (
+            slow_query_ms / 1000 if slow_query_ms is not None else None
+        )
+        self.requests = defaultdict(int)
+        self.durations = defaultdict(Histogram)
+        self.statements = 0
+        self.sql_seconds = 0.0
+        self.commits = 0
+        self.commit_seconds = 0.0
+        self.slow_queries = 0
+
+    def observe_request(self, method, route, status, seconds):
+        self.requests[(method, route, status)] += 1
+        self.durations[route].observe(seconds)
+
+    def observe_statement(self, seconds, new_statement=True):
+        self.statements += new_statement
+        self.sql_seconds += seconds
+
+    def observe_commit(self, seconds):
+        self.commits += 1
+        self.commit_seconds += seconds
+
+    def render(self, gauges=()):
+        """
+        Prometheus text exposition.
+
+        gauges are extra (name, help, value) samples read at scrape time,
+        such as the pool's data version.
+        """
+        lines = [
+            "# HELP koifit_http_requests_total HTTP requests by route and status.",
+            "# TYPE koifit_http_requests_total counter",
+        ]
+        for (method, route, status), count in sorted(self.requests.items()):
+            labels = _labels(method=method, route=route, status=status)
+            lines.append(f"koifit_http_requests_total{labels} {count}")
+
+        lines += [
+            "# HELP koifit_http_request_duration_seconds Request latency by route.",
+            "# TYPE koifit_http_request_duration_seconds histogram",
+        ]
+        for route, histogram in sorted(self.durations.items()):
+            for bound, count in zip(DURATION_BUCKETS, histogram.counts):
+                labels = _labels(route=route, le=bound)
+                lines.append(
+                    f"koifit_http_request_duration_seconds_bucket{labels} {count}"
+                )
+            labels = _labels(route=route, le="+Inf")
+            lines.append(
+                f"koifit_http_request_duration_seconds_bucket{labels} {histogram.count}"
+            )
+            labels = _labels(route=route)
+            lines.append(
+                f"koifit_http_request_duration_seconds_sum{labels} {histogram.sum:.6f}"
+            )
+            lines.append(
+                f"koifit_http_request_duration_seconds_count{labels} {histogram.count}"
+            )
+
+        counters = (
+            (
+                "koifit_sql_statements_total",
+                "SQL statements executed.",
+                self.statements,
+            ),
+            (
+                "koifit_sql_seconds_total",
+                "Time executing and fetching SQL.",
+                self.sql_seconds,
+            ),
+            ("koifit_sql_commits_total", "Transactions committed.", self.commits),
+            (
+                "koifit_sql_commit_seconds_total",
+                "Time committing.",
+                self.commit_seconds,
+            ),
+            (
+                "koifit_sql_slow_queries_total",
+                "Statements over SLOW_QUERY_MS.",
+                self.slow_queries,
+            ),
+        )
+        for name, help_text, value in counters:
+            lines += _sample(name, "counter", help_text, value)
+        for name, help_text, value in gauges:
+            lines += _sample(name, "gauge", help_text, value)
+        return "\n".join(lines) + "\n"
@@ -6,27 +6,70 @@ from pydantic import BaseModel
 
 
 class SetEntryInput(BaseModel):
-    """Set entry input for auto-save."""
+    """
+    Set entry input for auto-save.
+
+    revision is the set's revision the client last saw; None skips the
+    conflict check and the set is overwritten.
+    """
 
     set_number: int
     weight_kg: float
     reps: int
     is_done: int
+    revision: int | None = None
 
 
 class SaveExerciseRequest(BaseModel):
-    """Request body for saving exercise data."""
+    """
+    Request body for saving exercise data: only the fields and sets that changed.
+
+    fields_revision is the revision of notes, effort tag and dropset the
+    client last saw; None skips the conflict check.
+    """
 
     notes: str | None = None
     effort_tag: str | None = None
     dropset_done: int | None = None
+    fields_revision: int | None = None
     sets: list[SetEntryInput] | None = None
 
 
+class ExerciseChanges(SaveExerciseRequest):
+    """Pending changes for one session exercise inside a batch save."""
+
+    session_exercise_id: int
+
+
+class SaveSessionRequest(BaseModel):
+    """Request body for saving several exercises of a session at once."""
+
+    exercises: list[ExerciseChanges]
+
+
+class SaveSessionResponse(BaseModel):
+    """
+    Response for the batch save endpoint.
+
+    revisions maps every saved session_exercise to its revision after the
+    save. conflicts holds the stored fields and sets, with their revisions,
+    that were not written because they changed since the revision the
+    client sent; status is then "conflict". status is "finished", and
+    nothing is written, when the session was already finished.
+    """
+
+    status: str
+    saved: int
+    revisions: dict[int, int] = {}
+    conflicts: list[ExerciseChanges] = []
+
+
 class SaveExerciseResponse(BaseModel):
-    """Response for save exercise endpoint."""
+    """Response for save exercise endpoint; see SaveSessionResponse."""
 
     status: str
+    revision: int | None = None
+    conflict: ExerciseChanges | None = None
 
 
 class FinishSessionResponse(BaseModel):
@@ -34,3 +77,96 @@ class FinishSessionResponse(BaseModel):
 
     status: str
     redirect: str
+
+
+class HistorySet(BaseModel):
+    """A done set shown in slot history."""
+
+    set_number: int
+    weight_kg: float
+    reps: int
+    is_drop: bool
+
+
+class HistorySession(BaseModel):
+    """One finished session of a slot."""
+
+    session_id: int
+    date: str
+    effort_tag: str | None
+    next_time_note: str | None
+    sets: list[HistorySet]
+    best_1rm: float
+    volume: float
+
+
+class SeriesPoint(BaseModel):
+    """A chart point tied to the session it came from."""
+
+    session_id: int
+    date: str
+    value: float
+
+
+class SlotHistoryResponse(BaseModel):
+    """Response for the slot history JSON endpoint."""
+
+    slot_id: int
+    title: str
+    sessions: list[HistorySession]
+    next_cursor: str | None
+    series: dict[str, list[SeriesPoint]] | None = None
+
+
+class RepRangeBest(BaseModel):
+    """Heaviest set of an exercise within a rep range."""
+
+    rep_range: str
+    weight_kg: float
+    reps: int
+    week: str
+
+
+class ExerciseAnalytics(BaseModel):
+    """Weekly series and bests of one exercise, oldest week first."""
+
+    exercise_id: int
+    name: str
+    weekly_volume: list[float]
+    best_e1rm: list[float]
+    rolling_e1rm: list[float]
+    acwr: float | None
+    bests: list[RepRangeBest]
+
+
+class SlotAnalytics(BaseModel):
+    """Weekly volume of one program slot, oldest week first."""
+
+    slot_id: int
+    title: str
+    weekly_volume: list[float]
+
+
+class PersonalRecord(BaseModel):
+    """A set heavier than every earlier one in its rep range."""
+
+    exercise_id: int
+    name: str
+    rep_range: str
+    weight_kg: float
+    reps: int
+    previous_kg: float
+    week: str
+
+
+class AnalyticsResponse(BaseModel):
+    """Response for the analytics JSON endpoint; weeks are their Mondays."""
+
+    set_count: int
+    session_count: int
+    weeks: list[str]
+    total_volume: list[float]
+    acwr: list[float | None]
+    exercises: list[ExerciseAnalytics]
+    slots: list[SlotAnalytics]
+    prs: list[PersonalRecord]
@@ -0,0 +1,159 @@
+"""
+Next-session targets: suggested weight and reps per slot.
+
+Targets are computed when a session is finished, from its done working
+sets, the effort tag, the slot's rep target and the exercise's
+min_increment, and stored one row per slot in progression_target. The
+session page reads them with the previous sets instead of re-deriving
+them from history on every load.
+"""
+
+REPLACE_TARGET_SQL = """INSERT OR REPLACE INTO progression_target
+       (slot_id, exercise_id, session_id, weight_kg, reps, reason)
+       VALUES (?, ?, ?, ?, ?, ?)"""
+
+# Done working sets with everything a target depends on, grouped by
+# session_exercise in set order
+TARGET_SETS_SQL = """SELECT se.id AS se_id, se.session_id, se.slot_id, se.exercise_id,
+          se.effort_tag, sl.rep_target, sl.rpe_range, e.min_increment,
+          st.weight_kg, st.reps
+   FROM session_exercise se
+   JOIN slot sl ON sl.id = se.slot_id
+   JOIN exercise e ON e.id = se.exercise_id
+   JOIN set_entry st ON st.session_exercise_id = se.id
+   WHERE st.is_done = 1 AND st.is_drop = 0 AND {where}
+   ORDER BY se.slot_id, se.id, st.set_number"""
+
+# Latest finished session_exercise with done sets of every slot's preferred
+# exercise: the one whose finish would have written the current target
+LATEST_PER_SLOT_SQL = """SELECT (SELECT se.id
+           FROM session s
+           JOIN session_exercise se ON se.session_id = s.id
+           WHERE s.day_id = sl.day_id AND s.is_finished = 1
+             AND se.slot_id = sl.id
+             AND se.exercise_id = sl.preferred_exercise_id
+             AND EXISTS (
+                 SELECT 1 FROM set_entry st
+                 WHERE st.session_exercise_id = se.id
+                   AND st.is_done = 1 AND st.is_drop = 0
+             )
+           ORDER BY s.date DESC, s.id DESC
+           LIMIT 1)
+   FROM slot sl"""
+
+
+def parse_rep_target(rep_target):
+    """'8-10' -> (8, 10), '12' -> (12, 12); None if unparseable."""
+    low, _, high = (rep_target or "").partition("-")
+    try:
+        low = int(low)
+        high = int(high) if high else low
+    except ValueError:
+        return None
+    return (low, high) if 0 < low <= high else None
+
+
+def _format_kg(weight):
+    return f"{weight:g} kg"
+
+
+def suggest_target(sets, effort_tag, rep_target, rpe_range, min_increment):
+    """
+    Suggested (weight_kg, reps, reason) for the next session, or None.
+
+    Double progression from the heaviest working weight: once every set at
+    it reaches the top of the rep range, add min_increment and restart at
+    the bottom; until then keep the weight and add a rep. An "increase" or
+    "decrease" effort tag overrides that with one increment up or down.
+    RPE is not logged per set, so the range only annotates the reason.
+    """
+    working = [s for s in sets if s["weight_kg"] > 0 and s["reps"] > 0]
+    reps_range = parse_rep_target(rep_target)
+    if not working or reps_range is None:
+        return None
+    low, high = reps_range
+    top = max(s["weight_kg"] for s in working)
+    reps_at_top = [s["reps"] for s in working if s["weight_kg"] == top]
+
+    if effort_tag == "increase":
+        weight, reps = top + min_increment, low
+        reason = f"Marked + last time: up {_format_kg(min_increment)}"
+    elif effort_tag == "decrease":
+        weight, reps = max(top - min_increment, 0.0), low
+        reason = f"Marked − last time: down {_format_kg(min_increment)}"
+    elif min(reps_at_top) >= high:
+        weight, reps = top + min_increment, low
+        reason = f"Hit {high} reps at {_format_kg(top)}: up {_format_kg(min_increment)}"
+    else:
+        weight, reps = top, min(max(max(reps_at_top) + 1, low), high)
+        reason = f"Same weight, aim for {reps} reps"
+    if rpe_range:
+        reason += f" at RPE {rpe_range}"
+    return round(weight, 2), reps, reason
+
+
+def _target_rows(rows):
+    """Group TARGET_SETS_SQL rows into REPLACE_TARGET_SQL parameter tuples."""
+    grouped = {}
+    for row in rows:
+        entry = grouped.get(row["se_id"])
+        if entry is None:
+            entry = grouped[row["se_id"]] = (row, [])
+        entry[1].append({"weight_kg": row["weight_kg"], "reps": row["reps"]})
+    params = []
+    for first, sets in grouped.values():
+        target = suggest_target(
+            sets,
+            first["effort_tag"],
+            first["rep_target"],
+            first["rpe_range"],
+            first["min_increment"],
+        )
+        if target is not None:
+            params.append(
+                (first["slot_id"], first["exercise_id"], first["session_id"], *target)
+            )
+    return params
+
+
+async def write_progression_targets(db, session_id):
+    """
+    Replace the targets of every slot trained in a session. Does not commit.
+
+    Call it in the same transaction that marks the session finished. Slots
+    without done sets keep their previous target.
+    """
+    cursor = await db.execute(
+        TARGET_SETS_SQL.format(where="se.session_id = ?"), (session_id,)
+    )
+    params = _target_rows(await cursor.fetchall())
+    if params:
+        await db.executemany(REPLACE_TARGET_SQL, params)
+
+
+async def rebuild_progression_targets(db, slot_ids=None):
+    """
+    Recompute slot targets from their latest finished session. Does not commit.
+
+    slot_ids limits the rebuild to those slots; None rebuilds every slot.
+    Returns the number of targets written.
+    """
+    if slot_ids is None:
+        await db.execute("DELETE FROM progression_target")
+        latest, args = LATEST_PER_SLOT_SQL, ()
+    else:
+        args = tuple(slot_ids)
+        if not args:
+            return 0
+        marks = ", ".join("?" * len(args))
+        await db.execute(
+            f"DELETE FROM progression_target WHERE slot_id IN ({marks})", args
+        )
+        latest = f"{LATEST_PER_SLOT_SQL} WHERE sl.id IN ({marks})"
+    cursor = await db.execute(
+        TARGET_SETS_SQL.format(where=f"se.id IN ({latest})"), args
+    )
+    params = _target_rows(await cursor.fetchall())
+    if params:
+        await db.executemany(REPLACE_TARGET_SQL, params)
+    return len(params)
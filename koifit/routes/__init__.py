@@ -1,5 +1,17 @@
+from .analytics import router as analytics_router
+from .assets import router as assets_router
 from .exercises import router as exercises_router
+from .export import router as export_router
 from .home import router as home_router
+from .program import router as program_router
 from .sessions import router as sessions_router
 
-__all__ = ["exercises_router", "home_router", "sessions_router"]
+__all__ = [
+    "analytics_router",
+    "assets_router",
+    "exercises_router",
+    "export_router",
+    "home_router",
+    "program_router",
+    "sessions_router",
+]
@@ -0,0 +1,62 @@
+"""
+Routes for the training analytics dashboard.
+"""
+
+from fastapi import APIRouter, Depends, Query, Request, Response
+from fastapi.responses import HTMLResponse
+
+from koifit.analytics import get_analytics_cache
+from koifit.catalog import get_catalog
+from koifit.http_cache import not_modified, page_validators
+from koifit.models import AnalyticsResponse
+from koifit.templates import templates
+from koifit.users import get_current_user
+
+router = APIRouter()
+
+
+@router.get("/analytics", response_class=HTMLResponse)
+async def analytics_page(
+    request: Request,
+    cache=Depends(get_analytics_cache),
+    catalog=Depends(get_catalog),
+    user=Depends(get_current_user),
+):
+    """Dashboard: current e1RM, workload ratio and recent PRs per exercise."""
+    headers = page_validators(request, "analytics", user.id)
+    cached = not_modified(request, headers)
+    if cached is not None:
+        return cached
+
+    analytics = await cache.get(request.app.state.pool.reader, user.id)
+    template = templates.get_template("pages/analytics.html")
+    return HTMLResponse(
+        await template.render_async(**analytics.report(catalog, weeks=4)),
+        headers=headers,
+    )
+
+
+@router.get("/analytics.json", response_model=AnalyticsResponse)
+async def analytics_json(
+    request: Request,
+    response: Response,
+    weeks: int = Query(12, ge=1, le=2000),
+    prs: int = Query(20, ge=0, le=500),
+    cache=Depends(get_analytics_cache),
+    catalog=Depends(get_catalog),
+    user=Depends(get_current_user),
+):
+    """
+    Whole-history analytics as JSON.
+
+    Series hold the latest weeks weeks, oldest first; prs limits the
+    recent personal records returned, newest first.
+    """
+    headers = page_validators(request, "analytics.json", user.id, request.url.query)
+    cached = not_modified(request, headers)
+    if cached is not None:
+        return cached
+    response.headers.update(headers)
+
+    analytics = await cache.get(request.app.state.pool.reader, user.id)
+    return analytics.report(catalog, weeks=weeks, pr_limit=prs)
@@ -0,0 +1,25 @@
+"""
+Routes for static assets.
+"""
+
+from fastapi import APIRouter, HTTPException, Request
+
+router = APIRouter()
+
+
+@router.api_route("/assets/{path:path}", methods=["GET", "HEAD"])
+async def asset(path: str, request: Request):
+    """Serve an asset by plain or fingerprinted path, precompressed if accepted."""
+    response = request.app.state.assets.response(request, path)
+    if response is None:
+        raise HTTPException(status_code=404, detail="Asset not found")
+    return response
+
+
+@router.get("/sw.js")
+async def service_worker(request: Request):
+    """Service worker with the app shell manifest, scoped to the whole site."""
+    assets = request.app.state.assets
+    if assets.service_worker is None:
+        raise HTTPException(status_code=404, detail="Asset not found")
+    return assets.serve(request, assets.service_worker)
@@ -2,82 +2,104 @@
 Routes for exercise history.
 """
 
-import json
+from datetime import date
 
-from fastapi import APIRouter, Request, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from fastapi.responses import HTMLResponse
 
+from koifit.catalog import get_catalog
+from koifit.db import get_reader
+from koifit.http_cache import not_modified, page_validators
+from koifit.loaders import load_history_page, load_history_series
+from koifit.models import SlotHistoryResponse
 from koifit.templates import templates
+from koifit.users import get_current_user
 
 router = APIRouter()
 
 
-@router.get("/slots/{slot_id}/history", response_class=HTMLResponse)
-async def slot_history(slot_id: int, request: Request):
-    """Slot history page with 1RM chart."""
-    db = request.app.state.db
-
-    cursor = await db.execute(
-        "SELECT id, title, preferred_exercise_id FROM slot WHERE id = ?", (slot_id,)
-    )
-    slot = await cursor.fetchone()
+def _get_slot(catalog, slot_id, user):
+    slot = catalog.slot(slot_id, user.id)
     if not slot:
         raise HTTPException(status_code=404, detail="Slot not found")
+    return slot
+
+
+@router.get("/slots/{slot_id}/history", response_class=HTMLResponse)
+async def slot_history(
+    slot_id: int,
+    request: Request,
+    db=Depends(get_reader),
+    catalog=Depends(get_catalog),
+    user=Depends(get_current_user),
+):
+    """Slot history page with 1RM chart; data is fetched from history.json."""
+    slot = _get_slot(catalog, slot_id, user)
+    headers = page_validators(request, "history", slot_id)
+    cached = not_modified(request, headers)
+    if cached is not None:
+        return cached
 
-    # Get all finished sessions for this slot, along with their sets
     cursor = await db.execute(
-        """SELECT s.id as session_id, s.date,
-                  se.id as se_id, se.effort_tag, se.next_time_note,
-                  st.set_number, st.weight_kg, st.reps, st.is_drop
-           FROM session_exercise se
-           JOIN session s ON se.session_id = s.id
-           JOIN set_entry st ON st.session_exercise_id = se.id
-           WHERE se.slot_id = ? AND s.is_finished = 1 AND st.is_done = 1
-           ORDER BY s.date ASC, s.id ASC, st.set_number ASC""",
+        "SELECT EXISTS (SELECT 1 FROM session_exercise_summary WHERE slot_id = ?)",
         (slot_id,),
     )
-    rows = await cursor.fetchall()
-
-    # Group by session and compute best Epley 1RM
-    sessions = {}
-    for row in rows:
-        sid = row["session_id"]
-        if sid not in sessions:
-            sessions[sid] = {
-                "session_id": sid,
-                "date": row["date"],
-                "effort_tag": row["effort_tag"],
-                "next_time_note": row["next_time_note"],
-                "sets": [],
-                "best_1rm": 0.0,
-                "volume": 0.0,
-            }
-        weight = row["weight_kg"]
-        reps = row["reps"]
-        is_drop = row["is_drop"]
-        sessions[sid]["sets"].append(
-            {
-                "set_number": row["set_number"],
-                "weight_kg": weight,
-                "reps": reps,
-                "is_drop": bool(is_drop),
-            }
-        )
-        # Epley 1RM from working sets only
-        if not is_drop and weight > 0:
-            estimated_1rm = weight * (1 + reps / 30.0)
-            if estimated_1rm > sessions[sid]["best_1rm"]:
-                sessions[sid]["best_1rm"] = round(estimated_1rm, 1)
-        # Total volume (working sets only)
-        if not is_drop and weight > 0:
-            sessions[sid]["volume"] = round(sessions[sid]["volume"] + weight * reps, 1)
-
-    history = list(sessions.values())
+    has_history = bool((await cursor.fetchone())[0])
 
     template = templates.get_template("pages/exercise_history.html")
     return HTMLResponse(
-        template.render(
-            slot_title=slot["title"],
-            history_json=json.dumps(history),
+        await template.render_async(
+            slot_id=slot.id,
+            slot_title=slot.title,
+            has_history=has_history,
+        ),
+        headers=headers,
+    )
+
+
+@router.get("/slots/{slot_id}/history.json", response_model=SlotHistoryResponse)
+async def slot_history_json(
+    slot_id: int,
+    request: Request,
+    response: Response,
+    start: date | None = None,
+    end: date | None = None,
+    after: str | None = None,
+    limit: int = Query(50, ge=1, le=200),
+    points: int | None = Query(None, ge=2, le=2000),
+    db=Depends(get_reader),
+    catalog=Depends(get_catalog),
+    user=Depends(get_current_user),
+):
+    """
+    Slot history as JSON, newest session first.
+
+    Filter with start/end dates, page with the returned next_cursor passed
+    back as after, and request points to include chart series downsampled
+    to at most that many points. Supports conditional GET like the page.
+    """
+    slot = _get_slot(catalog, slot_id, user)
+    headers = page_validators(request, "history.json", slot_id, request.url.query)
+    cached = not_modified(request, headers)
+    if cached is not None:
+        return cached
+    response.headers.update(headers)
+
+    try:
+        sessions, next_cursor = await load_history_page(
+            db, slot_id, start=start, end=end, after=after, limit=limit
         )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    series = None
+    if points is not None:
+        series = await load_history_series(db, slot_id, points, start=start, end=end)
+
+    return SlotHistoryResponse(
+        slot_id=slot.id,
+        title=slot.title,
+        sessions=sessions,
+        next_cursor=next_cursor,
+        series=series,
     )
@@ -0,0 +1,39 @@
+"""
+Routes for exporting training history.
+"""
+
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+
+from koifit.export import FORMATS, TABLE_COLUMNS, stream_export
+from koifit.users import get_current_user
+
+router = APIRouter()
+
+
+@router.get("/export/{name}.{fmt}")
+async def export_history(
+    name: str, fmt: str, request: Request, user=Depends(get_current_user)
+):
+    """
+    Stream the user's rows of one table as CSV or JSONL, or everything as
+    history.jsonl.
+
+    The body is produced chunk by chunk while it is sent, so memory use
+    does not depend on how much history there is.
+    """
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=404, detail="Unknown export format")
+    if name == "history" and fmt == "jsonl":
+        tables = list(TABLE_COLUMNS)
+    elif name in TABLE_COLUMNS:
+        tables = [name]
+    else:
+        raise HTTPException(status_code=404, detail="Unknown export")
+
+    pool = request.app.state.pool
+    return StreamingResponse(
+        stream_export(pool.reader, tables, fmt, user_id=user.id),
+        media_type=FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{name}.{fmt}"'},
+    )
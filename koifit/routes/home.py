@@ -2,53 +2,77 @@
 Routes for the home and day selection pages.
 """
 
-from fastapi import APIRouter, Request
+from fastapi import APIRouter, Depends, Request
 from fastapi.responses import HTMLResponse
 
+from koifit.catalog import get_catalog
+from koifit.db import get_reader
+from koifit.http_cache import not_modified, page_validators
 from koifit.templates import templates
+from koifit.users import get_current_user
 
 router = APIRouter()
 
 
+async def render_day_list(request: Request, catalog, user):
+    """The user's day list fragment, rendered once per program version."""
+
+    async def load_days():
+        return {"days": catalog.ordered_days(user.id)}
+
+    return await request.app.state.fragments.render(
+        "components/day_list.html", key=user.id, load_context=load_days
+    )
+
+
 @router.get("/", response_class=HTMLResponse)
-async def home(request: Request):
+async def home(
+    request: Request,
+    db=Depends(get_reader),
+    catalog=Depends(get_catalog),
+    user=Depends(get_current_user),
+):
     """Home page - shows resume option or day selection."""
-    db = request.app.state.db
     cursor = await db.execute(
-        "SELECT id, day_id FROM session WHERE is_finished = 0 LIMIT 1"
+        "SELECT id, day_id FROM session WHERE user_id = ? AND is_finished = 0 LIMIT 1",
+        (user.id,),
     )
     unfinished = await cursor.fetchone()
 
     template = templates.get_template("pages/index.html")
 
     if unfinished:
-        cursor = await db.execute(
-            "SELECT label FROM day WHERE id = ?", (unfinished["day_id"],)
-        )
-        day = await cursor.fetchone()
+        day = catalog.day(unfinished["day_id"])
         return HTMLResponse(
-            template.render(
+            await template.render_async(
                 has_unfinished_session=True,
                 session_id=unfinished["id"],
-                day_label=day["label"] if day else "Workout",
+                day_label=day.label if day else "Workout",
             )
         )
 
-    cursor = await db.execute("SELECT id, label, ordinal FROM day ORDER BY ordinal")
-    days = await cursor.fetchall()
     return HTMLResponse(
-        template.render(
+        await template.render_async(
             has_unfinished_session=False,
-            days=[dict(day) for day in days],
+            day_list=await render_day_list(request, catalog, user),
         )
     )
 
 
 @router.get("/days", response_class=HTMLResponse)
-async def days_page(request: Request):
-    """Day selection page."""
-    db = request.app.state.db
-    cursor = await db.execute("SELECT id, label, ordinal FROM day ORDER BY ordinal")
-    days = await cursor.fetchall()
+async def days_page(
+    request: Request, catalog=Depends(get_catalog), user=Depends(get_current_user)
+):
+    """Day selection page; revalidated with ETag/Last-Modified."""
+    headers = page_validators(request, "days", user.id)
+    cached = not_modified(request, headers)
+    if cached is not None:
+        return cached
+
     template = templates.get_template("pages/days.html")
-    return HTMLResponse(template.render(days=[dict(day) for day in days]))
+    return HTMLResponse(
+        await template.render_async(
+            day_list=await render_day_list(request, catalog, user)
+        ),
+        headers=headers,
+    )
@@ -0,0 +1,23 @@
+"""
+Routes for the in-memory program catalog.
+"""
+
+from fastapi import APIRouter, Depends, Request
+
+from koifit.catalog import get_catalog, reload_program
+from koifit.users import get_admin_user
+
+router = APIRouter()
+
+
+@router.get("/program/catalog")
+async def catalog_stats(user=Depends(get_admin_user), catalog=Depends(get_catalog)):
+    """Catalog size, program version and hit/miss/reload counters, for all users."""
+    return catalog.stats()
+
+
+@router.post("/program/reload")
+async def reload_catalog(request: Request, user=Depends(get_admin_user)):
+    """Reload every user's days, slots and exercises after editing the program."""
+    await reload_program(request.app)
+    return request.app.state.catalog.stats()
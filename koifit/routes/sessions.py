@@ -1,269 +1,340 @@
 """
-Routes for sessions: start, view, autosave, and finish.
+Routes for sessions: start, view, card fragments, autosave, live sync, and
+finish.
 """
 
 from datetime import date
 
-from fastapi import APIRouter, Request, HTTPException
-from fastapi.responses import HTMLResponse, RedirectResponse
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.responses import (
+    HTMLResponse,
+    JSONResponse,
+    RedirectResponse,
+    StreamingResponse,
+)
 
+from koifit.autosave import merge_changes, save_session_changes
+from koifit.catalog import get_catalog
+from koifit.db import get_reader, get_writer
+from koifit.db.setup import bump_version
+from koifit.live import get_live_relay, get_session_hub, stream_events
+from koifit.loaders import load_card_view, load_previous_view, load_session_view
 from koifit.templates import templates
+from koifit.summaries import write_session_summaries
+from koifit.progression import write_progression_targets
+from koifit.users import get_current_user
 from koifit.models import (
+    ExerciseChanges,
     FinishSessionResponse,
     SaveExerciseRequest,
     SaveExerciseResponse,
+    SaveSessionRequest,
+    SaveSessionResponse,
 )
 
 router = APIRouter()
 
+# Cards rendered in full with the session page; the rest are sent as
+# headers and fetched as fragments when scrolled into view
+EAGER_CARDS = 2
 
-@router.post("/sessions/start/{day_id}")
-async def start_session(day_id, request: Request):
-    """Create a new session, discarding any unfinished session."""
-    db = request.app.state.db
-
-    # Delete any unfinished sessions and their related data
-    cursor = await db.execute("SELECT id FROM session WHERE is_finished = 0")
-    unfinished_sessions = await cursor.fetchall()
-
-    for unfinished in unfinished_sessions:
-        session_id = unfinished["id"]
-        # Get session_exercise IDs for this session
-        cursor = await db.execute(
-            "SELECT id FROM session_exercise WHERE session_id = ?", (session_id,)
-        )
-        session_exercises = await cursor.fetchall()
-
-        # Delete set_entries for each session_exercise
-        for se in session_exercises:
-            await db.execute(
-                "DELETE FROM set_entry WHERE session_exercise_id = ?", (se["id"],)
-            )
 
-        # Delete session_exercises
-        await db.execute(
-            "DELETE FROM session_exercise WHERE session_id = ?", (session_id,)
-        )
-
-        # Delete the session
-        await db.execute("DELETE FROM session WHERE id = ?", (session_id,))
-
-    await db.commit()
-
-    cursor = await db.execute("SELECT id FROM day WHERE id = ?", (day_id,))
-    day = await cursor.fetchone()
+@router.post("/sessions/start/{day_id}")
+async def start_session(
+    day_id,
+    request: Request,
+    user=Depends(get_current_user),
+    db=Depends(get_writer),
+    catalog=Depends(get_catalog),
+    relay=Depends(get_live_relay),
+):
+    """Create a new session, discarding the user's unfinished session."""
+    day = catalog.day(day_id, user.id)
     if not day:
         raise HTTPException(status_code=404, detail="Day not found")
 
+    cursor = await db.execute(
+        "SELECT id FROM session WHERE user_id = ? AND is_finished = 0", (user.id,)
+    )
+    discarded = [row[0] for row in await cursor.fetchall()]
+    await _delete_sessions(db, discarded)
+
     today = date.today().isoformat()
     cursor = await db.execute(
-        "INSERT INTO session (day_id, date, is_finished) VALUES (?, ?, 0)",
-        (day_id, today),
+        "INSERT INTO session (user_id, day_id, date, is_finished) VALUES (?, ?, ?, 0)",
+        (user.id, day.id, today),
     )
     session_id = cursor.lastrowid
+    if relay is not None:
+        for discarded_id in discarded:
+            await relay.record(db, discarded_id, "discarded", {"redirect": "/"})
     await db.commit()
+    for discarded_id in discarded:
+        request.app.state.live.end_session(discarded_id, "discarded", {"redirect": "/"})
 
     return RedirectResponse(url=f"/sessions/{session_id}", status_code=303)
 
 
+async def _delete_sessions(db, session_ids):
+    """
+    Delete unfinished sessions with their exercises and sets. Does not commit.
+
+    Unfinished sessions have no summaries or targets yet; their save
+    receipts expire with the maintenance sweep.
+    """
+    if not session_ids:
+        return
+    placeholders = ", ".join("?" for _ in session_ids)
+    await db.execute(
+        f"""DELETE FROM set_entry WHERE session_exercise_id IN (
+               SELECT id FROM session_exercise WHERE session_id IN ({placeholders}))""",
+        session_ids,
+    )
+    await db.execute(
+        f"DELETE FROM session_exercise WHERE session_id IN ({placeholders})",
+        session_ids,
+    )
+    await db.execute(f"DELETE FROM session WHERE id IN ({placeholders})", session_ids)
+
+
 @router.get("/sessions/{session_id}", response_class=HTMLResponse)
-async def session_page(session_id, request: Request):
+async def session_page(
+    session_id,
+    request: Request,
+    db=Depends(get_reader),
+    catalog=Depends(get_catalog),
+    user=Depends(get_current_user),
+):
     """Workout session page."""
-    db = request.app.state.db
-    cursor = await db.execute(
-        "SELECT id, day_id, date, is_finished FROM session WHERE id = ?",
-        (session_id,),
+    view = await load_session_view(
+        db, session_id, catalog, writer=request.app.state.pool.writer, user_id=user.id
     )
-    session = await cursor.fetchone()
-    if not session:
+    if view is None:
         raise HTTPException(status_code=404, detail="Session not found")
 
-    cursor = await db.execute(
-        "SELECT id, label FROM day WHERE id = ?", (session["day_id"],)
-    )
-    day = await cursor.fetchone()
+    fragments = request.app.state.fragments
+    slot_headers = {}
+    for se in view["session_exercises"]:
+        slot = se["slot"]
+        slot_headers[slot.id] = await _slot_header(fragments, slot)
 
-    cursor = await db.execute(
-        """SELECT s.id, s.ordinal, s.title, s.preferred_exercise_id, s.warmup_sets,
-                  s.working_sets_count, s.rep_target, s.rpe_range, s.rest_minutes, s.has_dropset,
-                  e.name as exercise_name, e.notes as exercise_notes
-           FROM slot s
-           JOIN exercise e ON s.preferred_exercise_id = e.id
-           WHERE s.day_id = ?
-           ORDER BY s.ordinal""",
-        (session["day_id"],),
+    template = templates.get_template("pages/session.html")
+    return HTMLResponse(
+        await template.render_async(
+            slot_headers=slot_headers, eager_cards=EAGER_CARDS, **view
+        )
     )
-    slots = await cursor.fetchall()
 
-    session_exercises = []
-    for slot in slots:
-        cursor = await db.execute(
-            "SELECT id FROM session_exercise WHERE session_id = ? AND slot_id = ?",
-            (session_id, slot["id"]),
-        )
-        se = await cursor.fetchone()
-
-        if not se:
-            cursor = await db.execute(
-                """INSERT INTO session_exercise (session_id, slot_id, exercise_id, dropset_done)
-                   VALUES (?, ?, ?, 0)""",
-                (session_id, slot["id"], slot["preferred_exercise_id"]),
-            )
-            se_id = cursor.lastrowid
-            await db.commit()
-        else:
-            se_id = se["id"]
 
-        cursor = await db.execute(
-            """SELECT id, effort_tag, next_time_note, dropset_done
-               FROM session_exercise WHERE id = ?""",
-            (se_id,),
-        )
-        se_data = await cursor.fetchone()
+@router.get(
+    "/sessions/{session_id}/exercises/{session_exercise_id}/card",
+    response_class=HTMLResponse,
+)
+async def exercise_card(
+    session_id,
+    session_exercise_id: int,
+    request: Request,
+    db=Depends(get_reader),
+    catalog=Depends(get_catalog),
+    user=Depends(get_current_user),
+):
+    """One exercise card of the session page, as an HTML fragment."""
+    view = await load_card_view(
+        db, session_id, session_exercise_id, catalog, user_id=user.id
+    )
+    if view is None:
+        raise HTTPException(status_code=404, detail="Session exercise not found")
 
-        cursor = await db.execute(
-            """SELECT set_number, weight_kg, reps, is_done, is_drop
-               FROM set_entry WHERE session_exercise_id = ?
-               ORDER BY set_number""",
-            (se_id,),
-        )
-        sets = await cursor.fetchall()
+    slot = view["se"]["slot"]
+    slot_headers = {slot.id: await _slot_header(request.app.state.fragments, slot)}
+    template = templates.get_template("components/exercise_card.html")
+    return HTMLResponse(await template.render_async(slot_headers=slot_headers, **view))
 
-        cursor = await db.execute(
-            """SELECT se.next_time_note, se.effort_tag, se.id as prev_se_id
-               FROM session_exercise se
-               JOIN session s ON se.session_id = s.id
-               WHERE se.slot_id = ? AND se.exercise_id = ? AND s.is_finished = 1
-               ORDER BY s.date DESC, s.id DESC
-               LIMIT 1""",
-            (slot["id"], slot["preferred_exercise_id"]),
-        )
-        prev_session = await cursor.fetchone()
-
-        prev_sets = []
-        if prev_session:
-            cursor = await db.execute(
-                """SELECT set_number, weight_kg, reps
-                   FROM set_entry
-                   WHERE session_exercise_id = ? AND is_drop = 0
-                   ORDER BY set_number""",
-                (prev_session["prev_se_id"],),
-            )
-            prev_sets = await cursor.fetchall()
-
-        session_exercises.append(
-            {
-                "id": se_id,
-                "slot": dict(slot),
-                "effort_tag": se_data["effort_tag"] if se_data else None,
-                "next_time_note": se_data["next_time_note"] if se_data else None,
-                "dropset_done": se_data["dropset_done"] if se_data else 0,
-                "sets": [dict(s) for s in sets],
-                "previous": {
-                    "next_time_note": prev_session["next_time_note"]
-                    if prev_session
-                    else None,
-                    "effort_tag": prev_session["effort_tag"] if prev_session else None,
-                    "sets": [dict(s) for s in prev_sets],
-                }
-                if prev_session
-                else None,
-            }
-        )
 
-    template = templates.get_template("pages/session.html")
-    return HTMLResponse(
-        template.render(
-            session={"id": session["id"], "date": session["date"]},
-            day=dict(day),
-            session_exercises=session_exercises,
-        )
+@router.get(
+    "/sessions/{session_id}/exercises/{session_exercise_id}/previous",
+    response_class=HTMLResponse,
+)
+async def previous_session(
+    session_id,
+    session_exercise_id: int,
+    db=Depends(get_reader),
+    user=Depends(get_current_user),
+):
+    """The "last time" panel of an exercise card, loaded when opened."""
+    view = await load_previous_view(
+        db, session_id, session_exercise_id, user_id=user.id
     )
+    if view is None:
+        raise HTTPException(status_code=404, detail="Session exercise not found")
+
+    template = templates.get_template("components/previous_session.html")
+    return HTMLResponse(await template.render_async(**view))
+
+
+async def _slot_header(fragments, slot):
+    return await fragments.render("components/slot_header.html", key=slot.id, slot=slot)
 
 
 @router.post(
     "/sessions/{session_id}/exercises/{session_exercise_id}/save",
     response_model=SaveExerciseResponse,
+    response_model_exclude_defaults=True,
 )
 async def save_exercise(
     session_id,
-    session_exercise_id,
+    session_exercise_id: int,
     data: SaveExerciseRequest,
-    request: Request,
+    client_id: str | None = Header(None, alias="X-Client-Id", max_length=64),
+    user=Depends(get_current_user),
+    db=Depends(get_writer),
+    hub=Depends(get_session_hub),
+    relay=Depends(get_live_relay),
 ):
-    """Auto-save endpoint for exercise data."""
-    db = request.app.state.db
-    cursor = await db.execute(
-        "SELECT id FROM session_exercise WHERE id = ? AND session_id = ?",
-        (session_exercise_id, session_id),
+    """
+    Auto-save endpoint for exercise data.
+
+    Answers 409 with the stored values when part of the save conflicts;
+    the rest of it is still applied. Saves to a finished session are
+    answered 409 with status "finished" and not applied.
+    """
+    result = await save_session_changes(
+        db,
+        session_id,
+        {session_exercise_id: data},
+        user_id=user.id,
+        relay=relay,
+        origin=client_id,
     )
-    se = await cursor.fetchone()
-    if not se:
+    if result is None:
         raise HTTPException(status_code=404, detail="Session exercise not found")
+    response, deltas = result
+    _publish_changes(hub, session_id, deltas, client_id)
+
+    result = {"status": response["status"]}
+    if session_exercise_id in response["revisions"]:
+        result["revision"] = response["revisions"][session_exercise_id]
+    if response["conflicts"]:
+        result["conflict"] = ExerciseChanges(**response["conflicts"][0])
+    if response["status"] != "ok":
+        return _conflict(SaveExerciseResponse(**result))
+    return SaveExerciseResponse(**result)
 
-    updates = []
-    params = []
-    if data.notes is not None:
-        updates.append("next_time_note = ?")
-        params.append(data.notes)
-    if data.effort_tag is not None:
-        updates.append("effort_tag = ?")
-        params.append(data.effort_tag)
-    if data.dropset_done is not None:
-        updates.append("dropset_done = ?")
-        params.append(data.dropset_done)
-
-    if updates:
-        params.append(session_exercise_id)
-        query = f"UPDATE session_exercise SET {', '.join(updates)} WHERE id = ?"
-        await db.execute(query, params)
-        await db.commit()
-
-    if data.sets:
-        for set_data in data.sets:
-            cursor = await db.execute(
-                """SELECT id FROM set_entry
-                   WHERE session_exercise_id = ? AND set_number = ?""",
-                (session_exercise_id, set_data.set_number),
-            )
-            existing = await cursor.fetchone()
-
-            if existing:
-                await db.execute(
-                    """UPDATE set_entry
-                       SET weight_kg = ?, reps = ?, is_done = ?
-                       WHERE id = ?""",
-                    (
-                        set_data.weight_kg,
-                        set_data.reps,
-                        set_data.is_done,
-                        existing["id"],
-                    ),
-                )
-            else:
-                await db.execute(
-                    """INSERT INTO set_entry
-                       (session_exercise_id, set_number, weight_kg, reps, is_done, is_drop)
-                       VALUES (?, ?, ?, ?, ?, 0)""",
-                    (
-                        session_exercise_id,
-                        set_data.set_number,
-                        set_data.weight_kg,
-                        set_data.reps,
-                        set_data.is_done,
-                    ),
-                )
-        await db.commit()
-
-    return SaveExerciseResponse(status="ok")
+
+@router.post(
+    "/sessions/{session_id}/save",
+    response_model=SaveSessionResponse,
+    response_model_exclude_defaults=True,
+)
+async def save_session(
+    session_id,
+    data: SaveSessionRequest,
+    idempotency_key: str | None = Header(None, max_length=128),
+    client_id: str | None = Header(None, alias="X-Client-Id", max_length=64),
+    user=Depends(get_current_user),
+    db=Depends(get_writer),
+    hub=Depends(get_session_hub),
+    relay=Depends(get_live_relay),
+):
+    """
+    Batch auto-save endpoint: apply changes for many exercises atomically.
+
+    Clients replaying an offline outbox send an Idempotency-Key header;
+    a batch whose key was already applied is acknowledged without writing.
+    Changes to fields or sets saved since the revision they carry are not
+    applied: the stored values come back in a 409 with the rest of the
+    batch applied. A finished session takes no more saves: the batch is
+    answered 409 with status "finished". What changed is pushed to the
+    session's other open pages.
+    """
+    changes = {}
+    for exercise in data.exercises:
+        changes[exercise.session_exercise_id] = merge_changes(
+            changes.get(exercise.session_exercise_id), exercise
+        )
+
+    result = await save_session_changes(
+        db,
+        session_id,
+        changes,
+        idempotency_key,
+        user_id=user.id,
+        relay=relay,
+        origin=client_id,
+    )
+    if result is None:
+        raise HTTPException(status_code=404, detail="Session exercise not found")
+    response, deltas = result
+    _publish_changes(hub, session_id, deltas, client_id)
+
+    if response["status"] != "ok":
+        return _conflict(SaveSessionResponse(**response))
+    return SaveSessionResponse(
+        status="ok", saved=response["saved"], revisions=response["revisions"]
+    )
+
+
+def _conflict(response):
+    # Unset fields are left out: a conflict only carries what conflicted
+    return JSONResponse(
+        response.model_dump(mode="json", exclude_unset=True), status_code=409
+    )
+
+
+def _publish_changes(hub, session_id, deltas, client_id):
+    # Other workers get them through the event the save recorded
+    if deltas:
+        hub.publish(int(session_id), "changes", {"exercises": deltas}, client_id)
+
+
+@router.get("/sessions/{session_id}/events")
+async def session_events(
+    session_id: int,
+    request: Request,
+    client: str | None = Query(None, max_length=64),
+    user=Depends(get_current_user),
+    hub=Depends(get_session_hub),
+):
+    """
+    Server-sent events for an unfinished session: "changes" carries the
+    set rows and fields other clients saved, "finished" and "discarded"
+    end the session, "resync" asks a client that fell behind to reload.
+
+    client is the id the page sends as X-Client-Id, so its own saves are
+    not echoed back.
+    """
+    # Not get_reader: the stream must not hold a pooled connection open
+    async with request.app.state.pool.reader() as db:
+        cursor = await db.execute(
+            "SELECT is_finished FROM session WHERE id = ? AND user_id = ?",
+            (session_id, user.id),
+        )
+        session = await cursor.fetchone()
+    if not session or session["is_finished"]:
+        raise HTTPException(status_code=404, detail="Session not found")
+    subscriber = hub.subscribe(session_id, client)
+    if subscriber is None:
+        raise HTTPException(status_code=429, detail="Too many open pages")
+
+    return StreamingResponse(
+        stream_events(hub, subscriber),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @router.post("/sessions/{session_id}/finish", response_model=FinishSessionResponse)
-async def finish_session(session_id, request: Request):
+async def finish_session(
+    session_id,
+    request: Request,
+    user=Depends(get_current_user),
+    db=Depends(get_writer),
+    relay=Depends(get_live_relay),
+):
     """Mark session as finished."""
-    db = request.app.state.db
     cursor = await db.execute(
-        "SELECT id, is_finished FROM session WHERE id = ?", (session_id,)
+        "SELECT id, is_finished FROM session WHERE id = ? AND user_id = ?",
+        (session_id, user.id),
     )
     session = await cursor.fetchone()
     if not session:
@@ -271,18 +342,34 @@ async def finish_session(session_id, request: Request):
     if session["is_finished"]:
         raise HTTPException(status_code=400, detail="Session already finished")
 
-    await db.execute("UPDATE session SET is_finished = 1 WHERE id = ?", (session_id,))
+    await db.execute(
+        "UPDATE session SET is_finished = 1 WHERE id = ?", (session["id"],)
+    )
+    await write_session_summaries(db, session["id"])
+    await write_progression_targets(db, session["id"])
+    # Tells other worker processes their cached analytics are stale
+    await bump_version(db, "analytics_version")
+    if relay is not None:
+        await relay.record(db, session["id"], "finished", {"redirect": "/"})
     await db.commit()
+    request.app.state.analytics.invalidate(user.id)
+    request.app.state.live.end_session(session["id"], "finished", {"redirect": "/"})
 
     return FinishSessionResponse(status="ok", redirect="/")
 
 
 @router.post("/sessions/{session_id}/discard", response_model=FinishSessionResponse)
-async def discard_session(session_id, request: Request):
+async def discard_session(
+    session_id,
+    request: Request,
+    user=Depends(get_current_user),
+    db=Depends(get_writer),
+    relay=Depends(get_live_relay),
+):
     """Discard (delete) an unfinished session."""
-    db = request.app.state.db
     cursor = await db.execute(
-        "SELECT id, is_finished FROM session WHERE id = ?", (session_id,)
+        "SELECT id, is_finished FROM session WHERE id = ? AND user_id = ?",
+        (session_id, user.id),
     )
     session = await cursor.fetchone()
     if not session:
@@ -290,23 +377,10 @@ async def discard_session(session_id, request: Request):
     if session["is_finished"]:
         raise HTTPException(status_code=400, detail="Cannot discard finished session")
 
-    # Get session_exercise IDs
-    cursor = await db.execute(
-        "SELECT id FROM session_exercise WHERE session_id = ?", (session_id,)
-    )
-    session_exercises = await cursor.fetchall()
-
-    # Delete set_entries for each session_exercise
-    for se in session_exercises:
-        await db.execute(
-            "DELETE FROM set_entry WHERE session_exercise_id = ?", (se["id"],)
-        )
-
-    # Delete session_exercises
-    await db.execute("DELETE FROM session_exercise WHERE session_id = ?", (session_id,))
-
-    # Delete the session
-    await db.execute("DELETE FROM session WHERE id = ?", (session_id,))
+    await _delete_sessions(db, [session["id"]])
+    if relay is not None:
+        await relay.record(db, session["id"], "discarded", {"redirect": "/"})
     await db.commit()
+    request.app.state.live.end_session(session["id"], "discarded", {"redirect": "/"})
 
     return FinishSessionResponse(status="ok", redirect="/")
@@ -22,3 +22,121 @@ def get_db_path():
     if env_path:
         return Path(env_path)
     return get_project_root() / "db.sqlite"
+
+
+def get_template_db_path():
+    """
+    Pre-seeded database copied into place when DB_PATH does not exist yet.
+
+    Reads TEMPLATE_DB_PATH env var (built by prepare_image.py); None, the
+    default, creates new databases by running the migrations and seed.
+    """
+    env_path = os.environ.get("TEMPLATE_DB_PATH")
+    return Path(env_path) if env_path else None
+
+
+def get_db_readers():
+    """
+    Number of read-only connections in the database pool.
+
+    Reads DB_READERS env var, defaulting to 4.
+    """
+    return int(os.environ.get("DB_READERS", "4"))
+
+
+def get_worker_count():
+    """
+    Number of worker processes serving the app; above 1 enables multi-worker mode.
+
+    Reads WEB_CONCURRENCY env var, which uvicorn also uses as the default
+    for --workers, defaulting to 1.
+    """
+    return int(os.environ.get("WEB_CONCURRENCY", "1"))
+
+
+def get_maintenance_interval():
+    """
+    Seconds between background maintenance runs; 0 disables them.
+
+    Reads MAINTENANCE_INTERVAL env var, defaulting to one hour.
+    """
+    return float(os.environ.get("MAINTENANCE_INTERVAL", "3600"))
+
+
+def get_backup_dir(db_path=None):
+    """
+    Directory for database snapshots.
+
+    Prefers BACKUP_DIR env var, otherwise backups/ next to db_path (by
+    default the DB_PATH database).
+    """
+    env_path = os.environ.get("BACKUP_DIR")
+    if env_path:
+        return Path(env_path)
+    return (db_path or get_db_path()).parent / "backups"
+
+
+def get_backup_interval():
+    """
+    Seconds between database snapshots; 0 disables them.
+
+    Reads BACKUP_INTERVAL env var, defaulting to one day.
+    """
+    return float(os.environ.get("BACKUP_INTERVAL", "86400"))
+
+
+def get_backup_keep():
+    """
+    Number of snapshots kept; older ones are deleted after each backup.
+
+    Reads BACKUP_KEEP env var, defaulting to 14.
+    """
+    return int(os.environ.get("BACKUP_KEEP", "14"))
+
+
+def get_slow_query_ms():
+    """
+    Statements slower than this many milliseconds are logged; None disables.
+
+    Reads SLOW_QUERY_MS env var; unset by default.
+    """
+    value = os.environ.get("SLOW_QUERY_MS")
+    return float(value) if value else None
+
+
+def get_user_header():
+    """
+    Request header carrying the signed-in user's login; None for single-user mode.
+
+    Reads USER_HEADER env var, e.g. Tailscale-User-Login behind tailscale
+    serve. Only set it behind a proxy that always sets or strips the header.
+    """
+    return os.environ.get("USER_HEADER") or None
+
+
+def get_admin_login():
+    """
+    Login allowed to reload the program and read catalog stats with USER_HEADER.
+
+    Reads ADMIN_LOGIN env var; None means no login may. In single-user mode
+    the default user always may.
+    """
+    return os.environ.get("ADMIN_LOGIN") or None
+
+
+def is_production():
+    """True when KOIFIT_ENV is set to "production"."""
+    return os.environ.get("KOIFIT_ENV", "development") == "production"
+
+
+def get_template_cache_dir():
+    """
+    Directory for compiled template bytecode.
+
+    Prefers TEMPLATE_CACHE_DIR env var, otherwise .cache/templates
+    at the project root.
+    """
+    env_path = os.environ.get("TEMPLATE_CACHE_DIR")
+    if env_path:
+        return Path(env_path)
+    return get_project_root() / ".cache" / "templates"
@@ -0,0 +1,169 @@
+"""
+Per-session exercise summaries: best estimated 1RM, volume and top set.
+
+Summaries are written once when a session is finished, so history pages
+read one small row per session instead of regrouping every set.
+"""
+
+import asyncio
+import json
+
+REPLACE_SUMMARY_SQL = """INSERT OR REPLACE INTO session_exercise_summary
+       (session_exercise_id, session_id, slot_id, exercise_id, date,
+        best_1rm, volume, top_weight_kg, top_reps, set_count, sets_json)
+       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"""
+
+# Done sets of finished sessions, grouped by session_exercise in set order
+DONE_SETS_SQL = """SELECT se.id AS se_id, se.session_id, se.slot_id, se.exercise_id, s.date,
+          st.set_number, st.weight_kg, st.reps, st.is_drop
+   FROM session s
+   JOIN session_exercise se ON se.session_id = s.id
+   JOIN set_entry st ON st.session_exercise_id = se.id
+   WHERE s.is_finished = 1 AND st.is_done = 1 AND {where}
+   ORDER BY se.session_id, se.slot_id, se.id, st.set_number"""
+
+
+def epley_1rm(weight, reps):
+    """Estimated one-rep max using the Epley formula."""
+    return weight * (1 + reps / 30.0)
+
+
+def summarize_sets(sets):
+    """
+    Summarize done sets of one session_exercise.
+
+    Only working sets (not drops) with a weight count toward 1RM, volume
+    and the top set, matching what the history chart has always shown.
+    """
+    best_1rm = 0.0
+    volume = 0.0
+    top = None
+    for s in sets:
+        if s["is_drop"] or s["weight_kg"] <= 0:
+            continue
+        estimated = epley_1rm(s["weight_kg"], s["reps"])
+        if estimated > best_1rm:
+            best_1rm = estimated
+            top = s
+        volume += s["weight_kg"] * s["reps"]
+    return {
+        "best_1rm": round(best_1rm, 1),
+        "volume": round(volume, 1),
+        "top_weight_kg": top["weight_kg"] if top else None,
+        "top_reps": top["reps"] if top else None,
+        "set_count": len(sets),
+    }
+
+
+def _summary_rows(rows):
+    """Group DONE_SETS_SQL rows into REPLACE_SUMMARY_SQL parameter tuples."""
+    grouped = {}
+    for row in rows:
+        entry = grouped.get(row["se_id"])
+        if entry is None:
+            entry = grouped[row["se_id"]] = (row, [])
+        entry[1].append(
+            {
+                "set_number": row["set_number"],
+                "weight_kg": row["weight_kg"],
+                "reps": row["reps"],
+                "is_drop": bool(row["is_drop"]),
+            }
+        )
+    params = []
+    for se_id, (first, sets) in grouped.items():
+        summary = summarize_sets(sets)
+        params.append(
+            (
+                se_id,
+                first["session_id"],
+                first["slot_id"],
+                first["exercise_id"],
+                first["date"],
+                summary["best_1rm"],
+                summary["volume"],
+                summary["top_weight_kg"],
+                summary["top_reps"],
+                summary["set_count"],
+                json.dumps(sets, separators=(",", ":")),
+            )
+        )
+    return params
+
+
+async def write_session_summaries(db, session_id):
+    """
+    Replace the summaries of one finished session. Does not commit.
+
+    Call it in the same transaction that marks the session finished.
+    """
+    await db.execute(
+        "DELETE FROM session_exercise_summary WHERE session_id = ?", (session_id,)
+    )
+    cursor = await db.execute(DONE_SETS_SQL.format(where="s.id = ?"), (session_id,))
+    params = _summary_rows(await cursor.fetchall())
+    if params:
+        await db.executemany(REPLACE_SUMMARY_SQL, params)
+
+
+async def _write_summary_chunk(db, last_id, chunk_size):
+    """
+    Write summaries for up to chunk_size finished sessions after last_id and commit.
+
+    Returns (rows written, last session id), or None when no session is left.
+    """
+    cursor = await db.execute(
+        """SELECT id FROM session
+           WHERE is_finished = 1 AND id > ?
+           ORDER BY id LIMIT ?""",
+        (last_id, chunk_size),
+    )
+    session_ids = [row[0] for row in await cursor.fetchall()]
+    if not session_ids:
+        return None
+    cursor = await db.execute(
+        DONE_SETS_SQL.format(where="s.id BETWEEN ? AND ?"),
+        (session_ids[0], session_ids[-1]),
+    )
+    params = _summary_rows(await cursor.fetchall())
+    await db.executemany(REPLACE_SUMMARY_SQL, params)
+    await db.commit()
+    return len(params), session_ids[-1]
+
+
+async def rebuild_summaries(db, chunk_size=500):
+    """
+    Recompute every summary from set_entry, committing every chunk_size sessions.
+
+    Returns the number of summary rows written.
+    """
+    await db.execute("DELETE FROM session_exercise_summary")
+    await db.commit()
+
+    written = 0
+    last_id = 0
+    while chunk := await _write_summary_chunk(db, last_id, chunk_size):
+        written += chunk[0]
+        last_id = chunk[1]
+    return written
+
+
+async def backfill_summaries(writer, chunk_size=200, after_id=0):
+    """
+    Write missing summaries while the app keeps serving.
+
+    writer is a context manager factory such as DatabasePool.writer; it is
+    held for one chunk at a time, so saves interleave with the backfill.
+    Existing rows are replaced with identical ones, so it is safe to rerun.
+    Only sessions with id > after_id are visited.
+    """
+    written = 0
+    last_id = after_id
+    while True:
+        async with writer() as db:
+            chunk = await _write_summary_chunk(db, last_id, chunk_size)
+        if chunk is None:
+            return written
+        written += chunk[0]
+        last_id = chunk[1]
+        await asyncio.sleep(0)
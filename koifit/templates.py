@@ -1,8 +1,15 @@
 """
-Shared Jinja2 environment.
+Shared Jinja2 environment and fragment cache.
+
+Templates render asynchronously so large pages don't block the event loop,
+compiled templates are cached as bytecode on disk, and template files are
+only re-checked for changes outside production.
 """
 
-from jinja2 import Environment, FileSystemLoader
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+from markupsafe import Markup
+
+from koifit.settings import get_template_cache_dir, is_production
 
 
 def format_rest_time(minutes: float) -> str:
@@ -43,9 +50,74 @@ def format_warmup_sets(warmup_sets: str) -> str:
             return f"Warmup: {warmup_sets} sets"
 
 
-templates = Environment(loader=FileSystemLoader("templates"), autoescape=True)
-templates.filters["rest_time"] = format_rest_time
-templates.filters["weight"] = format_weight
-templates.filters["warmup_sets"] = format_warmup_sets
+def create_environment():
+    """Build the Jinja2 environment with bytecode caching and async rendering."""
+    cache_dir = get_template_cache_dir()
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    environment = Environment(
+        loader=FileSystemLoader("templates"),
+        autoescape=True,
+        auto_reload=not is_production(),
+        bytecode_cache=FileSystemBytecodeCache(str(cache_dir)),
+        enable_async=True,
+    )
+    environment.filters["rest_time"] = format_rest_time
+    environment.filters["weight"] = format_weight
+    environment.filters["warmup_sets"] = format_warmup_sets
+    return environment
+
+
+def compile_templates(environment):
+    """
+    Compile every template into the bytecode cache; returns how many.
+
+    Run at image build time, so the first request of a fresh container
+    does not pay for compiling the templates it renders.
+    """
+    names = environment.list_templates(extensions=["html"])
+    for name in names:
+        environment.get_template(name)
+    return len(names)
+
+
+class FragmentCache:
+    """
+    Rendered HTML for program data (day list, slot headers).
+
+    Fragments only depend on days, slots and exercises, which change when
+    the seed is reapplied, so entries are keyed on the program version and
+    dropped as soon as a different version is set.
+    """
+
+    def __init__(self, environment):
+        self.environment = environment
+        self.version = None
+        self._fragments = {}
+
+    def set_version(self, version):
+        """Switch to a program version, discarding fragments from any other."""
+        if version != self.version:
+            self._fragments.clear()
+            self.version = version
+
+    async def render(self, template_name, key=None, load_context=None, **context):
+        """
+        Render template_name once per key and program version.
+
+        load_context is an optional coroutine function returning extra
+        context; it only runs on a miss, so hits cost no queries.
+        """
+        cache_key = (template_name, key)
+        fragment = self._fragments.get(cache_key)
+        if fragment is None:
+            if load_context is not None:
+                context.update(await load_context())
+            template = self.environment.get_template(template_name)
+            fragment = Markup(await template.render_async(**context))
+            self._fragments[cache_key] = fragment
+        return fragment
+
+
+templates = create_environment()
 
-__all__ = ["templates"]
+__all__ = ["FragmentCache", "compile_templates", "templates"]
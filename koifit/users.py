@@ -0,0 +1,175 @@
+"""
+Users: who a request belongs to.
+
+Without USER_HEADER the app is single-user and everything belongs to
+DEFAULT_USER_ID. With it, the trusted proxy in front of the app names the
+user in that header; a login seen for the first time gets a user row and
+a copy of the default user's program. Users are kept in memory, so
+resolving one costs no query after the first request.
+"""
+
+import asyncio
+import sqlite3
+from dataclasses import dataclass
+
+from fastapi import HTTPException, Request
+
+from koifit.db.setup import bump_program_version
+
+DEFAULT_USER_ID = 1
+
+
+@dataclass(slots=True, frozen=True)
+class User:
+    id: int
+    login: str
+
+
+async def clone_program(db, from_user_id, to_user_id):
+    """
+    Copy a user's exercises, days and slots to another user. Does not commit.
+
+    Rows are inserted in id order so the copies keep their relative order;
+    slot references are remapped to the copied exercises and days.
+    """
+    exercise_ids = {}
+    cursor = await db.execute(
+        """SELECT id, name, min_increment, active, notes FROM exercise
+           WHERE user_id = ? ORDER BY id""",
+        (from_user_id,),
+    )
+    for row in await cursor.fetchall():
+        inserted = await db.execute(
+            """INSERT INTO exercise (user_id, name, min_increment, active, notes)
+               VALUES (?, ?, ?, ?, ?)""",
+            (to_user_id, *row[1:]),
+        )
+        exercise_ids[row[0]] = inserted.lastrowid
+
+    day_ids = {}
+    cursor = await db.execute(
+        "SELECT id, label, ordinal FROM day WHERE user_id = ? ORDER BY id",
+        (from_user_id,),
+    )
+    for row in await cursor.fetchall():
+        inserted = await db.execute(
+            "INSERT INTO day (user_id, label, ordinal) VALUES (?, ?, ?)",
+            (to_user_id, *row[1:]),
+        )
+        day_ids[row[0]] = inserted.lastrowid
+
+    cursor = await db.execute(
+        """SELECT sl.day_id, sl.ordinal, sl.title, sl.preferred_exercise_id,
+                  sl.warmup_sets, sl.working_sets_count, sl.rep_target, sl.rpe_range,
+                  sl.rest_minutes, sl.has_dropset
+           FROM slot sl JOIN day d ON d.id = sl.day_id
+           WHERE d.user_id = ? ORDER BY sl.id""",
+        (from_user_id,),
+    )
+    slots = [
+        (day_ids[row[0]], row[1], row[2], exercise_ids[row[3]], *row[4:])
+        for row in await cursor.fetchall()
+    ]
+    await db.executemany(
+        """INSERT INTO slot (day_id, ordinal, title, preferred_exercise_id, warmup_sets,
+                             working_sets_count, rep_target, rpe_range, rest_minutes,
+                             has_dropset)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+        slots,
+    )
+
+
+async def find_user(db, login):
+    """The User with login, or None."""
+    cursor = await db.execute("SELECT id, login FROM user WHERE login = ?", (login,))
+    row = (await cursor.fetchall())[:1]
+    return User(*row[0]) if row else None
+
+
+async def create_user(db, login):
+    """
+    Insert a user with a copy of the default program. Does not commit.
+
+    Returns the new User. The program version is bumped, so the catalog and
+    fragments pick up the copy once reloaded.
+    """
+    cursor = await db.execute("INSERT INTO user (login) VALUES (?)", (login,))
+    user = User(cursor.lastrowid, login)
+    await clone_program(db, DEFAULT_USER_ID, user.id)
+    await bump_program_version(db)
+    return user
+
+
+class UserDirectory:
+    """
+    Users by login, loaded at startup and extended as new logins appear.
+
+    header is the request header naming the user (USER_HEADER), or None
+    for single-user mode; admin_login is the login allowed to manage the
+    whole program (ADMIN_LOGIN).
+    """
+
+    def __init__(self, header=None, admin_login=None):
+        self.header = header
+        self.admin_login = admin_login
+        self._by_login = {}
+        self._lock = asyncio.Lock()
+
+    async def reload(self, db):
+        cursor = await db.execute("SELECT id, login FROM user")
+        self._by_login = {row[1]: User(*row) for row in await cursor.fetchall()}
+
+    def default(self):
+        return User(DEFAULT_USER_ID, "default")
+
+    def is_admin(self, user):
+        """True for the single user, or the admin login with USER_HEADER."""
+        if self.header is None:
+            return True
+        return self.admin_login is not None and user.login == self.admin_login
+
+    async def get_or_create(self, app, login):
+        """The user for login, creating it (and its program) on first sight."""
+        user = self._by_login.get(login)
+        if user is not None:
+            return user
+        async with self._lock:
+            user = self._by_login.get(login)
+            if user is not None:
+                return user
+            async with app.state.pool.writer() as db:
+                user = await find_user(db, login)
+                if user is None:
+                    try:
+                        user = await create_user(db, login)
+                        await db.commit()
+                    except sqlite3.IntegrityError:
+                        # Another worker process created it first
+                        await db.rollback()
+                        user = await find_user(db, login)
+                    await app.state.catalog.reload(db)
+                    app.state.fragments.set_version(app.state.catalog.version)
+            self._by_login[login] = user
+        return user
+
+    async def resolve(self, request: Request):
+        """The User a request belongs to; 401 if the header is missing."""
+        if self.header is None:
+            return self.default()
+        login = request.headers.get(self.header)
+        if not login:
+            raise HTTPException(status_code=401, detail="Not signed in")
+        return await self.get_or_create(request.app, login)
+
+
+async def get_current_user(request: Request):
+    """FastAPI dependency returning the User the request belongs to."""
+    return await request.app.state.users.resolve(request)
+
+
+async def get_admin_user(request: Request):
+    """FastAPI dependency returning the current User; 403 unless the admin."""
+    user = await get_current_user(request)
+    if not request.app.state.users.is_admin(user):
+        raise HTTPException(status_code=403, detail="Admin only")
+    return user
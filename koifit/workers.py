@@ -0,0 +1,64 @@
+"""
+Multi-worker mode: several processes serving one WAL-mode database.
+
+With WEB_CONCURRENCY above 1 (uvicorn --workers), each worker keeps its own
+catalog, fragments and analytics in memory, and they stay correct through
+counters kept in app_meta:
+
+- data_version is bumped in every write's transaction (DatabasePool(shared=True)), so
+  ETags are the same whichever worker answers;
+- program_version is bumped by program edits and new users;
+- analytics_version is bumped when a session is finished.
+
+Before a request is handled, sync_worker reads all three in one query and
+drops whatever another worker's writes made stale. Live session events
+are relayed between workers by LiveRelay (koifit/live.py).
+"""
+
+import asyncio
+
+from fastapi import Request
+
+VERSIONS_SQL = """SELECT key, value FROM app_meta
+    WHERE key IN ('data_version', 'data_modified', 'program_version',
+                  'analytics_version')"""
+
+
+class WorkerSync:
+    """Brings one worker's in-memory state up to date with the database."""
+
+    def __init__(self, app):
+        self.app = app
+        self.analytics_version = None
+        self.catalog_reloads = 0
+        self._lock = asyncio.Lock()
+
+    async def check(self):
+        """Read the shared versions and refresh whatever they outdate."""
+        state = self.app.state
+        async with state.pool.reader() as db:
+            cursor = await db.execute(VERSIONS_SQL)
+            versions = dict(await cursor.fetchall())
+        state.pool.observe_data_version(
+            versions["data_version"], versions["data_modified"]
+        )
+
+        analytics_version = versions["analytics_version"]
+        if self.analytics_version not in (None, analytics_version):
+            # Analytics are cached per user, but the counter is not: finishes
+            # are rare enough that dropping everyone's is fine
+            state.analytics.invalidate()
+        self.analytics_version = analytics_version
+
+        if versions.get("program_version", 0) != state.catalog.version:
+            async with self._lock:
+                if versions.get("program_version", 0) != state.catalog.version:
+                    async with state.pool.reader() as db:
+                        await state.catalog.reload(db)
+                    state.fragments.set_version(state.catalog.version)
+                    self.catalog_reloads += 1
+
+
+async def sync_worker(request: Request):
+    """FastAPI dependency refreshing the worker's caches before the route runs."""
+    await request.app.state.sync.check()
@@ -4,30 +4,118 @@ Koifit Workout Tracker - FastAPI Application
 
 from contextlib import asynccontextmanager
 
-import aiosqlite
-from fastapi import FastAPI
-from fastapi.responses import RedirectResponse
-from fastapi.staticfiles import StaticFiles
-
-from koifit.db import ensure_database
-from koifit.routes import exercises_router, home_router, sessions_router
-from koifit.settings import get_db_path
-
-
-def create_app(db_path=None):
+from fastapi import Depends, FastAPI
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import PlainTextResponse, RedirectResponse
+
+from koifit.analytics import AnalyticsCache
+from koifit.assets import AssetStore
+from koifit.backup import BackupTask
+from koifit.catalog import ProgramCatalog
+from koifit.db import DatabasePool, ensure_database
+from koifit.db.migrate import start_online_migrations, stop_online_migrations
+from koifit.db.setup import lock_online_migrations
+from koifit.instrumentation import RequestTimingMiddleware
+from koifit.live import LiveRelay, SessionHub
+from koifit.maintenance import MaintenanceTask
+from koifit.metrics import Metrics
+from koifit.routes import (
+    analytics_router,
+    assets_router,
+    exercises_router,
+    export_router,
+    home_router,
+    program_router,
+    sessions_router,
+)
+from koifit.settings import (
+    get_admin_login,
+    get_backup_dir,
+    get_backup_interval,
+    get_backup_keep,
+    get_db_path,
+    get_db_readers,
+    get_maintenance_interval,
+    get_project_root,
+    get_slow_query_ms,
+    get_template_db_path,
+    get_user_header,
+    get_worker_count,
+)
+from koifit.templates import FragmentCache, templates
+from koifit.users import UserDirectory
+from koifit.workers import WorkerSync, sync_worker
+
+
+def create_app(db_path=None, workers=None):
     """
     Build the FastAPI application with a configurable database path.
+
+    workers is the number of processes serving the database (default
+    WEB_CONCURRENCY); with more than one, caches are checked against the
+    database on every request, see koifit/workers.py.
     """
     resolved_db_path = db_path or get_db_path()
+    metrics = Metrics(slow_query_ms=get_slow_query_ms())
+    shared = (workers or get_worker_count()) > 1
 
     @asynccontextmanager
     async def lifespan(app):
-        await ensure_database(resolved_db_path)
-        # Create a single shared database connection for single-user app
-        app.state.db = await aiosqlite.connect(str(resolved_db_path))
-        app.state.db.row_factory = aiosqlite.Row
+        online_migrations = await ensure_database(
+            resolved_db_path, get_template_db_path()
+        )
+        # One writer plus read-only connections; routes borrow them per request
+        app.state.pool = DatabasePool(
+            resolved_db_path, readers=get_db_readers(), metrics=metrics, shared=shared
+        )
+        await app.state.pool.open()
+        # Backfills run in chunks on the pool while requests are served
+        app.state.migrations = start_online_migrations(
+            app.state.pool,
+            online_migrations,
+            lock_online_migrations(resolved_db_path),
+        )
+        # Days, slots and exercises are served from memory; see reload_program
+        app.state.catalog = ProgramCatalog()
+        # Known users are resolved from memory; see get_current_user
+        app.state.users = UserDirectory(get_user_header(), get_admin_login())
+        async with app.state.pool.reader() as db:
+            await app.state.catalog.reload(db)
+            await app.state.users.reload(db)
+        app.state.fragments = FragmentCache(templates)
+        app.state.fragments.set_version(app.state.catalog.version)
+        app.state.analytics = AnalyticsCache()
+        # Pushes saves to the other pages open on the same session; with
+        # several workers, through the database to pages open on the others
+        app.state.live = SessionHub()
+        app.state.relay = LiveRelay(app.state.live, app.state.pool) if shared else None
+        if app.state.relay is not None:
+            await app.state.relay.start()
+        app.state.sync = WorkerSync(app) if shared else None
+        # Hashed and precompressed once; templates link to fingerprinted URLs
+        app.state.assets = AssetStore(get_project_root() / "app" / "assets").load()
+        templates.globals["asset_url"] = app.state.assets.url
+        templates.globals["import_map"] = app.state.assets.import_map
+        app.state.maintenance = MaintenanceTask(
+            app.state.pool, get_maintenance_interval()
+        )
+        app.state.maintenance.start()
+        # Snapshots are taken online; see koifit/backup.py
+        app.state.backup = BackupTask(
+            resolved_db_path,
+            get_backup_dir(resolved_db_path),
+            get_backup_interval(),
+            get_backup_keep(),
+        )
+        app.state.backup.start()
         yield
-        await app.state.db.close()
+        await app.state.backup.stop()
+        if app.state.relay is not None:
+            await app.state.relay.stop()
+        app.state.live.close()
+        await stop_online_migrations(app.state.migrations)
+        await app.state.maintenance.stop()
+        await app.state.pool.close()
 
     app = FastAPI(
         title="Koifit Workout Tracker",
@@ -35,16 +123,52 @@ def create_app(db_path=None):
         lifespan=lifespan,
     )
 
-    app.mount("/assets", StaticFiles(directory="app/assets"), name="assets")
-    app.include_router(exercises_router)
-    app.include_router(home_router)
-    app.include_router(sessions_router)
+    # Pages and JSON; assets carry their own precompressed encodings
+    app.add_middleware(GZipMiddleware, minimum_size=500)
+    # Outermost, so Server-Timing and the access log cover compression too
+    app.add_middleware(RequestTimingMiddleware, metrics=metrics)
+    app.state.metrics = metrics
+    # Assets never depend on the database, so they skip the worker sync
+    synced = [Depends(sync_worker)] if shared else []
+    app.include_router(analytics_router, dependencies=synced)
+    app.include_router(assets_router)
+    app.include_router(exercises_router, dependencies=synced)
+    app.include_router(export_router, dependencies=synced)
+    app.include_router(home_router, dependencies=synced)
+    app.include_router(program_router, dependencies=synced)
+    app.include_router(sessions_router, dependencies=synced)
 
     @app.get("/health")
     async def health():
         """Health check endpoint."""
         return {"status": "ok"}
 
+    @app.get("/metrics", response_class=PlainTextResponse)
+    async def prometheus_metrics():
+        """Request and SQL metrics in the Prometheus text format."""
+        catalog = app.state.catalog
+        gauges = (
+            (
+                "koifit_data_version",
+                "Database writes seen by this worker.",
+                app.state.pool.data_version,
+            ),
+            ("koifit_catalog_hits", "Program catalog lookups served.", catalog.hits),
+            (
+                "koifit_live_subscribers",
+                "Open live session streams.",
+                len(app.state.live),
+            ),
+            (
+                "koifit_catalog_misses",
+                "Program catalog lookups missed.",
+                catalog.misses,
+            ),
+        )
+        return PlainTextResponse(
+            metrics.render(gauges), media_type="text/plain; version=0.0.4"
+        )
+
     @app.get("/favicon.ico")
     async def favicon():
         """Serve favicon."""
@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+Prepare a container image for fast cold starts.
+
+Builds the pre-seeded template database that new installs are copied from
+(TEMPLATE_DB_PATH) and compiles every template into the bytecode cache
+(TEMPLATE_CACHE_DIR). Run once at image build time; see the Dockerfile.
+"""
+
+import asyncio
+
+from koifit.db import init_database
+from koifit.settings import get_template_db_path
+from koifit.templates import compile_templates, templates
+
+
+async def main():
+    template_path = get_template_db_path()
+    if template_path is None:
+        raise SystemExit("TEMPLATE_DB_PATH is not set")
+    await init_database(template_path, overwrite=True)
+    print(f"Template database built at {template_path}")
+
+    count = compile_templates(templates)
+    print(f"Compiled {count} templates.")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+Rebuild the per-session exercise summaries from the logged sets.
+"""
+
+import asyncio
+
+import aiosqlite
+
+from koifit.db.migrate import apply_migrations
+from koifit.settings import get_db_path
+from koifit.summaries import rebuild_summaries
+
+
+async def main():
+    """
+    Recompute session_exercise_summary for every finished session.
+    """
+    db_path = get_db_path()
+    print(f"Rebuilding summaries in {db_path}")
+    async with aiosqlite.connect(str(db_path)) as db:
+        db.row_factory = aiosqlite.Row
+        await apply_migrations(db)
+        written = await rebuild_summaries(db)
+    print(f"Wrote {written} summaries.")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Restore the database from a snapshot written by backup_db.py or the app.
+"""
+
+import argparse
+from pathlib import Path
+
+from koifit.backup import list_snapshots, restore_snapshot
+from koifit.settings import get_backup_dir, get_db_path
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip())
+    parser.add_argument(
+        "snapshot",
+        nargs="?",
+        type=Path,
+        help="snapshot file (default: the newest in the backup directory)",
+    )
+    parser.add_argument(
+        "--list", action="store_true", help="list the snapshots and exit"
+    )
+    return parser.parse_args(argv)
+
+
+def main():
+    """
+    Replace the database with a snapshot.
+
+    Stop the app first. The database being replaced is kept next to it
+    with a .pre-restore suffix.
+    """
+    args = parse_args()
+    db_path = get_db_path()
+    snapshots = list_snapshots(get_backup_dir(db_path))
+    if args.list:
+        for path in snapshots:
+            print(path)
+        return
+
+    snapshot = args.snapshot or (snapshots[-1] if snapshots else None)
+    if snapshot is None:
+        raise SystemExit(f"No snapshots in {get_backup_dir(db_path)}")
+    print(f"Restoring {db_path} from {snapshot}")
+    previous = restore_snapshot(snapshot, db_path)
+    print(f"Done. The replaced database, if any, was kept as {previous}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+from array import array
+
+import pytest
+
+from benchmarks.common import add_years
+from koifit.analytics import (
+    SetColumns,
+    TrainingAnalytics,
+    load_analytics,
+    rolling_max,
+    workload_ratios,
+)
+
+
+def test_rolling_max_and_workload_ratios():
+    weekly = array("d", [100.0, 0.0, 0.0, 0.0, 0.0, 90.0])
+    assert list(rolling_max(weekly, 4)) == [100.0, 100.0, 100.0, 100.0, 0.0, 90.0]
+
+    volume = array("d", [1000.0, 1000.0, 1000.0, 1000.0, 2000.0, 0.0])
+    assert workload_ratios(volume) == [4.0, 2.0, 1.33, 1.0, 1.6, 0.0]
+    assert workload_ratios(array("d", [0.0, 500.0])) == [None, 4.0]
+
+
+def test_prs_are_tracked_per_rep_range():
+    # Week, exercise, weight, reps; all in one slot and session per week
+    sets = [
+        (0, 1, 100.0, 5),
+        (0, 1, 80.0, 10),
+        (1, 1, 105.0, 3),
+        (1, 1, 100.0, 5),
+        (2, 1, 85.0, 10),
+        (2, 2, 50.0, 8),
+    ]
+    weeks, exercises, weights, reps = zip(*sets)
+    columns = SetColumns(
+        session=array("q", weeks),
+        week=array("q", (w + 100 for w in weeks)),
+        slot=array("q", [1] * len(sets)),
+        exercise=array("q", exercises),
+        weight=array("d", weights),
+        reps=array("q", reps),
+    )
+    analytics = TrainingAnalytics.compute(columns)
+
+    assert analytics.session_count == 3
+    assert list(analytics.total_volume) == [1300.0, 815.0, 1250.0]
+    assert [pr[:5] for pr in analytics.prs] == [
+        (1, 1, 105.0, 3, 100.0),
+        (1, 3, 85.0, 10, 80.0),
+    ]
+    assert analytics.bests[(2, 2)] == (50.0, 8, 2)
+    # Epley: 100 x 5 beats 105 x 3
+    assert analytics.best_e1rm[1][1] == pytest.approx(100 * (1 + 5 / 30))
+
+
+@pytest.mark.anyio
+async def test_analytics_match_summaries(db_conn):
+    await add_years(db_conn, 1, sessions_per_week=3)
+    await db_conn.commit()
+    analytics = await load_analytics(db_conn)
+
+    cursor = await db_conn.execute(
+        """SELECT COUNT(DISTINCT s.id), SUM(st.weight_kg * st.reps)
+           FROM session s
+           JOIN session_exercise se ON se.session_id = s.id
+           JOIN set_entry st ON st.session_exercise_id = se.id
+           WHERE s.is_finished = 1 AND st.is_done = 1 AND st.is_drop = 0"""
+    )
+    sessions, volume = (await cursor.fetchall())[0]
+    assert analytics.session_count == sessions
+    assert sum(analytics.total_volume) == pytest.approx(volume)
+    assert 52 <= analytics.week_count <= 54
+
+
+@pytest.mark.anyio
+async def test_analytics_endpoints_refresh_on_finish(client, db_conn):
+    resp = await client.get("/analytics.json")
+    assert resp.status_code == 200
+    assert resp.json()["exercises"] == []
+    assert "No history yet" in (await client.get("/analytics")).text
+
+    resp = await client.post("/sessions/start/1", follow_redirects=False)
+    session_id = int(resp.headers["location"].rsplit("/", 1)[-1])
+    await client.get(f"/sessions/{session_id}")
+    cursor = await db_conn.execute(
+        "SELECT id, exercise_id FROM session_exercise WHERE session_id = ? ORDER BY id",
+        (session_id,),
+    )
+    se_id, exercise_id = (await cursor.fetchall())[0]
+    sets = [{"set_number": 1, "weight_kg": 100.0, "reps": 6, "is_done": 1}]
+    await client.post(
+        f"/sessions/{session_id}/save",
+        json={"exercises": [{"session_exercise_id": se_id, "sets": sets}]},
+    )
+    # Autosaves don't touch finished history, so the cached result stands
+    assert (await client.get("/analytics.json")).json()["exercises"] == []
+
+    await client.post(f"/sessions/{session_id}/finish")
+    data = (await client.get("/analytics.json?weeks=4")).json()
+    assert data["session_count"] == 1
+    assert len(data["weeks"]) == 1
+    exercise = data["exercises"][0]
+    assert exercise["exercise_id"] == exercise_id
+    assert exercise["weekly_volume"] == [600.0]
+    assert exercise["rolling_e1rm"] == [120.0]
+    assert exercise["bests"] == [
+        {"rep_range": "6-8", "weight_kg": 100.0, "reps": 6, "week": data["weeks"][0]}
+    ]
+
+    page = await client.get("/analytics")
+    assert exercise["name"] in page.text
+
+
+@pytest.mark.anyio
+async def test_pr_limit_caps_the_report(client, db_conn):
+    await add_years(db_conn, 1, sessions_per_week=3)
+    await db_conn.commit()
+
+    assert (await client.get("/analytics.json?prs=0")).json()["prs"] == []
+    assert len((await client.get("/analytics.json?prs=2")).json()["prs"]) == 2
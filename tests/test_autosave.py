@@ -0,0 +1,321 @@
+import aiosqlite
+import pytest
+
+from koifit import autosave
+from koifit.autosave import (
+    StaleRevision,
+    save_exercise_data,
+    save_session_changes,
+    write_changes,
+)
+from koifit.db.pool import configure_connection
+from koifit.models import SaveExerciseRequest
+
+
+async def _session_exercise(db_conn) -> tuple[int, int]:
+    cursor = await db_conn.execute(
+        "INSERT INTO session (day_id, date, is_finished) VALUES (1, '2030-01-01', 0)"
+    )
+    session_id = cursor.lastrowid
+    cursor = await db_conn.execute(
+        """INSERT INTO session_exercise (session_id, slot_id, exercise_id, dropset_done)
+           VALUES (?, 1, 1, 0)""",
+        (session_id,),
+    )
+    await db_conn.commit()
+    return session_id, cursor.lastrowid
+
+
+def _payload(weight: float) -> SaveExerciseRequest:
+    return SaveExerciseRequest(
+        notes="Stay tight",
+        sets=[
+            {"set_number": 1, "weight_kg": weight, "reps": 5, "is_done": 1},
+            {"set_number": 2, "weight_kg": weight, "reps": 5, "is_done": 0},
+        ],
+    )
+
+
+@pytest.mark.anyio
+async def test_unchanged_payload_skips_write(db_conn):
+    session_id, se_id = await _session_exercise(db_conn)
+
+    assert await save_exercise_data(db_conn, session_id, se_id, _payload(100.0))
+    changes_before = db_conn.total_changes
+    assert not await save_exercise_data(db_conn, session_id, se_id, _payload(100.0))
+    assert db_conn.total_changes == changes_before
+
+
+@pytest.mark.anyio
+async def test_changed_sets_are_upserted_in_one_commit(db_conn):
+    session_id, se_id = await _session_exercise(db_conn)
+    await save_exercise_data(db_conn, session_id, se_id, _payload(100.0))
+
+    commits = []
+    await db_conn.set_trace_callback(
+        lambda sql: commits.append(sql) if sql.upper().startswith("COMMIT") else None
+    )
+    assert await save_exercise_data(db_conn, session_id, se_id, _payload(102.5))
+    await db_conn.set_trace_callback(None)
+    assert len(commits) == 1
+
+    cursor = await db_conn.execute(
+        "SELECT weight_kg FROM set_entry WHERE session_exercise_id = ? ORDER BY set_number",
+        (se_id,),
+    )
+    assert [row["weight_kg"] for row in await cursor.fetchall()] == [102.5, 102.5]
+
+
+@pytest.mark.anyio
+async def test_unknown_session_exercise_returns_none(db_conn):
+    session_id, se_id = await _session_exercise(db_conn)
+    assert await save_exercise_data(db_conn, session_id + 1, se_id, _payload(1)) is None
+
+
+async def _started_session(client, db_conn) -> tuple[int, list[int]]:
+    resp = await client.post("/sessions/start/1", follow_redirects=False)
+    session_id = int(resp.headers["location"].rsplit("/", 1)[-1])
+    await client.get(f"/sessions/{session_id}")
+    cursor = await db_conn.execute(
+        "SELECT id FROM session_exercise WHERE session_id = ? ORDER BY id",
+        (session_id,),
+    )
+    return session_id, [row["id"] for row in await cursor.fetchall()]
+
+
+@pytest.mark.anyio
+async def test_batch_save_applies_all_exercises(client, db_conn):
+    session_id, se_ids = await _started_session(client, db_conn)
+    set_1 = {"set_number": 1, "weight_kg": 60.0, "reps": 10, "is_done": 1}
+    set_2 = {"set_number": 2, "weight_kg": 55.0, "reps": 12, "is_done": 0}
+    payload = {
+        "exercises": [
+            {"session_exercise_id": se_ids[0], "sets": [set_1]},
+            {"session_exercise_id": se_ids[1], "notes": "Go up", "sets": [set_1]},
+            # A later entry for the same exercise is merged over the first
+            {"session_exercise_id": se_ids[0], "sets": [set_2]},
+        ]
+    }
+
+    resp = await client.post(f"/sessions/{session_id}/save", json=payload)
+    assert resp.status_code == 200
+    assert resp.json() == {
+        "status": "ok",
+        "saved": 2,
+        "revisions": {str(se_ids[0]): 1, str(se_ids[1]): 1},
+    }
+
+    cursor = await db_conn.execute(
+        """SELECT session_exercise_id, set_number FROM set_entry
+           ORDER BY session_exercise_id, set_number"""
+    )
+    rows = [tuple(row) for row in await cursor.fetchall()]
+    assert rows == [(se_ids[0], 1), (se_ids[0], 2), (se_ids[1], 1)]
+
+
+@pytest.mark.anyio
+async def test_batch_save_is_atomic(client, db_conn):
+    session_id, se_ids = await _started_session(client, db_conn)
+    payload = {
+        "exercises": [
+            {"session_exercise_id": se_ids[0], "notes": "Should not persist"},
+            {"session_exercise_id": 9999, "notes": "Unknown"},
+        ]
+    }
+
+    resp = await client.post(f"/sessions/{session_id}/save", json=payload)
+    assert resp.status_code == 404
+
+    cursor = await db_conn.execute(
+        "SELECT next_time_note FROM session_exercise WHERE id = ?", (se_ids[0],)
+    )
+    assert (await cursor.fetchone())["next_time_note"] is None
+
+
+@pytest.mark.anyio
+async def test_replayed_batch_is_applied_once(client, db_conn):
+    session_id, se_ids = await _started_session(client, db_conn)
+
+    def batch(notes):
+        return {"exercises": [{"session_exercise_id": se_ids[0], "notes": notes}]}
+
+    url = f"/sessions/{session_id}/save"
+    resp = await client.post(url, json=batch("First"), headers={"Idempotency-Key": "a"})
+    assert resp.json() == {"status": "ok", "saved": 1, "revisions": {str(se_ids[0]): 1}}
+    await client.post(url, json=batch("Second"), headers={"Idempotency-Key": "b"})
+
+    # A late retry of the first batch must not overwrite the newer save
+    resp = await client.post(url, json=batch("First"), headers={"Idempotency-Key": "a"})
+    assert resp.json() == {"status": "ok", "saved": 1, "revisions": {str(se_ids[0]): 1}}
+
+    cursor = await db_conn.execute(
+        "SELECT next_time_note FROM session_exercise WHERE id = ?", (se_ids[0],)
+    )
+    assert (await cursor.fetchone())["next_time_note"] == "Second"
+
+
+@pytest.mark.anyio
+async def test_stale_changes_conflict_and_the_rest_is_applied(client, db_conn):
+    session_id, se_ids = await _started_session(client, db_conn)
+    url = f"/sessions/{session_id}/save"
+
+    def batch(*sets, **fields):
+        exercise = {"session_exercise_id": se_ids[0], "sets": list(sets), **fields}
+        return {"exercises": [exercise]}
+
+    def set_entry(set_number, weight, revision):
+        return {
+            "set_number": set_number,
+            "weight_kg": weight,
+            "reps": 5,
+            "is_done": 1,
+            "revision": revision,
+        }
+
+    resp = await client.post(url, json=batch(set_entry(1, 60.0, 0)))
+    assert resp.json()["revisions"] == {str(se_ids[0]): 1}
+
+    # Another device, still at revision 0, edits set 1 and adds set 2
+    stale = batch(set_entry(1, 50.0, 0), set_entry(2, 50.0, 0), notes="Slow")
+    resp = await client.post(url, json=stale, headers={"Idempotency-Key": "k"})
+    assert resp.status_code == 409
+    expected = {
+        "status": "conflict",
+        "saved": 1,
+        "revisions": {str(se_ids[0]): 2},
+        "conflicts": [
+            {"session_exercise_id": se_ids[0], "sets": [set_entry(1, 60.0, 1)]}
+        ],
+    }
+    assert resp.json() == expected
+
+    # A retry gets the recorded response back
+    resp = await client.post(url, json=stale, headers={"Idempotency-Key": "k"})
+    assert (resp.status_code, resp.json()) == (409, expected)
+
+    # Without a revision, a change is written whatever was saved before
+    legacy = {"set_number": 1, "weight_kg": 55.0, "reps": 5, "is_done": 1}
+    resp = await client.post(url, json=batch(legacy, notes="Fast"))
+    assert resp.status_code == 200
+
+    cursor = await db_conn.execute(
+        """SELECT set_number, weight_kg, revision FROM set_entry
+           WHERE session_exercise_id = ? ORDER BY set_number""",
+        (se_ids[0],),
+    )
+    assert [tuple(row) for row in await cursor.fetchall()] == [
+        (1, 55.0, 3),
+        (2, 50.0, 2),
+    ]
+    cursor = await db_conn.execute(
+        "SELECT next_time_note, revision, fields_revision FROM session_exercise WHERE id = ?",
+        (se_ids[0],),
+    )
+    assert tuple(await cursor.fetchone()) == ("Fast", 3, 3)
+
+    # Fields edited from revision 2 now conflict as a group
+    exercise_url = f"/sessions/{session_id}/exercises/{se_ids[0]}/save"
+    resp = await client.post(
+        exercise_url, json={"dropset_done": 1, "fields_revision": 2}
+    )
+    assert resp.status_code == 409
+    assert resp.json()["conflict"] == {
+        "session_exercise_id": se_ids[0],
+        "dropset_done": 0,
+        "fields_revision": 3,
+        "sets": [],
+    }
+
+
+@pytest.mark.anyio
+async def test_writes_check_the_revision_they_read(db_conn):
+    session_id, se_id = await _session_exercise(db_conn)
+    await save_exercise_data(db_conn, session_id, se_id, _payload(100.0))
+
+    # Another process saved in between: nothing is written
+    with pytest.raises(StaleRevision):
+        await write_changes(db_conn, se_id, {"next_time_note": "Late"}, [], 2, 0)
+    await db_conn.rollback()
+    cursor = await db_conn.execute(
+        "SELECT next_time_note, revision FROM session_exercise WHERE id = ?", (se_id,)
+    )
+    assert tuple(await cursor.fetchone()) == ("Stay tight", 1)
+
+
+@pytest.mark.anyio
+async def test_saves_after_finish_are_rejected(client, db_conn):
+    session_id, se_ids = await _started_session(client, db_conn)
+    url = f"/sessions/{session_id}/save"
+
+    def batch(weight):
+        sets = [{"set_number": 1, "weight_kg": weight, "reps": 5, "is_done": 1}]
+        return {"exercises": [{"session_exercise_id": se_ids[0], "sets": sets}]}
+
+    await client.post(url, json=batch(60.0), headers={"Idempotency-Key": "a"})
+    await client.post(f"/sessions/{session_id}/finish")
+
+    # An outbox replaying a batch queued before the finish
+    resp = await client.post(url, json=batch(70.0), headers={"Idempotency-Key": "b"})
+    assert resp.status_code == 409
+    assert resp.json() == {
+        "status": "finished",
+        "saved": 0,
+        "revisions": {},
+        "conflicts": [],
+    }
+
+    cursor = await db_conn.execute(
+        "SELECT weight_kg, revision FROM set_entry WHERE session_exercise_id = ?",
+        (se_ids[0],),
+    )
+    assert tuple(await cursor.fetchone()) == (60.0, 1)
+
+
+@pytest.mark.anyio
+async def test_retries_running_out_answer_with_a_conflict(client, db_conn, monkeypatch):
+    session_id, se_ids = await _started_session(client, db_conn)
+    url = f"/sessions/{session_id}/exercises/{se_ids[0]}/save"
+    stored = {"set_number": 1, "weight_kg": 60.0, "reps": 5, "is_done": 1}
+    await client.post(url, json={"sets": [stored]})
+
+    async def always_stale(db, session_exercise_id, *args):
+        raise StaleRevision(session_exercise_id)
+
+    # Another worker process writes the exercise before every attempt
+    monkeypatch.setattr(autosave, "write_changes", always_stale)
+    resp = await client.post(url, json={"sets": [dict(stored, weight_kg=70.0)]})
+    assert resp.status_code == 409
+    assert resp.json() == {
+        "status": "conflict",
+        "conflict": {
+            "session_exercise_id": se_ids[0],
+            "sets": [dict(stored, revision=1)],
+        },
+    }
+
+
+@pytest.mark.anyio
+async def test_concurrent_replays_of_a_key_are_applied_once(
+    db_path, db_conn, monkeypatch
+):
+    session_id, se_id = await _session_exercise(db_conn)
+    first = await save_session_changes(
+        db_conn, session_id, {se_id: _payload(100.0)}, "k"
+    )
+
+    load_receipt = autosave._load_receipt
+    lookups = []
+
+    async def missed_once(db, key):
+        # The second worker looked before the first one committed
+        lookups.append(key)
+        return None if len(lookups) == 1 else await load_receipt(db, key)
+
+    monkeypatch.setattr(autosave, "_load_receipt", missed_once)
+    async with aiosqlite.connect(str(db_path)) as other:
+        await configure_connection(other)
+        second = await save_session_changes(
+            other, session_id, {se_id: _payload(100.0)}, "k"
+        )
+        assert not other.in_transaction
+    assert second == (first[0], [])
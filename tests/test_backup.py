@@ -0,0 +1,71 @@
+import asyncio
+import gzip
+import sqlite3
+
+import pytest
+
+from koifit.backup import (
+    backup_database,
+    create_backup,
+    list_snapshots,
+    prune_snapshots,
+    restore_snapshot,
+)
+
+
+def _count_sessions(path):
+    with sqlite3.connect(path) as db:
+        return db.execute("SELECT COUNT(*) FROM session").fetchone()[0]
+
+
+@pytest.mark.anyio
+async def test_backup_runs_alongside_writes_and_restores(client, db_path, tmp_path):
+    backup_dir = tmp_path / "backups"
+    await client.post("/sessions/start/1")
+
+    # One page per step: the copy spans many commits, none of which restart it
+    backup = asyncio.create_task(
+        create_backup(db_path, backup_dir, keep=5, pages=1, pause=0.001)
+    )
+    while not backup.done():
+        resp = await client.post("/sessions/start/2")
+        assert resp.status_code < 400
+        await asyncio.sleep(0.001)
+    report = await backup
+
+    assert report["steps"] > 1
+    (snapshot,) = list_snapshots(backup_dir)
+    assert str(snapshot) == report["snapshot"]
+    raw = tmp_path / "snapshot.sqlite"
+    raw.write_bytes(gzip.decompress(snapshot.read_bytes()))
+    assert _count_sessions(raw) >= 1
+
+    # The live database (and its WAL) is set aside, never replayed into the restore
+    await client.post("/sessions/start/3")
+    restored_path = tmp_path / "restored" / "test.sqlite"
+    restored_path.parent.mkdir()
+    restored_path.write_bytes(db_path.read_bytes())
+    restored_path.with_name("test.sqlite-wal").write_bytes(b"stale")
+    previous = restore_snapshot(snapshot, restored_path)
+    assert previous.exists()
+    assert previous.with_name("test.sqlite.pre-restore-wal").exists()
+    assert _count_sessions(restored_path) == _count_sessions(raw)
+
+
+@pytest.mark.anyio
+async def test_backups_are_skipped_when_recent_and_pruned(db_path, tmp_path):
+    backup_dir = tmp_path / "backups"
+    backup_dir.mkdir()
+    for n in range(3):
+        (backup_dir / f"koifit-2026010{n + 1}-030000.sqlite.gz").write_bytes(b"")
+
+    report = backup_database(db_path, backup_dir)
+    assert report is not None
+    assert backup_database(db_path, backup_dir, min_age=3600) is None
+
+    expired = prune_snapshots(backup_dir, keep=2)
+    assert [path.name for path in expired] == [
+        "koifit-20260101-030000.sqlite.gz",
+        "koifit-20260102-030000.sqlite.gz",
+    ]
+    assert str(list_snapshots(backup_dir)[-1]) == report["snapshot"]
@@ -0,0 +1,76 @@
+import pytest
+
+from koifit.routes.sessions import EAGER_CARDS
+
+
+async def _session_exercise_ids(db_conn, session_id):
+    cursor = await db_conn.execute(
+        """SELECT se.id FROM session_exercise se JOIN slot sl ON sl.id = se.slot_id
+           WHERE se.session_id = ? ORDER BY sl.ordinal""",
+        (session_id,),
+    )
+    return [row[0] for row in await cursor.fetchall()]
+
+
+async def _open_session(client, db_conn, day_id=1):
+    resp = await client.post(f"/sessions/start/{day_id}", follow_redirects=False)
+    session_url = resp.headers["location"]
+    page = await client.get(session_url)
+    assert page.status_code == 200
+    session_id = int(session_url.rsplit("/", 1)[-1])
+    return session_url, page.text, await _session_exercise_ids(db_conn, session_id)
+
+
+@pytest.mark.anyio
+async def test_cards_past_the_first_few_are_fetched_as_fragments(client, db_conn):
+    session_url, page, se_ids = await _open_session(client, db_conn)
+    assert len(se_ids) > EAGER_CARDS
+    assert page.count('class="exercise-card card"') == EAGER_CARDS
+    assert page.count('class="exercise-card-placeholder card"') == (
+        len(se_ids) - EAGER_CARDS
+    )
+
+    lazy_id = se_ids[EAGER_CARDS]
+    await client.post(
+        f"{session_url}/exercises/{lazy_id}/save",
+        json={"sets": [{"set_number": 1, "weight_kg": 42.5, "reps": 9, "is_done": 1}]},
+    )
+    resp = await client.get(f"{session_url}/exercises/{lazy_id}/card")
+    assert resp.status_code == 200
+    assert resp.text.strip().startswith(
+        f'<div class="exercise-card card" data-session-exercise-id="{lazy_id}"'
+    )
+    assert 'value="42.5"' in resp.text
+    assert "exercise-card__header" in resp.text
+
+
+@pytest.mark.anyio
+async def test_fragments_are_scoped_to_their_session(client, db_conn):
+    session_url, _, se_ids = await _open_session(client, db_conn)
+
+    # No previous session yet, so no panel
+    resp = await client.get(f"{session_url}/exercises/{se_ids[0]}/card")
+    assert "exercise-card__previous" not in resp.text
+    resp = await client.get(f"{session_url}/exercises/{se_ids[0]}/previous")
+    assert "No previous session" in resp.text
+
+    await client.post(
+        f"{session_url}/exercises/{se_ids[0]}/save",
+        json={
+            "notes": "Pause at the bottom",
+            "sets": [{"set_number": 1, "weight_kg": 80, "reps": 6, "is_done": 1}],
+        },
+    )
+    await client.post(f"{session_url}/finish")
+
+    next_url, page, next_ids = await _open_session(client, db_conn)
+    assert f'data-previous-url="{next_url}/exercises/{next_ids[0]}/previous"' in page
+    resp = await client.get(f"{next_url}/exercises/{next_ids[0]}/previous")
+    assert resp.status_code == 200
+    assert "80 kg × 6" in resp.text
+    assert "Pause at the bottom" in resp.text
+
+    # A session_exercise of another session is not found through this one
+    for fragment in ("card", "previous"):
+        resp = await client.get(f"{next_url}/exercises/{se_ids[0]}/{fragment}")
+        assert resp.status_code == 404
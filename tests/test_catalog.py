@@ -0,0 +1,44 @@
+import pytest
+
+from koifit.catalog import ProgramCatalog
+
+
+@pytest.mark.anyio
+async def test_catalog_lookups_and_counters(db_conn):
+    catalog = ProgramCatalog()
+    await catalog.reload(db_conn)
+
+    day = catalog.ordered_days()[0]
+    slots = catalog.slots_for_day(day.id)
+    assert slots
+    assert [s.ordinal for s in slots] == sorted(s.ordinal for s in slots)
+    assert catalog.slot(str(slots[0].id)) is slots[0]
+    assert (
+        slots[0].exercise_name == catalog.exercise(slots[0].preferred_exercise_id).name
+    )
+    assert catalog.day(999) is None
+
+    stats = catalog.stats()
+    assert stats["reloads"] == 1
+    assert stats["hits"] == 4
+    assert stats["misses"] == 1
+
+
+@pytest.mark.anyio
+async def test_reload_picks_up_program_edits(client, db_conn):
+    resp = await client.get("/days")
+    assert "Renamed day" not in resp.text
+
+    await db_conn.execute("UPDATE day SET label = 'Renamed day' WHERE id = 1")
+    await db_conn.commit()
+
+    # Served from memory until reloaded
+    resp = await client.get("/days")
+    assert "Renamed day" not in resp.text
+
+    resp = await client.post("/program/reload")
+    assert resp.status_code == 200
+    assert resp.json()["reloads"] == 2
+
+    resp = await client.get("/days")
+    assert "Renamed day" in resp.text
@@ -0,0 +1,187 @@
+import csv
+import io
+import json
+
+import pytest
+
+from benchmarks.common import add_years
+from koifit.db import DatabasePool
+from koifit.export import stream_export
+from koifit.importer import import_history, read_export
+from koifit.summaries import rebuild_summaries
+
+
+@pytest.fixture
+async def history_pool(db_path, db_conn):
+    await add_years(db_conn, 1, sessions_per_week=2)
+    await rebuild_summaries(db_conn)
+    pool = DatabasePool(db_path, readers=1)
+    await pool.open()
+    yield pool
+    await pool.close()
+
+
+async def _counts(pool):
+    async with pool.reader() as db:
+        cursor = await db.execute(
+            """SELECT (SELECT COUNT(*) FROM session),
+                      (SELECT COUNT(*) FROM session_exercise),
+                      (SELECT COUNT(*) FROM set_entry),
+                      (SELECT COUNT(*) FROM session_exercise_summary)"""
+        )
+        return tuple((await cursor.fetchall())[0])
+
+
+@pytest.mark.anyio
+async def test_export_streams_in_chunks(history_pool):
+    chunks = [
+        chunk
+        async for chunk in stream_export(
+            history_pool.reader, ["set_entry"], "csv", chunk_size=50
+        )
+    ]
+    rows = list(csv.reader(io.StringIO("".join(chunks))))
+    assert rows[0] == [
+        "id",
+        "session_exercise_id",
+        "set_number",
+        "weight_kg",
+        "reps",
+        "is_done",
+        "is_drop",
+    ]
+    sessions, _, sets, _ = await _counts(history_pool)
+    assert len(rows) - 1 == sets
+    # chunk_size counts sessions
+    assert len(chunks) == -(-sessions // 50)
+
+
+@pytest.mark.anyio
+async def test_export_endpoints(client):
+    await client.post("/sessions/start/1")
+
+    resp = await client.get("/export/history.jsonl")
+    assert resp.status_code == 200
+    assert "history.jsonl" in resp.headers["content-disposition"]
+    tables = [json.loads(line)["table"] for line in resp.text.splitlines()]
+    assert tables[0] == "session"
+    assert tables == sorted(
+        tables, key=["session", "session_exercise", "set_entry"].index
+    )
+
+    resp = await client.get("/export/session.csv")
+    assert resp.headers["content-type"].startswith("text/csv")
+    assert resp.text.splitlines()[0] == "id,day_id,date,is_finished"
+
+    assert (await client.get("/export/history.csv")).status_code == 404
+    assert (await client.get("/export/day.jsonl")).status_code == 404
+
+
+@pytest.mark.anyio
+async def test_import_round_trip(history_pool, tmp_path):
+    for fmt in ("jsonl", "csv"):
+        tables = ["session", "session_exercise", "set_entry"]
+        paths = []
+        for name, export_tables in (
+            [("history", tables)] if fmt == "jsonl" else [(t, [t]) for t in tables]
+        ):
+            path = tmp_path / f"{name}.{fmt}"
+            chunks = stream_export(history_pool.reader, export_tables, fmt)
+            path.write_text("".join([chunk async for chunk in chunks]))
+            paths.append(path)
+
+        before = await _counts(history_pool)
+        counts = await import_history(
+            history_pool.writer, read_export(paths), chunk_size=100
+        )
+        after = await _counts(history_pool)
+        # Each import appends a copy of what was there before it
+        assert after == tuple(2 * n for n in before)
+        assert counts["session"] == before[0]
+        assert counts["summaries"] == before[3]
+
+
+@pytest.mark.anyio
+async def test_import_rejects_unknown_references(history_pool):
+    rows = [
+        ("session", {"id": 1, "day_id": 1, "date": "2024-01-01", "is_finished": 1}),
+        (
+            "session_exercise",
+            {
+                "id": 1,
+                "session_id": 2,
+                "slot_id": 1,
+                "exercise_id": 1,
+                "effort_tag": None,
+                "next_time_note": None,
+                "dropset_done": 0,
+            },
+        ),
+    ]
+    with pytest.raises(ValueError, match="not an imported session"):
+        await import_history(history_pool.writer, iter(rows))
+
+    bad_day = [("session", {"id": 1, "day_id": 99, "date": "x", "is_finished": 0})]
+    with pytest.raises(ValueError, match="day_id 99 does not exist"):
+        await import_history(history_pool.writer, iter(bad_day))
+
+
+@pytest.mark.anyio
+async def test_import_rebuilds_only_the_targets_it_touched(history_pool):
+    async with history_pool.writer() as db:
+        cursor = await db.execute(
+            """SELECT id, day_id, preferred_exercise_id, rep_target FROM slot
+               ORDER BY id LIMIT 2"""
+        )
+        (slot_id, day_id, exercise_id, _), (other_slot, *_) = await cursor.fetchall()
+        # Stands in for a target the import has nothing to do with
+        await db.execute(
+            """INSERT OR REPLACE INTO progression_target
+               (slot_id, exercise_id, session_id, weight_kg, reps, reason)
+               VALUES (?, 1, 1, 1.0, 1, 'kept')""",
+            (other_slot,),
+        )
+        await db.commit()
+
+    rows = [
+        (
+            "session",
+            {"id": 1, "day_id": day_id, "date": "2099-01-01", "is_finished": 1},
+        ),
+        (
+            "session_exercise",
+            {
+                "id": 1,
+                "session_id": 1,
+                "slot_id": slot_id,
+                "exercise_id": exercise_id,
+                "effort_tag": "increase",
+                "next_time_note": None,
+                "dropset_done": 0,
+            },
+        ),
+        (
+            "set_entry",
+            {
+                "id": 1,
+                "session_exercise_id": 1,
+                "set_number": 1,
+                "weight_kg": 500.0,
+                "reps": 5,
+                "is_done": 1,
+                "is_drop": 0,
+            },
+        ),
+    ]
+    counts = await import_history(history_pool.writer, iter(rows))
+    assert counts["targets"] == 1
+
+    async with history_pool.reader() as db:
+        cursor = await db.execute(
+            "SELECT slot_id, weight_kg, reason FROM progression_target"
+            " WHERE slot_id IN (?, ?) ORDER BY slot_id",
+            (slot_id, other_slot),
+        )
+        targets = {row[0]: tuple(row[1:]) for row in await cursor.fetchall()}
+    assert targets[slot_id][0] > 500.0
+    assert targets[other_slot] == (1.0, "kept")
@@ -0,0 +1,67 @@
+import pytest
+
+from benchmarks.common import add_day, add_history
+from koifit.downsample import lttb
+from koifit.summaries import rebuild_summaries
+
+
+@pytest.fixture
+async def slot_id(client, db_conn) -> int:
+    """A one-slot day with 30 finished sessions from 2015-01-01 onward."""
+    day_id = await add_day(db_conn, 1)
+    await add_history(db_conn, day_id, 30)
+    await rebuild_summaries(db_conn)
+    # The running app only sees the new day after a program reload
+    await client.post("/program/reload")
+    cursor = await db_conn.execute("SELECT id FROM slot WHERE day_id = ?", (day_id,))
+    return (await cursor.fetchone())["id"]
+
+
+def test_lttb_keeps_endpoints_and_peaks():
+    points = [(x, 1.0) for x in range(100)]
+    points[50] = (50, 99.0)
+
+    sampled = lttb(points, 10)
+
+    assert len(sampled) == 10
+    assert sampled[0] == points[0]
+    assert sampled[-1] == points[-1]
+    assert (50, 99.0) in sampled
+
+
+@pytest.mark.anyio
+async def test_history_json_pages_with_keyset_cursor(client, slot_id):
+    seen = []
+    params = {"limit": 12}
+    while True:
+        resp = await client.get(f"/slots/{slot_id}/history.json", params=params)
+        assert resp.status_code == 200
+        body = resp.json()
+        seen.extend(s["date"] for s in body["sessions"])
+        if body["next_cursor"] is None:
+            break
+        params["after"] = body["next_cursor"]
+
+    assert len(seen) == 30
+    assert seen == sorted(seen, reverse=True)
+
+
+@pytest.mark.anyio
+async def test_history_json_filters_dates_and_downsamples(client, slot_id):
+    resp = await client.get(
+        f"/slots/{slot_id}/history.json",
+        params={"start": "2015-01-05", "end": "2015-01-24", "points": 5},
+    )
+    body = resp.json()
+
+    assert [s["date"] for s in body["sessions"]][::19] == ["2015-01-24", "2015-01-05"]
+    assert len(body["sessions"]) == 20
+    assert len(body["series"]["1rm"]) == 5
+    assert len(body["series"]["volume"]) == 5
+    assert body["series"]["1rm"][0]["date"] == "2015-01-05"
+
+
+@pytest.mark.anyio
+async def test_history_json_rejects_bad_cursor(client, slot_id):
+    resp = await client.get(f"/slots/{slot_id}/history.json?after=nope")
+    assert resp.status_code == 400
@@ -0,0 +1,112 @@
+import re
+
+import pytest
+from asgi_lifespan import LifespanManager
+from httpx import ASGITransport, AsyncClient
+
+from main import create_app
+
+
+@pytest.mark.anyio
+async def test_fingerprinted_assets_are_immutable_and_precompressed(client):
+    resp = await client.get("/days")
+    url = re.search(r'href="(/assets/stylesheets/base\.\w+\.css)"', resp.text).group(1)
+
+    resp = await client.get(url, headers={"Accept-Encoding": "gzip"})
+    assert resp.status_code == 200
+    assert "immutable" in resp.headers["cache-control"]
+    assert resp.headers["content-encoding"] == "gzip"
+    assert resp.headers["content-type"].startswith("text/css")
+
+    resp = await client.get(url, headers={"If-None-Match": resp.headers["etag"]})
+    assert resp.status_code == 304
+
+    # Plain URLs keep working but must be revalidated
+    resp = await client.get("/assets/sw.js")
+    assert resp.status_code == 200
+    assert resp.headers["cache-control"] == "no-cache"
+
+    resp = await client.get("/assets/missing.css")
+    assert resp.status_code == 404
+
+
+@pytest.mark.anyio
+async def test_import_map_points_modules_at_fingerprinted_urls(client):
+    resp = await client.get("/days")
+    assert re.search(
+        r'"/assets/javascripts/auto-save\.js": "/assets/javascripts/auto-save\.\w+\.js"',
+        resp.text,
+    )
+
+
+@pytest.mark.anyio
+async def test_days_page_revalidates_until_data_changes(client):
+    resp = await client.get("/days")
+    etag = resp.headers["etag"]
+    assert resp.headers["last-modified"]
+
+    resp = await client.get("/days", headers={"If-None-Match": etag})
+    assert resp.status_code == 304
+    assert resp.text == ""
+
+    await client.post("/sessions/start/1")
+
+    resp = await client.get("/days", headers={"If-None-Match": etag})
+    assert resp.status_code == 200
+    assert resp.headers["etag"] != etag
+
+
+async def _get_days(db_path, headers=None):
+    app = create_app(db_path=db_path)
+    async with LifespanManager(app):
+        transport = ASGITransport(app=app)
+        async with AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get("/days", headers=headers)
+
+
+@pytest.mark.anyio
+async def test_etag_changes_across_restarts(db_path, db_conn):
+    etag = (await _get_days(db_path)).headers["etag"]
+
+    # Written while the app was down, e.g. by import_history.py
+    await db_conn.execute(
+        "INSERT INTO session (day_id, date, is_finished) VALUES (1, '2030-01-01', 0)"
+    )
+    await db_conn.commit()
+
+    resp = await _get_days(db_path, {"If-None-Match": etag})
+    assert resp.status_code == 200
+    assert resp.headers["etag"] != etag
+
+
+@pytest.mark.anyio
+async def test_history_json_etag_depends_on_query(client):
+    resp = await client.get("/slots/1/history.json?limit=5")
+    etag = resp.headers["etag"]
+
+    resp = await client.get(
+        "/slots/1/history.json?limit=5", headers={"If-None-Match": etag}
+    )
+    assert resp.status_code == 304
+
+    resp = await client.get(
+        "/slots/1/history.json?limit=6", headers={"If-None-Match": etag}
+    )
+    assert resp.status_code == 200
+
+    resp = await client.get(
+        "/slots/1/history",
+        headers={"If-Modified-Since": "Fri, 01 Jan 2100 00:00:00 GMT"},
+    )
+    assert resp.status_code == 304
+
+
+@pytest.mark.anyio
+async def test_service_worker_precaches_fingerprinted_shell(client):
+    resp = await client.get("/sw.js")
+    assert resp.status_code == 200
+    assert resp.headers["cache-control"] == "no-cache"
+    assert resp.headers["content-type"].startswith("text/javascript")
+    assert re.search(
+        r"self\.PRECACHE_URLS = \[.*/assets/stylesheets/base\.\w+\.css", resp.text
+    )
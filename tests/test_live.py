@@ -0,0 +1,118 @@
+import json
+
+import pytest
+from asgi_lifespan import LifespanManager
+from httpx import ASGITransport, AsyncClient
+
+from koifit.live import QUEUE_SIZE, RESYNC, SessionHub, stream_events
+from main import create_app
+
+
+@pytest.fixture
+async def app(db_path):
+    app = create_app(db_path=db_path)
+    async with LifespanManager(app):
+        yield app
+
+
+@pytest.fixture
+async def app_client(app):
+    transport = ASGITransport(app=app, raise_app_exceptions=True)
+    async with AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
+
+
+def _drain(subscriber):
+    events = []
+    while not subscriber.queue.empty():
+        events.append(subscriber.queue.get_nowait())
+    return events
+
+
+def _parse(event):
+    name, data = event.decode().strip().split("\n")
+    return name.removeprefix("event: "), json.loads(data.removeprefix("data: "))
+
+
+@pytest.mark.anyio
+async def test_slow_subscriber_is_bounded_and_told_to_resync():
+    hub = SessionHub()
+    slow = hub.subscribe(1)
+    for n in range(QUEUE_SIZE + 10):
+        hub.publish(1, "changes", {"n": n})
+
+    assert hub.dropped == 1
+
+    # The backlog is replaced by a resync, after which the stream ends
+    chunks = [chunk async for chunk in stream_events(hub, slow)]
+    assert chunks[1:] == [RESYNC]
+    assert len(hub) == 0
+
+
+@pytest.mark.anyio
+async def test_events_skip_their_origin_and_end_with_the_session():
+    hub = SessionHub()
+    phone = hub.subscribe(1, "phone")
+    tablet = hub.subscribe(1, "tablet")
+    other = hub.subscribe(2, "phone")
+
+    hub.publish(1, "changes", {"n": 1}, origin="phone")
+    assert _drain(phone) == []
+    assert [_parse(e) for e in _drain(tablet)] == [("changes", {"n": 1})]
+
+    # Ending drops whatever is still queued: the pages are leaving
+    hub.publish(1, "changes", {"n": 2})
+    hub.end_session(1, "finished", {"redirect": "/"})
+    for subscriber in (phone, tablet):
+        event, end = _drain(subscriber)
+        assert (_parse(event)[0], end) == ("finished", None)
+    assert _drain(other) == []
+
+
+@pytest.mark.anyio
+async def test_saves_are_pushed_to_other_pages(app, app_client):
+    resp = await app_client.post("/sessions/start/1", follow_redirects=False)
+    session_url = resp.headers["location"]
+    session_id = int(session_url.rsplit("/", 1)[-1])
+    await app_client.get(session_url)
+    async with app.state.pool.reader() as db:
+        cursor = await db.execute(
+            "SELECT id FROM session_exercise WHERE session_id = ? ORDER BY id",
+            (session_id,),
+        )
+        se_id = (await cursor.fetchall())[0][0]
+
+    hub = app.state.live
+    phone = hub.subscribe(session_id, "phone")
+    tablet = hub.subscribe(session_id, "tablet")
+    sets = [
+        {"set_number": 1, "weight_kg": 60, "reps": 8, "is_done": 1},
+        {"set_number": 2, "weight_kg": 60, "reps": 0, "is_done": 0},
+    ]
+    payload = {"exercises": [{"session_exercise_id": se_id, "sets": sets}]}
+    resp = await app_client.post(
+        f"{session_url}/save", json=payload, headers={"X-Client-Id": "phone"}
+    )
+    assert resp.status_code == 200
+    # Pushed sets carry the revision the save gave them
+    first_sets = [dict(s, revision=1) for s in sets]
+
+    # Only set 2 changes the second time, and only it is pushed
+    sets[1]["reps"] = 7
+    await app_client.post(
+        f"{session_url}/save", json=payload, headers={"X-Client-Id": "phone"}
+    )
+
+    assert _drain(phone) == []
+    first, second = (_parse(event) for event in _drain(tablet))
+    assert first == (
+        "changes",
+        {"exercises": [{"session_exercise_id": se_id, "sets": first_sets}]},
+    )
+    assert second[1]["exercises"][0]["sets"] == [
+        {"set_number": 2, "weight_kg": 60, "reps": 7, "is_done": 0, "revision": 2}
+    ]
+
+    await app_client.post(f"{session_url}/discard")
+    assert _parse(_drain(tablet)[0]) == ("discarded", {"redirect": "/"})
+    assert (await app_client.get(f"{session_url}/events")).status_code == 404
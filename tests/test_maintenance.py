@@ -0,0 +1,103 @@
+import sqlite3
+
+import pytest
+
+from koifit.db import DatabasePool
+from koifit.maintenance import ORPHAN_SWEEPS, run_maintenance, sweep_orphans
+
+
+@pytest.fixture
+async def pool(db_path):
+    pool = DatabasePool(db_path, readers=1)
+    await pool.open()
+    yield pool
+    await pool.close()
+
+
+async def _count(db_conn, table: str, where: str = "1") -> int:
+    cursor = await db_conn.execute(f"SELECT COUNT(*) FROM {table} WHERE {where}")
+    return (await cursor.fetchone())[0]
+
+
+@pytest.mark.anyio
+async def test_discard_deletes_the_session_rows(client, db_conn):
+    resp = await client.post("/sessions/start/1", follow_redirects=False)
+    session_id = int(resp.headers["location"].rsplit("/", 1)[-1])
+    await client.get(f"/sessions/{session_id}")
+    cursor = await db_conn.execute(
+        "SELECT id FROM session_exercise WHERE session_id = ?", (session_id,)
+    )
+    se_id = (await cursor.fetchall())[0]["id"]
+    await client.post(
+        f"/sessions/{session_id}/save",
+        json={
+            "exercises": [
+                {
+                    "session_exercise_id": se_id,
+                    "sets": [
+                        {"set_number": 1, "weight_kg": 50, "reps": 5, "is_done": 1}
+                    ],
+                }
+            ]
+        },
+    )
+
+    resp = await client.post(f"/sessions/{session_id}/discard")
+    assert resp.status_code == 200
+    assert await _count(db_conn, "session", f"id = {session_id}") == 0
+    assert await _count(db_conn, "session_exercise", f"session_id = {session_id}") == 0
+    assert await _count(db_conn, "set_entry", f"session_exercise_id = {se_id}") == 0
+
+
+@pytest.mark.anyio
+async def test_sweep_deletes_orphans(db_conn, pool):
+    # Left behind by a session row deleted by hand
+    cursor = await db_conn.execute(
+        """INSERT INTO session_exercise (session_id, slot_id, exercise_id, dropset_done)
+           VALUES (9999, 1, 1, 0)"""
+    )
+    se_id = cursor.lastrowid
+    await db_conn.execute(
+        """INSERT INTO set_entry (session_exercise_id, set_number, weight_kg, reps,
+                                  is_done, is_drop)
+           VALUES (?, 1, 50, 5, 1, 0)""",
+        (se_id,),
+    )
+    await db_conn.commit()
+
+    report = await run_maintenance(pool)
+
+    assert report["deleted"]["session_exercise"] == 1
+    assert report["deleted"]["set_entry"] == 1
+    assert await _count(db_conn, "set_entry", f"session_exercise_id = {se_id}") == 0
+
+
+@pytest.mark.anyio
+async def test_maintenance_vacuums_new_databases(pool):
+    report = await run_maintenance(pool)
+    assert report["pages_reclaimed"] is not None
+    assert sum(report["deleted"].values()) == 0
+
+
+@pytest.mark.anyio
+async def test_sweep_walks_tables_in_bounded_chunks(db_path, db_conn, pool):
+    await db_conn.executemany(
+        """INSERT INTO session_exercise (session_id, slot_id, exercise_id, dropset_done)
+           VALUES (?, 1, 1, 0)""",
+        [(9999,), (9999,), (9999,)],
+    )
+    await db_conn.commit()
+
+    deleted = await sweep_orphans(pool, chunk_size=1)
+    assert deleted["session_exercise"] == 3
+
+    # Every chunk is a range search on the key, never a scan of the table
+    db = sqlite3.connect(db_path)
+    for table, (key, condition) in ORPHAN_SWEEPS.items():
+        for sql in (
+            f"SELECT {key} FROM {table} WHERE {key} > 0 ORDER BY {key} LIMIT 1",
+            f"DELETE FROM {table} WHERE {key} > 0 AND {key} <= 1 AND ({condition})",
+        ):
+            details = [row[3] for row in db.execute(f"EXPLAIN QUERY PLAN {sql}")]
+            assert not any(d.startswith(f"SCAN {table}") for d in details), details
+    db.close()
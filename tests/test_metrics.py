@@ -0,0 +1,63 @@
+import json
+import logging
+import re
+
+import pytest
+from asgi_lifespan import LifespanManager
+from httpx import ASGITransport, AsyncClient
+
+from main import create_app
+
+
+@pytest.mark.anyio
+async def test_server_timing_reports_statements_and_commits(client, caplog):
+    resp = await client.post("/sessions/start/1", follow_redirects=False)
+    timing = resp.headers["server-timing"]
+    assert re.search(r'sql;dur=[\d.]+;desc="\d+ statements"', timing)
+    assert re.search(r"commit;dur=[\d.]+", timing)
+
+    session_url = resp.headers["location"]
+    with caplog.at_level(logging.INFO, logger="koifit.requests"):
+        resp = await client.get(session_url)
+
+    # Session row, current exercises, insert of the missing ones, current
+    # exercises again and the previous sets
+    assert '"5 statements"' in resp.headers["server-timing"]
+    record = json.loads(caplog.records[-1].getMessage())
+    assert record["route"] == "/sessions/{session_id}"
+    assert record["statements"] == 5
+    assert record["commits"] == 1
+    assert record["slowest_sql"].startswith(("SELECT", "WITH", "INSERT"))
+
+
+@pytest.mark.anyio
+async def test_metrics_endpoint(client):
+    await client.get("/days")
+    await client.post("/sessions/start/1")
+
+    resp = await client.get("/metrics")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain")
+    assert (
+        'koifit_http_requests_total{method="GET",route="/days",status="200"} 1'
+        in resp.text
+    )
+    assert 'koifit_http_request_duration_seconds_count{route="/days"} 1' in resp.text
+    commits = re.search(r"^koifit_sql_commits_total (\d+)$", resp.text, re.MULTILINE)
+    assert int(commits.group(1)) >= 1
+
+
+@pytest.mark.anyio
+async def test_slow_query_log_is_opt_in(db_path, monkeypatch, caplog):
+    monkeypatch.setenv("SLOW_QUERY_MS", "0")
+    app = create_app(db_path=db_path)
+    async with LifespanManager(app):
+        transport = ASGITransport(app=app)
+        async with AsyncClient(transport=transport, base_url="http://test") as client:
+            with caplog.at_level(logging.WARNING, logger="koifit.slow_queries"):
+                await client.get("/")
+
+    slow = [json.loads(r.getMessage()) for r in caplog.records]
+    assert slow
+    assert slow[-1]["path"] == "/"
+    assert "is_finished = 0" in slow[-1]["sql"]
@@ -0,0 +1,152 @@
+import asyncio
+import sqlite3
+
+import aiosqlite
+import pytest
+
+from benchmarks.common import add_day, add_history
+from koifit.db import DatabasePool, ensure_database
+from koifit.db.setup import apply_seed, lock_online_migrations
+from koifit.db.migrate import (
+    apply_migrations,
+    discover_migrations,
+    run_online_migrations,
+    start_online_migrations,
+)
+
+
+async def _scalar(db, sql):
+    cursor = await db.execute(sql)
+    return (await cursor.fetchall())[0][0]
+
+
+@pytest.mark.anyio
+async def test_fresh_database_is_at_latest_version(db_conn):
+    migrations = discover_migrations()
+    latest = migrations[-1].version
+
+    assert await _scalar(db_conn, "PRAGMA user_version") == latest
+    assert await _scalar(db_conn, "SELECT COUNT(*) FROM schema_version") == len(
+        migrations
+    )
+    assert await apply_migrations(db_conn) == []
+
+
+@pytest.mark.anyio
+async def test_existing_database_is_upgraded_in_place(tmp_path):
+    # A database from before migrations: tables but no schema_version,
+    # finished sessions but no summaries
+    db_path = tmp_path / "legacy.sqlite"
+    async with aiosqlite.connect(str(db_path)) as db:
+        db.row_factory = aiosqlite.Row
+        legacy = [m for m in discover_migrations() if m.version <= 3]
+        await apply_migrations(db, legacy)
+        await apply_seed(db)
+        day_id = await add_day(db, 2)
+        await add_history(db, day_id, 5)
+        await db.executescript(
+            """DROP TABLE schema_version;
+               DELETE FROM session_exercise_summary;
+               PRAGMA user_version = 0;"""
+        )
+
+    online = await ensure_database(db_path)
+    assert [m.name for m in online] == [
+        "backfill_summaries",
+        "backfill_progression_targets",
+    ]
+
+    async with aiosqlite.connect(str(db_path)) as db:
+        # Offline migrations past the pending backfill are applied too
+        assert await _scalar(db, "SELECT COUNT(*) FROM save_receipt") == 0
+        assert await _scalar(db, "PRAGMA user_version") == online[0].version - 1
+
+    pool = DatabasePool(db_path, readers=1)
+    await pool.open()
+    try:
+        await run_online_migrations(pool.writer, online)
+    finally:
+        await pool.close()
+
+    async with aiosqlite.connect(str(db_path)) as db:
+        assert await _scalar(db, "SELECT COUNT(*) FROM session_exercise_summary") == 10
+        assert await _scalar(db, "SELECT COUNT(*) FROM progression_target") == 2
+        # Everything that was there belongs to the default user
+        assert await _scalar(db, "SELECT COUNT(DISTINCT user_id) FROM session") == 1
+        assert await _scalar(db, "SELECT COUNT(*) FROM day WHERE user_id = 1") == 5
+        assert (
+            await _scalar(db, "PRAGMA user_version")
+            == discover_migrations()[-1].version
+        )
+    assert await ensure_database(db_path) == []
+
+
+@pytest.mark.anyio
+async def test_failed_migration_rolls_back(tmp_path):
+    migrations_dir = tmp_path / "migrations"
+    migrations_dir.mkdir()
+    (migrations_dir / "0001_first.sql").write_text("CREATE TABLE a (x INTEGER);")
+    (migrations_dir / "0002_broken.sql").write_text(
+        "CREATE TABLE b (x INTEGER);\nINSERT INTO missing VALUES (1);"
+    )
+    migrations = discover_migrations(migrations_dir)
+
+    async with aiosqlite.connect(str(tmp_path / "test.sqlite")) as db:
+        with pytest.raises(sqlite3.OperationalError):
+            await apply_migrations(db, migrations)
+
+        assert await _scalar(db, "PRAGMA user_version") == 1
+        assert await _scalar(db, "SELECT COUNT(*) FROM schema_version") == 1
+        assert (
+            await _scalar(db, "SELECT COUNT(*) FROM sqlite_master WHERE name = 'b'")
+            == 0
+        )
+
+
+ONLINE_MIGRATION = """
+import asyncio
+
+ONLINE = True
+
+
+async def migrate(writer):
+    async with writer() as db:
+        await db.execute("INSERT INTO runs DEFAULT VALUES")
+        await db.commit()
+    # Leaves the other worker time to start on it too
+    await asyncio.sleep(0.1)
+"""
+
+
+@pytest.mark.anyio
+async def test_workers_run_an_online_migration_once(tmp_path, caplog):
+    migrations_dir = tmp_path / "migrations"
+    migrations_dir.mkdir()
+    (migrations_dir / "0001_runs.sql").write_text(
+        "CREATE TABLE runs (id INTEGER PRIMARY KEY);"
+    )
+    (migrations_dir / "0002_backfill.py").write_text(ONLINE_MIGRATION)
+    migrations = discover_migrations(migrations_dir)
+    db_path = tmp_path / "test.sqlite"
+    async with aiosqlite.connect(str(db_path)) as db:
+        online = await apply_migrations(db, migrations)
+
+    # Two workers found the backfill pending at startup
+    pools = [DatabasePool(db_path, readers=1) for _ in range(2)]
+    for pool in pools:
+        await pool.open()
+    try:
+        await asyncio.gather(
+            *(
+                start_online_migrations(pool, online, lock_online_migrations(db_path))
+                for pool in pools
+            )
+        )
+    finally:
+        for pool in pools:
+            await pool.close()
+
+    assert not [r for r in caplog.records if r.levelname == "ERROR"]
+    async with aiosqlite.connect(str(db_path)) as db:
+        assert await _scalar(db, "SELECT COUNT(*) FROM runs") == 1
+        assert await _scalar(db, "SELECT COUNT(*) FROM schema_version") == 2
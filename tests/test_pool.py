@@ -0,0 +1,91 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from koifit.db import DatabasePool
+
+
+@pytest.fixture
+async def pool(db_path):
+    pool = DatabasePool(db_path, readers=2)
+    await pool.open()
+    yield pool
+    await pool.close()
+
+
+@pytest.mark.anyio
+async def test_database_uses_wal(pool):
+    async with pool.reader() as db:
+        cursor = await db.execute("PRAGMA journal_mode")
+        assert (await cursor.fetchone())[0] == "wal"
+
+
+@pytest.mark.anyio
+async def test_readers_are_not_blocked_by_open_write(pool):
+    async with pool.writer() as writer:
+        await writer.execute("UPDATE day SET label = 'Changed' WHERE id = 1")
+        # Uncommitted write: readers still see the last committed state
+        async with pool.reader() as reader:
+            cursor = await reader.execute("SELECT label FROM day WHERE id = 1")
+            assert (await cursor.fetchone())["label"] == "Upper 1"
+        await writer.commit()
+
+    async with pool.reader() as reader:
+        cursor = await reader.execute("SELECT label FROM day WHERE id = 1")
+        assert (await cursor.fetchone())["label"] == "Changed"
+
+
+@pytest.mark.anyio
+async def test_writer_is_exclusive_and_rolls_back_leftovers(pool):
+    order = []
+
+    async def write(label):
+        async with pool.writer() as db:
+            order.append(f"{label}-start")
+            await db.execute("UPDATE day SET label = ? WHERE id = 1", (label,))
+            await asyncio.sleep(0.01)
+            order.append(f"{label}-end")
+
+    await asyncio.gather(write("a"), write("b"))
+    assert order == ["a-start", "a-end", "b-start", "b-end"]
+
+    # Neither write committed, so the released writer rolled them back
+    async with pool.reader() as reader:
+        cursor = await reader.execute("SELECT label FROM day WHERE id = 1")
+        assert (await cursor.fetchone())["label"] == "Upper 1"
+
+
+@pytest.mark.anyio
+async def test_readers_are_read_only(pool):
+    async with pool.reader() as db:
+        with pytest.raises(sqlite3.OperationalError):
+            await db.execute("DELETE FROM day")
+
+
+@pytest.mark.anyio
+async def test_shared_version_is_bumped_in_the_writers_commit(db_path):
+    pool = DatabasePool(db_path, readers=1, shared=True)
+    await pool.open()
+    try:
+        commits = []
+        await pool._writer.set_trace_callback(
+            lambda sql: sql == "COMMIT" and commits.append(sql)
+        )
+        async with pool.writer() as db:
+            await db.execute("UPDATE day SET label = 'Push' WHERE id = 1")
+            await db.commit()
+        assert len(commits) == 1
+        assert pool.data_version == 1
+
+        # Rolled back writes leave the version alone
+        async with pool.writer() as db:
+            await db.execute("UPDATE day SET label = 'Pull' WHERE id = 1")
+        assert len(commits) == 1
+        async with pool.reader() as reader:
+            cursor = await reader.execute(
+                "SELECT value FROM app_meta WHERE key = 'data_version'"
+            )
+            assert (await cursor.fetchone())[0] == 1
+    finally:
+        await pool.close()
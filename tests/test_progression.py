@@ -0,0 +1,61 @@
+import pytest
+
+from koifit.progression import parse_rep_target, suggest_target
+
+
+def test_parse_rep_target():
+    assert parse_rep_target("8-10") == (8, 10)
+    assert parse_rep_target("12") == (12, 12)
+    assert parse_rep_target("AMRAP") is None
+    assert parse_rep_target(None) is None
+
+
+def test_double_progression():
+    sets = [{"weight_kg": 100.0, "reps": 6}, {"weight_kg": 100.0, "reps": 5}]
+    # Not every set at the top of 4-6 yet: same weight, one more rep
+    assert suggest_target(sets, "good", "4-6", None, 2.5) == (
+        100.0,
+        6,
+        "Same weight, aim for 6 reps",
+    )
+
+    sets[1]["reps"] = 6
+    weight, reps, reason = suggest_target(sets, None, "4-6", "8-9", 2.5)
+    assert (weight, reps) == (102.5, 4)
+    assert reason == "Hit 6 reps at 100 kg: up 2.5 kg at RPE 8-9"
+
+
+def test_effort_tag_overrides_rep_progression():
+    sets = [{"weight_kg": 40.0, "reps": 8}, {"weight_kg": 0.0, "reps": 12}]
+    assert suggest_target(sets, "increase", "10-12", None, 2.0)[:2] == (42.0, 10)
+    assert suggest_target(sets, "decrease", "10-12", None, 2.0)[:2] == (38.0, 10)
+    assert suggest_target([], "increase", "10-12", None, 2.0) is None
+
+
+@pytest.mark.anyio
+async def test_finish_stores_target_shown_on_next_session(client, db_conn):
+    resp = await client.post("/sessions/start/1", follow_redirects=False)
+    session_id = int(resp.headers["location"].rsplit("/", 1)[-1])
+    await client.get(f"/sessions/{session_id}")
+    cursor = await db_conn.execute(
+        "SELECT id FROM session_exercise WHERE session_id = ? AND slot_id = 1",
+        (session_id,),
+    )
+    se_id = (await cursor.fetchall())[0]["id"]
+    # Slot 1 is 4-6 reps; exercise 1 goes up in 2.5 kg steps
+    sets = [{"set_number": 1, "weight_kg": 30.0, "reps": 6, "is_done": 1}]
+    await client.post(
+        f"/sessions/{session_id}/save",
+        json={"exercises": [{"session_exercise_id": se_id, "sets": sets}]},
+    )
+    await client.post(f"/sessions/{session_id}/finish")
+
+    cursor = await db_conn.execute(
+        "SELECT slot_id, session_id, weight_kg, reps FROM progression_target"
+    )
+    assert [tuple(row) for row in await cursor.fetchall()] == [(1, session_id, 32.5, 4)]
+
+    resp = await client.post("/sessions/start/1", follow_redirects=False)
+    page = (await client.get(resp.headers["location"])).text
+    assert "Target 32.5 kg × 4" in page
+    assert 'value="32.5"' in page
@@ -0,0 +1,142 @@
+"""
+EXPLAIN QUERY PLAN audit of every statement the routes run.
+
+A scripted visit of every page and endpoint runs against ten years of
+synthetic history with statement tracing on, then each distinct statement
+is explained. Full scans of tables that grow with history and temp
+B-trees (sorts the indexes should have provided) fail the test.
+"""
+
+import asyncio
+import re
+import sqlite3
+
+import pytest
+from asgi_lifespan import LifespanManager
+from httpx import ASGITransport, AsyncClient
+
+from benchmarks.generate import generate
+from main import create_app
+
+# Everything else (day, slot, exercise, app_meta) is a handful of rows
+LARGE_TABLES = {
+    "session",
+    "session_exercise",
+    "set_entry",
+    "session_exercise_summary",
+    "save_receipt",
+}
+
+NOT_ALIASES = {"WHERE", "LEFT", "INNER", "JOIN", "ON", "SET", "ORDER", "LIMIT"}
+
+UNPLANNED = ("PRAGMA", "BEGIN", "COMMIT", "ROLLBACK")
+
+
+def _tables_by_alias(sql):
+    aliases = {}
+    for table, alias in re.findall(
+        r"\b(?:FROM|JOIN|UPDATE|INTO)\s+(\w+)(?:\s+(?:AS\s+)?(\w+))?",
+        sql,
+        re.IGNORECASE,
+    ):
+        aliases[table] = table
+        if alias and alias.upper() not in NOT_ALIASES:
+            aliases[alias] = table
+    return aliases
+
+
+def plan_problems(db, sql):
+    """Plan lines of sql that scan a large table or build a temp B-tree."""
+    aliases = _tables_by_alias(sql)
+    problems = []
+    for row in db.execute(f"EXPLAIN QUERY PLAN {sql}"):
+        detail = row[3]
+        scan = re.match(r"SCAN (\w+)", detail)
+        if (
+            scan
+            and aliases.get(scan.group(1), scan.group(1)) in LARGE_TABLES
+            or "TEMP B-TREE" in detail
+        ):
+            problems.append(detail)
+    return problems
+
+
+@pytest.fixture(scope="module")
+def history_path(tmp_path_factory):
+    path = tmp_path_factory.mktemp("plans") / "history.sqlite"
+    asyncio.run(generate(path, years=10))
+    return path
+
+
+async def _visit_everything(client, pool):
+    for url in (
+        "/",
+        "/days",
+        "/slots/1/history",
+        "/slots/1/history.json",
+        "/slots/1/history.json?start=2020-01-01&end=2021-01-01&limit=20",
+        "/analytics.json",
+        "/export/history.jsonl",
+    ):
+        assert (await client.get(url)).status_code == 200
+
+    resp = await client.post("/sessions/start/1", follow_redirects=False)
+    session_id = int(resp.headers["location"].rsplit("/", 1)[-1])
+    assert (await client.get(f"/sessions/{session_id}")).status_code == 200
+    assert (await client.get("/")).status_code == 200
+    async with pool.reader() as db:
+        cursor = await db.execute(
+            "SELECT id FROM session_exercise WHERE session_id = ?", (session_id,)
+        )
+        se_id = (await cursor.fetchall())[0]["id"]
+    for fragment in ("card", "previous"):
+        url = f"/sessions/{session_id}/exercises/{se_id}/{fragment}"
+        assert (await client.get(url)).status_code == 200
+
+    sets = [{"set_number": 1, "weight_kg": 60, "reps": 5, "is_done": 1}]
+    await client.post(
+        f"/sessions/{session_id}/save",
+        json={"exercises": [{"session_exercise_id": se_id, "sets": sets}]},
+        headers={"Idempotency-Key": "plan-audit"},
+    )
+    await client.post(
+        f"/sessions/{session_id}/exercises/{se_id}/save", json={"effort_tag": "easy"}
+    )
+    assert (await client.post(f"/sessions/{session_id}/finish")).status_code == 200
+
+    resp = await client.post("/sessions/start/2", follow_redirects=False)
+    session_id = int(resp.headers["location"].rsplit("/", 1)[-1])
+    assert (await client.post(f"/sessions/{session_id}/discard")).status_code == 200
+
+
+def test_plan_problems_flags_scans_and_sorts(history_path):
+    with sqlite3.connect(history_path) as db:
+        assert plan_problems(db, "SELECT * FROM set_entry st WHERE st.is_done = 1")
+        assert plan_problems(db, "SELECT id FROM session ORDER BY date")
+        assert plan_problems(db, "SELECT * FROM slot WHERE day_id = 1") == []
+
+
+@pytest.mark.anyio
+async def test_route_queries_use_indexes(history_path):
+    statements = []
+    app = create_app(db_path=history_path)
+    async with LifespanManager(app):
+        pool = app.state.pool
+        await pool.set_trace_callback(statements.append)
+        transport = ASGITransport(app=app, raise_app_exceptions=True)
+        async with AsyncClient(transport=transport, base_url="http://test") as client:
+            await _visit_everything(client, pool)
+        await pool.set_trace_callback(None)
+
+    distinct = {
+        sql for sql in statements if not sql.lstrip().upper().startswith(UNPLANNED)
+    }
+    assert len(distinct) > 15
+
+    problems = {}
+    with sqlite3.connect(history_path) as db:
+        for sql in distinct:
+            found = plan_problems(db, sql)
+            if found:
+                problems[" ".join(sql.split())] = found
+    assert problems == {}
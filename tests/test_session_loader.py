@@ -0,0 +1,73 @@
+import pytest
+
+from benchmarks.common import QueryCounter, add_day, add_history
+from koifit.catalog import ProgramCatalog
+from koifit.loaders import load_card_view, load_session_view
+
+
+async def _new_session(db_conn, day_id: int) -> int:
+    cursor = await db_conn.execute(
+        "INSERT INTO session (day_id, date, is_finished) VALUES (?, '2030-01-01', 0)",
+        (day_id,),
+    )
+    await db_conn.commit()
+    return cursor.lastrowid
+
+
+async def _catalog(db_conn) -> ProgramCatalog:
+    catalog = ProgramCatalog()
+    await catalog.reload(db_conn)
+    return catalog
+
+
+@pytest.mark.anyio
+async def test_query_count_is_independent_of_slots_and_history(db_conn):
+    counts = []
+    for slot_count, history_size in [(3, 0), (12, 25)]:
+        day_id = await add_day(db_conn, slot_count, label=f"Day {slot_count}")
+        await add_history(db_conn, day_id, history_size)
+        session_id = await _new_session(db_conn, day_id)
+        catalog = await _catalog(db_conn)
+
+        counter = QueryCounter()
+        await counter.attach(db_conn)
+        view = await load_session_view(db_conn, session_id, catalog)
+        await counter.detach(db_conn)
+
+        assert len(view["session_exercises"]) == slot_count
+        counts.append(counter.count)
+
+    assert counts[0] == counts[1]
+
+
+@pytest.mark.anyio
+async def test_previous_comes_from_latest_finished_session(db_conn):
+    day_id = await add_day(db_conn, 2)
+    await add_history(db_conn, day_id, 5, sets_per_exercise=2)
+    session_id = await _new_session(db_conn, day_id)
+
+    view = await load_session_view(db_conn, session_id, await _catalog(db_conn))
+
+    # add_history uses 40 + (n % 20) * 2.5 kg, so the 5th session lifts 50 kg
+    for se in view["session_exercises"]:
+        assert se["sets"] == []
+        assert [s["weight_kg"] for s in se["previous"]["sets"]] == [50.0, 50.0]
+
+
+@pytest.mark.anyio
+async def test_missing_session_returns_none(db_conn):
+    assert await load_session_view(db_conn, 999, await _catalog(db_conn)) is None
+
+
+@pytest.mark.anyio
+async def test_card_view_matches_the_page(db_conn):
+    day_id = await add_day(db_conn, 4)
+    await add_history(db_conn, day_id, 3, sets_per_exercise=2)
+    session_id = await _new_session(db_conn, day_id)
+    catalog = await _catalog(db_conn)
+    view = await load_session_view(db_conn, session_id, catalog)
+
+    for se in view["session_exercises"]:
+        card = await load_card_view(db_conn, session_id, se["id"], catalog)
+        assert card["se"] == se
+    assert await load_card_view(db_conn, session_id + 1, se["id"], catalog) is None
@@ -0,0 +1,36 @@
+import aiosqlite
+import pytest
+from asgi_lifespan import LifespanManager
+
+from koifit.db.setup import init_database
+from koifit.templates import compile_templates, create_environment
+from main import create_app
+
+
+@pytest.mark.anyio
+async def test_new_database_is_copied_from_the_template(tmp_path, monkeypatch):
+    template_path = tmp_path / "template.sqlite"
+    await init_database(template_path)
+    async with aiosqlite.connect(template_path) as db:
+        await db.execute(
+            "INSERT INTO app_meta (key, value) VALUES ('from_template', 1)"
+        )
+        await db.commit()
+    monkeypatch.setenv("TEMPLATE_DB_PATH", str(template_path))
+
+    db_path = tmp_path / "data" / "db.sqlite"
+    app = create_app(db_path=db_path)
+    async with LifespanManager(app), app.state.pool.reader() as db:
+        cursor = await db.execute(
+            "SELECT value FROM app_meta WHERE key = 'from_template'"
+        )
+        assert (await cursor.fetchone())[0] == 1
+    assert db_path.exists()
+    assert not db_path.with_name("db.sqlite.partial").exists()
+
+
+def test_templates_compile_into_the_bytecode_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("TEMPLATE_CACHE_DIR", str(tmp_path))
+    count = compile_templates(create_environment())
+    assert count > 0
+    assert len(list(tmp_path.iterdir())) == count
@@ -0,0 +1,67 @@
+import pytest
+
+from benchmarks.common import add_day, add_history
+from koifit.summaries import rebuild_summaries, summarize_sets
+
+
+def test_summarize_sets_ignores_drops_and_empty_sets():
+    summary = summarize_sets(
+        [
+            {"set_number": 1, "weight_kg": 100.0, "reps": 5, "is_drop": False},
+            {"set_number": 2, "weight_kg": 90.0, "reps": 9, "is_drop": False},
+            {"set_number": 3, "weight_kg": 60.0, "reps": 12, "is_drop": True},
+            {"set_number": 4, "weight_kg": 0.0, "reps": 10, "is_drop": False},
+        ]
+    )
+    assert summary == {
+        "best_1rm": 117.0,
+        "volume": 1310.0,
+        "top_weight_kg": 90.0,
+        "top_reps": 9,
+        "set_count": 4,
+    }
+
+
+@pytest.mark.anyio
+async def test_finish_session_writes_summary(client, db_conn):
+    resp = await client.post("/sessions/start/1", follow_redirects=False)
+    session_id = int(resp.headers["location"].rsplit("/", 1)[-1])
+    await client.get(f"/sessions/{session_id}")
+    cursor = await db_conn.execute(
+        "SELECT id FROM session_exercise WHERE session_id = ? ORDER BY id LIMIT 1",
+        (session_id,),
+    )
+    se_id = (await cursor.fetchone())["id"]
+    sets = [
+        {"set_number": 1, "weight_kg": 100.0, "reps": 6, "is_done": 1},
+        {"set_number": 2, "weight_kg": 80.0, "reps": 8, "is_done": 0},
+    ]
+    await client.post(
+        f"/sessions/{session_id}/save",
+        json={"exercises": [{"session_exercise_id": se_id, "sets": sets}]},
+    )
+    await client.post(f"/sessions/{session_id}/finish")
+
+    cursor = await db_conn.execute("SELECT * FROM session_exercise_summary")
+    rows = await cursor.fetchall()
+    assert len(rows) == 1
+    assert rows[0]["session_exercise_id"] == se_id
+    assert rows[0]["best_1rm"] == 120.0
+    assert rows[0]["volume"] == 600.0
+    assert rows[0]["set_count"] == 1
+
+    resp = await client.get("/slots/1/history.json")
+    assert resp.status_code == 200
+    assert resp.json()["sessions"][0]["best_1rm"] == 120.0
+
+
+@pytest.mark.anyio
+async def test_rebuild_writes_one_row_per_session_exercise(db_conn):
+    day_id = await add_day(db_conn, 3)
+    await add_history(db_conn, day_id, 7)
+
+    written = await rebuild_summaries(db_conn, chunk_size=2)
+
+    assert written == 21
+    cursor = await db_conn.execute("SELECT COUNT(*) FROM session_exercise_summary")
+    assert (await cursor.fetchone())[0] == 21
@@ -0,0 +1,31 @@
+import pytest
+
+from koifit.templates import FragmentCache, format_rest_time, templates
+
+
+def test_format_rest_time():
+    assert format_rest_time(3.0) == "3 min"
+    assert format_rest_time(1.5) == "1 min 30 s"
+    assert format_rest_time(0.5) == "30 s"
+
+
+@pytest.mark.anyio
+async def test_fragment_cache_renders_once_per_program_version():
+    fragments = FragmentCache(templates)
+    fragments.set_version(1)
+    loads = []
+
+    async def load_days():
+        loads.append(1)
+        return {"days": [{"id": 1, "label": f"Day v{len(loads)}"}]}
+
+    first = await fragments.render("components/day_list.html", load_context=load_days)
+    again = await fragments.render("components/day_list.html", load_context=load_days)
+    assert first == again
+    assert "Day v1" in first
+    assert len(loads) == 1
+
+    fragments.set_version(2)
+    changed = await fragments.render("components/day_list.html", load_context=load_days)
+    assert "Day v2" in changed
+    assert len(loads) == 2
@@ -0,0 +1,137 @@
+import asyncio
+
+import pytest
+from asgi_lifespan import LifespanManager
+from httpx import ASGITransport, AsyncClient
+
+from koifit.users import DEFAULT_USER_ID, create_user
+from main import create_app
+
+
+@pytest.fixture
+async def multi_user_client(db_path, monkeypatch):
+    monkeypatch.setenv("USER_HEADER", "X-User")
+    monkeypatch.setenv("ADMIN_LOGIN", "admin")
+    app = create_app(db_path=db_path)
+    async with LifespanManager(app):
+        transport = ASGITransport(app=app, raise_app_exceptions=True)
+        async with AsyncClient(transport=transport, base_url="http://test") as client:
+            yield client
+
+
+async def _first_day(db, login):
+    cursor = await db.execute(
+        """SELECT d.id FROM day d JOIN user u ON u.id = d.user_id
+           WHERE u.login = ? ORDER BY d.ordinal LIMIT 1""",
+        (login,),
+    )
+    return (await cursor.fetchall())[0][0]
+
+
+@pytest.mark.anyio
+async def test_new_user_gets_a_copy_of_the_program(db_conn):
+    user = await create_user(db_conn, "alice")
+    await db_conn.commit()
+
+    cursor = await db_conn.execute(
+        """SELECT d.user_id, COUNT(*), GROUP_CONCAT(sl.title, '|')
+           FROM slot sl JOIN day d ON d.id = sl.day_id
+           GROUP BY d.user_id ORDER BY d.user_id"""
+    )
+    default, copy = await cursor.fetchall()
+    assert (default[0], copy[0]) == (DEFAULT_USER_ID, user.id)
+    assert tuple(default)[1:] == tuple(copy)[1:]
+
+    # Slots point at the copied exercises, not the default user's
+    cursor = await db_conn.execute(
+        """SELECT COUNT(*) FROM slot sl
+           JOIN day d ON d.id = sl.day_id
+           JOIN exercise e ON e.id = sl.preferred_exercise_id
+           WHERE d.user_id != e.user_id"""
+    )
+    assert (await cursor.fetchall())[0][0] == 0
+
+
+@pytest.mark.anyio
+async def test_requests_without_the_user_header_are_rejected(multi_user_client):
+    assert (await multi_user_client.get("/")).status_code == 401
+    assert (
+        await multi_user_client.get("/", headers={"X-User": "a"})
+    ).status_code == 200
+
+
+@pytest.mark.anyio
+async def test_users_only_see_their_own_sessions(multi_user_client, db_conn):
+    alice = {"X-User": "alice"}
+    bob = {"X-User": "bob"}
+    assert (await multi_user_client.get("/", headers=alice)).status_code == 200
+    assert (await multi_user_client.get("/", headers=bob)).status_code == 200
+    alice_day = await _first_day(db_conn, "alice")
+    bob_day = await _first_day(db_conn, "bob")
+    assert alice_day != bob_day
+
+    # Another user's day cannot be started
+    resp = await multi_user_client.post(
+        f"/sessions/start/{bob_day}", headers=alice, follow_redirects=False
+    )
+    assert resp.status_code == 404
+
+    resp = await multi_user_client.post(
+        f"/sessions/start/{alice_day}", headers=alice, follow_redirects=False
+    )
+    assert resp.status_code == 303
+    session_url = resp.headers["location"]
+    assert (await multi_user_client.get(session_url, headers=alice)).status_code == 200
+
+    assert (await multi_user_client.get(session_url, headers=bob)).status_code == 404
+    resp = await multi_user_client.post(f"{session_url}/finish", headers=bob)
+    assert resp.status_code == 404
+
+    # Bob starting a session leaves Alice's unfinished one alone
+    resp = await multi_user_client.post(
+        f"/sessions/start/{bob_day}", headers=bob, follow_redirects=False
+    )
+    assert resp.status_code == 303
+    cursor = await db_conn.execute("SELECT COUNT(*) FROM session WHERE is_finished = 0")
+    assert (await cursor.fetchall())[0][0] == 2
+
+    home = await multi_user_client.get("/", headers=alice)
+    assert session_url in home.text
+    assert resp.headers["location"] not in home.text
+
+
+@pytest.mark.anyio
+async def test_a_new_login_can_write_first(multi_user_client, db_conn):
+    # Creating the user takes the writer, so it must not already be held
+    alice = {"X-User": "alice"}
+    resp = await asyncio.wait_for(
+        multi_user_client.post("/sessions/start/1", headers=alice), timeout=5
+    )
+    assert resp.status_code == 404
+
+    alice_day = await _first_day(db_conn, "alice")
+    resp = await asyncio.wait_for(
+        multi_user_client.post(
+            f"/sessions/start/{alice_day}", headers=alice, follow_redirects=False
+        ),
+        timeout=5,
+    )
+    assert resp.status_code == 303
+
+
+@pytest.mark.anyio
+async def test_only_the_admin_manages_the_program(multi_user_client):
+    alice = {"X-User": "alice"}
+    admin = {"X-User": "admin"}
+    assert (
+        await multi_user_client.post("/program/reload", headers=alice)
+    ).status_code == 403
+    assert (
+        await multi_user_client.get("/program/catalog", headers=alice)
+    ).status_code == 403
+    response = await multi_user_client.post("/program/reload", headers=admin)
+    assert response.status_code == 200
+    assert response.json()["users"] >= 2
+    assert (
+        await multi_user_client.get("/program/catalog", headers=admin)
+    ).status_code == 200
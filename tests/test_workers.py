@@ -0,0 +1,106 @@
+import json
+from contextlib import AsyncExitStack
+
+import pytest
+from asgi_lifespan import LifespanManager
+from httpx import ASGITransport, AsyncClient
+
+from main import create_app
+
+
+@pytest.fixture
+async def workers(db_path):
+    """Two apps in multi-worker mode sharing one database, with their clients."""
+    async with AsyncExitStack() as stack:
+        pairs = []
+        for n in range(2):
+            app = create_app(db_path=db_path, workers=2)
+            await stack.enter_async_context(LifespanManager(app))
+            # Both run in this process; tell their relays apart
+            app.state.relay.worker = -n
+            transport = ASGITransport(app=app, raise_app_exceptions=True)
+            client = await stack.enter_async_context(
+                AsyncClient(transport=transport, base_url="http://test")
+            )
+            pairs.append((app, client))
+        yield pairs
+
+
+async def _data_version(app):
+    async with app.state.pool.reader() as db:
+        cursor = await db.execute(
+            "SELECT value FROM app_meta WHERE key = 'data_version'"
+        )
+        return (await cursor.fetchone())[0]
+
+
+@pytest.mark.anyio
+async def test_writes_on_one_worker_invalidate_the_others(workers, db_conn):
+    (_, first), (second_app, second) = workers
+
+    # Validators come from the shared data version, so they agree
+    etag = (await first.get("/days")).headers["etag"]
+    resp = await second.get("/days", headers={"If-None-Match": etag})
+    assert resp.status_code == 304
+
+    await first.post("/sessions/start/1")
+    resp = await second.get("/days", headers={"If-None-Match": etag})
+    assert resp.status_code == 200
+
+    # A program edit reloaded on one worker reaches the other's catalog and
+    # cached fragments
+    await db_conn.execute("UPDATE day SET label = 'Push day' WHERE id = 1")
+    await db_conn.commit()
+    await first.post("/program/reload")
+    assert "Push day" in (await second.get("/days")).text
+    assert second_app.state.sync.catalog_reloads == 1
+
+
+@pytest.mark.anyio
+async def test_finishing_on_one_worker_drops_the_others_analytics(workers):
+    (_, first), (second_app, second) = workers
+    await second.get("/analytics.json")
+    assert second_app.state.analytics.loads == 1
+
+    resp = await first.post("/sessions/start/1", follow_redirects=False)
+    await first.post(f"{resp.headers['location']}/finish")
+
+    await second.get("/analytics.json")
+    assert second_app.state.analytics.loads == 2
+
+
+@pytest.mark.anyio
+async def test_live_events_are_relayed_between_workers(workers):
+    (first_app, first), (second_app, second) = workers
+    resp = await first.post("/sessions/start/1", follow_redirects=False)
+    session_url = resp.headers["location"]
+    session_id = int(session_url.rsplit("/", 1)[-1])
+    await second.get(session_url)
+    async with second_app.state.pool.reader() as db:
+        cursor = await db.execute(
+            "SELECT id FROM session_exercise WHERE session_id = ? ORDER BY id",
+            (session_id,),
+        )
+        se_id = (await cursor.fetchall())[0][0]
+
+    relay = second_app.state.relay
+    tablet = second_app.state.live.subscribe(session_id, "tablet")
+    sets = [{"set_number": 1, "weight_kg": 60, "reps": 8, "is_done": 1}]
+    payload = {"exercises": [{"session_exercise_id": se_id, "sets": sets}]}
+    version = await _data_version(first_app)
+    await first.post(
+        f"{session_url}/save", json=payload, headers={"X-Client-Id": "phone"}
+    )
+    # The event is recorded in the save's transaction: one commit, one bump
+    assert await _data_version(first_app) == version + 1
+    await relay.poll()
+    name, data = tablet.queue.get_nowait().decode().strip().split("\n")
+    assert name == "event: changes"
+    sets[0]["revision"] = 1
+    assert json.loads(data.removeprefix("data: ")) == payload
+
+    await first.post(f"{session_url}/finish")
+    await relay.poll()
+    assert tablet.queue.get_nowait().startswith(b"event: finished\n")
+    assert tablet.queue.get_nowait() is None
+    assert relay.relayed == 2
@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+Switch an existing database to incremental auto-vacuum.
+"""
+
+import asyncio
+
+import aiosqlite
+
+from koifit.settings import get_db_path
+
+
+async def main():
+    """
+    Enable auto_vacuum = INCREMENTAL and rebuild the file once with VACUUM.
+
+    Databases created since the schema enables it need no conversion. Stop
+    the app first: VACUUM needs exclusive access.
+    """
+    db_path = get_db_path()
+    async with aiosqlite.connect(str(db_path)) as db:
+        cursor = await db.execute("PRAGMA auto_vacuum")
+        if (await cursor.fetchone())[0] == 2:
+            print(f"{db_path} already uses incremental auto-vacuum.")
+            return
+        print(f"Converting {db_path} to incremental auto-vacuum")
+        await db.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        await db.execute("VACUUM")
+    print("Done.")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())